@@ -0,0 +1,358 @@
+"""
+Batch processing of many files by the toolkit functions
+
+Files are spread across a process pool largest first,
+small files are packed into tasks to cut inter-process overhead.
+Completed files are recorded in a manifest (JSON lines),
+so an interrupted run can be resumed skipping them.
+
+Includes:
+- data-class `FileResult`
+- functions:
+    `expand_inputs`, `plan_tasks`, `load_manifest`
+    `run_batch`
+
+Usage:
+    python batch_processor.py 'reads/*.fastq' --operation filter_fastq --output-dir filtered \
+        --params '{"quality_threshold": 20}' --jobs 8 --manifest filtered/manifest.jsonl
+"""
+
+import argparse
+import glob
+import instrumentation
+import json
+import os
+import sys
+import time
+import traceback
+
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+from bio_files_processor import (change_fasta_start_pos,
+                                 convert_multiline_fasta_to_oneline,
+                                 select_genes_from_gbk_to_fasta)
+from dedup import deduplicate_file
+from general import filter_fastq
+
+# name -> (function, keyword of output path)
+OPERATIONS = {'filter_fastq': (filter_fastq, 'output_path'),
+              'convert_multiline_fasta_to_oneline': (convert_multiline_fasta_to_oneline, 'output_fasta'),
+              'change_fasta_start_pos': (change_fasta_start_pos, 'output_fasta'),
+              'select_genes_from_gbk_to_fasta': (select_genes_from_gbk_to_fasta, 'output_fasta'),
+              'deduplicate_file': (deduplicate_file, 'output_path')}
+
+
+@dataclass
+class FileResult:
+    """
+    Result of processing of single file
+
+    Params
+    ------
+    input_path : str
+    output_path : str
+    status : str
+        'done', 'failed' or 'skipped' (done in previous run)
+    time : float
+        Processing time in seconds
+    size : int
+        Input file size in bytes
+    error : str, default None
+        Traceback of failed file
+    """
+
+    input_path: str
+    output_path: str
+    status: str
+    time: float
+    size: int
+    error: str = None
+
+
+def expand_inputs(inputs: str | list) -> list:
+    """
+    Expand glob patterns (recursive '**' is supported)
+    and remove duplicates keeping the order.
+    Glob matches are filtered to files, literal paths are kept
+    even if missing, so they are reported as failed
+
+    Used in: run_batch()
+    """
+
+    if isinstance(inputs, (str, os.PathLike)):
+        inputs = [inputs]
+
+    paths = []
+    for pattern in inputs:
+        pattern = str(pattern)
+        if glob.has_magic(pattern):
+            paths.extend(path for path in sorted(glob.glob(pattern, recursive=True)) if os.path.isfile(path))
+        else:
+            paths.append(pattern)
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+
+def plan_tasks(files: list, workers_number: int, max_files_per_task: int = 64) -> list:
+    """
+    Split files to tasks largest first.
+    Files are packed into task until its size reaches
+    1/4 of average size per worker or it has `max_files_per_task` files,
+    so large files go alone and small ones are grouped
+
+    Params
+    ------
+    files : list
+        List of (input_path, output_path, size)
+
+    Returns list of tasks as lists of files
+
+    Used in: run_batch()
+    """
+
+    files = sorted(files, key=lambda file: file[2], reverse=True)
+    target_size = sum(file[2] for file in files) / (max(1, workers_number) * 4)
+
+    tasks = []
+    task, task_size = [], 0
+    for file in files:
+        task.append(file)
+        task_size += file[2]
+        if task_size >= target_size or len(task) >= max_files_per_task:
+            tasks.append(task)
+            task, task_size = [], 0
+    if task:
+        tasks.append(task)
+    return tasks
+
+
+def _call_operation(operation, input_path: str, output_path: str, params: dict):
+    if isinstance(operation, str):
+        function, output_keyword = OPERATIONS[operation]
+        return function(input_path, **{output_keyword: output_path}, **params)
+    return operation(input_path, output_path, **params)
+
+
+def _run_task(operation, params: dict, task: list) -> list:
+    """
+    Process files of task, errors are returned as failed results
+
+    Used in: run_batch()
+    """
+
+    results = []
+    for input_path, output_path, size in task:
+        start = time.perf_counter()
+        try:
+            _call_operation(operation, input_path, output_path, params)
+            status, error = 'done', None
+        except Exception:
+            status, error = 'failed', traceback.format_exc()
+        results.append(FileResult(input_path, output_path, status, time.perf_counter() - start, size, error))
+    return results
+
+
+def _operation_key(operation, params: dict) -> str:
+    if not isinstance(operation, str):
+        operation_name = getattr(operation, '__qualname__', repr(operation))
+        operation = f'{operation.__module__}.{operation_name}'
+    return json.dumps([operation, params], sort_keys=True, default=str)
+
+
+def load_manifest(manifest_path: str) -> dict:
+    """
+    Read manifest of completed files, the last record of file wins,
+    incomplete last line of interrupted run is ignored
+
+    Returns dict input_path: record
+    """
+
+    records = {}
+    if not os.path.exists(manifest_path):
+        return records
+    with open(manifest_path) as manifest_file:
+        for line in manifest_file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record['input_path']] = record
+    return records
+
+
+def _is_completed(record: dict, operation_key: str, output_path: str, size: int, mtime: float) -> bool:
+    return (record is not None
+            and record['operation'] == operation_key
+            and record['output_path'] == output_path
+            and record['size'] == size
+            and record['mtime'] == mtime
+            and os.path.exists(output_path))
+
+
+def _print_progress(done_number: int, total_number: int, result: FileResult):
+    print(f'[{done_number}/{total_number}] {result.status} {result.time:.2f} s {result.input_path}',
+          file=sys.stderr)
+
+
+def run_batch(inputs: str | list,
+              operation: str | Callable,
+              output_dir: str,
+              params: dict = None,
+              n_jobs: int = None,
+              manifest_path: str = None,
+              output_suffix: str = '',
+              progress=True,
+              max_files_per_task: int = 64,
+              executor: Executor = None) -> list:
+    """
+    Apply operation to many files in parallel
+
+    Output file has name of input file with `output_suffix`
+    before extension and is written to `output_dir`.
+
+    Params
+    ------
+    inputs : str or list
+        Paths or glob patterns of input files
+    operation : str or callable
+        Name of operation from OPERATIONS
+        or picklable function(input_path, output_path, **params)
+    output_dir : str
+    params : dict, default None
+        Keyword arguments of operation
+    n_jobs : int, default None
+        Number of processes, all CPUs if not specified,
+        1 - files are processed in the current process
+    manifest_path : str, default None
+        JSON lines file of completed files, defaults to 'manifest.jsonl'
+        in `output_dir`. Files completed with the same operation and params
+        are skipped if input is not changed and output exists
+    output_suffix : str, default ''
+    progress : bool or callable, default True
+        Print progress to stderr or call progress(done_number, total_number, result)
+    max_files_per_task : int, default 64
+        Maximal number of small files sent to worker in single task
+    executor : Executor, default None
+        Own executor, overrides n_jobs
+
+    Returns list of FileResult in order of inputs
+    """
+
+    params = params or {}
+    if isinstance(operation, str) and operation not in OPERATIONS:
+        raise ValueError(f'Unknown operation: {operation}! Should be: {", ".join(OPERATIONS)}')
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(output_dir, 'manifest.jsonl')
+    operation_key = _operation_key(operation, params)
+    manifest = load_manifest(manifest_path)
+
+    results = {}
+    files = []
+    mtimes = {}
+    output_paths = set()
+    for input_path in expand_inputs(inputs):
+        name, extension = os.path.splitext(os.path.basename(input_path))
+        output_path = os.path.abspath(os.path.join(output_dir, name + output_suffix + extension))
+        if output_path in output_paths or output_path == input_path:
+            raise ValueError(f'Output path of {input_path} is not unique: {output_path}')
+        output_paths.add(output_path)
+
+        try:
+            stat = os.stat(input_path)
+        except OSError as error:
+            results[input_path] = FileResult(input_path, output_path, 'failed', 0, 0, f'{error!r}')
+            continue
+        if _is_completed(manifest.get(input_path), operation_key, output_path, stat.st_size, stat.st_mtime):
+            results[input_path] = FileResult(input_path, output_path, 'skipped', 0, stat.st_size)
+        else:
+            files.append((input_path, output_path, stat.st_size))
+            mtimes[input_path] = stat.st_mtime
+            results[input_path] = None
+
+    if progress is True:
+        progress = _print_progress
+    operation_name = operation if isinstance(operation, str) else getattr(operation, '__name__', repr(operation))
+    timer_name = f'batch.{operation_name}'
+    missing_number = sum(result is not None and result.status == 'failed' for result in results.values())
+    instrumentation.count('batch.files_skipped', len(results) - len(files) - missing_number)
+    instrumentation.count('batch.files_failed', missing_number)
+    total_number = len(files)
+    done_number = 0
+
+    with open(manifest_path, mode='a') as manifest_file:
+
+        def complete(task_results):
+            nonlocal done_number
+            for result in task_results:
+                results[result.input_path] = result
+                done_number += 1
+                # Time is measured in workers and added here
+                instrumentation.add_time(timer_name, result.time)
+                instrumentation.count(f'batch.files_{result.status}')
+                instrumentation.count('batch.bytes_in', result.size)
+                if result.status == 'done':
+                    manifest_file.write(json.dumps({'input_path': result.input_path,
+                                                    'output_path': result.output_path,
+                                                    'operation': operation_key,
+                                                    'size': result.size,
+                                                    'mtime': mtimes[result.input_path],
+                                                    'time': result.time}) + '\n')
+                    manifest_file.flush()
+                if progress:
+                    progress(done_number, total_number, result)
+
+        if n_jobs == 1 and executor is None:
+            for file in sorted(files, key=lambda file: file[2], reverse=True):
+                complete(_run_task(operation, params, [file]))
+        elif files:
+            pool = executor or ProcessPoolExecutor(n_jobs)
+            try:
+                workers_number = getattr(pool, '_max_workers', n_jobs or os.cpu_count())
+                futures = [pool.submit(_run_task, operation, params, task)
+                           for task in plan_tasks(files, workers_number, max_files_per_task)]
+                for future in as_completed(futures):
+                    complete(future.result())
+            finally:
+                if executor is None:
+                    pool.shutdown(cancel_futures=True)
+
+    return list(results.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='Input files or glob patterns')
+    parser.add_argument('--operation', required=True, choices=list(OPERATIONS))
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--params', default='{}', help='Keyword arguments of operation as JSON')
+    parser.add_argument('--suffix', default='', help='Suffix of output file names')
+    parser.add_argument('--jobs', type=int, default=None, help='Number of processes, all CPUs by default')
+    parser.add_argument('--manifest', help='Manifest file, output_dir/manifest.jsonl by default')
+    parser.add_argument('--report', help='Path to JSON-file with per-file results and timings')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_batch(args.inputs, args.operation, args.output_dir, json.loads(args.params),
+                        n_jobs=args.jobs, manifest_path=args.manifest, output_suffix=args.suffix)
+
+    statuses = {}
+    for result in results:
+        statuses[result.status] = statuses.get(result.status, 0) + 1
+    print(f'Files: {len(results)}, ' + ', '.join(f'{status}: {number}' for status, number in statuses.items())
+          + f'. Total time {time.perf_counter() - start:.1f} s', file=sys.stderr)
+
+    if args.report:
+        with open(args.report, mode='w') as report_file:
+            json.dump([asdict(result) for result in results], report_file, indent=2)
+
+    failed = [result for result in results if result.status == 'failed']
+    for result in failed:
+        print(f'\nFailed {result.input_path}:\n{result.error}', file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
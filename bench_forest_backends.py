@@ -0,0 +1,102 @@
+"""
+Benchmark of RandomForestClassifierCustom execution backends
+
+Measures fit and predict_proba time of 'serial', 'thread' and 'process'
+backends on a grid of dataset sizes and trees numbers
+and reports the fastest backend for each point, which shows
+where the pool start and data transfer costs are paid off.
+
+Usage:
+    python bench_forest_backends.py --samples 1000 10000 100000 --trees 10 50 \
+        --n-jobs 4 --output backends.json
+"""
+
+import argparse
+import json
+import time
+
+from sklearn.datasets import make_classification
+
+from custom_random_forest import BACKENDS, RandomForestClassifierCustom
+
+
+def time_backend(X, y, backend, n_estimators, n_jobs, repeats):
+    """
+    Best of `repeats` times of fit and predict_proba, temporary pool
+    is created on each call as in default usage
+
+    Returns dict with fit and predict times in seconds
+    """
+
+    fit_times, predict_times = [], []
+    for _ in range(repeats):
+        forest = RandomForestClassifierCustom(n_estimators=n_estimators, max_depth=10, random_state=0,
+                                              n_jobs=n_jobs, backend=backend)
+        start = time.perf_counter()
+        forest.fit(X, y)
+        fit_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        forest.predict_proba(X)
+        predict_times.append(time.perf_counter() - start)
+
+    return {'fit': min(fit_times), 'predict': min(predict_times)}
+
+
+def run_benchmark(samples, trees, n_features, n_jobs, repeats, backends=BACKENDS) -> list:
+    """
+    Time backends on grid of samples and trees numbers
+
+    Returns list of results per grid point
+    """
+
+    results = []
+    for n_samples in samples:
+        X, y = make_classification(n_samples=n_samples, n_features=n_features,
+                                   n_informative=n_features // 2, random_state=0)
+        for n_estimators in trees:
+            times = {backend: time_backend(X, y, backend, n_estimators, n_jobs, repeats)
+                     for backend in backends}
+            results.append({'samples': n_samples,
+                            'trees': n_estimators,
+                            'times': times,
+                            'fastest_fit': min(times, key=lambda backend: times[backend]['fit']),
+                            'fastest_predict': min(times, key=lambda backend: times[backend]['predict'])})
+    return results
+
+
+def print_results(results, backends=BACKENDS):
+    header = f'{"samples":>9} {"trees":>6}'
+    for backend in backends:
+        header += f' {backend + " fit":>13} {backend + " pred":>13}'
+    print(header + f' {"fastest fit":>12} {"fastest pred":>12}')
+
+    for result in results:
+        line = f'{result["samples"]:>9} {result["trees"]:>6}'
+        for backend in backends:
+            line += f' {result["times"][backend]["fit"]:>13.4f} {result["times"][backend]["predict"]:>13.4f}'
+        print(line + f' {result["fastest_fit"]:>12} {result["fastest_predict"]:>12}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--trees', type=int, nargs='+', default=[8, 32])
+    parser.add_argument('--features', type=int, default=20)
+    parser.add_argument('--n-jobs', type=int, default=4)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--output', help='Path to JSON-file with results')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.samples, args.trees, args.features, args.n_jobs, args.repeats, args.backends)
+    print_results(results, args.backends)
+
+    if args.output:
+        with open(args.output, mode='w') as output_file:
+            json.dump({'n_jobs': args.n_jobs, 'features': args.features, 'results': results},
+                      output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Benchmark of RandomForestClassifierCustom against sklearn RandomForestClassifier
+
+For each dataset size, implementation and n_jobs from 1 to --max-jobs
+reports fit and predict throughput (samples per second),
+peak memory, bytes pickled for inter-process communication
+and test accuracy with agreement of predictions with sklearn.
+
+Each measurement runs in a fresh subprocess, so peak RSS
+of the process and its workers is not affected by previous runs.
+Peak memory in the table is a sum of peaks of the process and of its largest worker.
+Results are written to JSON-file for tracking of regressions.
+
+max_features of custom forest is the number of features sampled per tree,
+of sklearn - per split, so by default each implementation uses its own default.
+
+Usage:
+    python bench_forest_sklearn.py --samples 10000 100000 --features 20 \
+        --trees 50 --max-jobs 4 --output forest_bench.json
+"""
+
+import argparse
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import sklearn
+
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+from custom_random_forest import RandomForestClassifierCustom
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+IMPLEMENTATIONS = ('custom', 'sklearn')
+
+
+class CountingExecutor(ProcessPoolExecutor):
+    """
+    Process pool counting bytes of pickled tasks and results
+
+    Each task and result is pickled once more for counting,
+    so the pool is used for IPC volume only, not for timings
+    """
+
+    def __init__(self, max_workers=None):
+        super().__init__(max_workers)
+        self.sent_bytes = 0
+        self.received_bytes = 0
+
+    def submit(self, fn, /, *args, **kwargs):
+        self.sent_bytes += len(pickle.dumps((fn, args, kwargs)))
+        future = super().submit(fn, *args, **kwargs)
+        future.add_done_callback(self._count_result)
+        return future
+
+    def _count_result(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self.received_bytes += len(pickle.dumps(future.result()))
+
+    @property
+    def ipc_bytes(self):
+        return self.sent_bytes + self.received_bytes
+
+
+def make_dataset(n_samples, n_features, seed=0):
+    X, y = make_classification(n_samples=n_samples, n_features=n_features,
+                               n_informative=max(2, n_features // 2), random_state=seed)
+    return train_test_split(X, y, test_size=0.25, random_state=seed)
+
+
+def new_model(implementation, n_estimators, max_depth, max_features, n_jobs):
+    if implementation == 'custom':
+        return RandomForestClassifierCustom(n_estimators=n_estimators, max_depth=max_depth,
+                                            max_features=max_features, random_state=0, n_jobs=n_jobs)
+    return RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth,
+                                  max_features=max_features, random_state=0, n_jobs=n_jobs)
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of the process and of its finished children, MB
+    """
+
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 ** 2 if sys.platform == 'darwin' else 1024
+    return {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale}
+
+
+def measure(implementation, n_samples, n_features, n_estimators, max_depth, max_features, n_jobs,
+            seed=0) -> dict:
+    """
+    Single measurement, intended to be run in a separate process
+
+    Returns dict with timings, throughput, memory,
+    IPC bytes, accuracy and predictions of the test set
+    """
+
+    X_train, X_test, y_train, y_test = make_dataset(n_samples, n_features, seed)
+    if max_features is None and implementation == 'sklearn':
+        max_features = 'sqrt'
+    model = new_model(implementation, n_estimators, max_depth, max_features, n_jobs)
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = model.predict(X_test)
+    predict_time = time.perf_counter() - start
+
+    ipc_bytes = None
+    if implementation == 'custom':
+        ipc_bytes = 0
+        if n_jobs > 1:
+            # Separate run through counting pool, timings above are not affected
+            with CountingExecutor(n_jobs) as pool:
+                counted = new_model(implementation, n_estimators, max_depth, max_features, n_jobs)
+                counted.fit(X_train, y_train, executor=pool)
+                counted.predict(X_test, executor=pool)
+            ipc_bytes = pool.ipc_bytes
+        # custom forest predicts indices of classes
+        predictions = model.classes[predictions]
+
+    return {'fit_time': fit_time,
+            'predict_time': predict_time,
+            'fit_samples_per_s': len(X_train) / fit_time,
+            'predict_samples_per_s': len(X_test) / predict_time,
+            'peak_rss_mb': peak_rss_mb(),
+            'ipc_bytes': ipc_bytes,
+            'accuracy': float(np.mean(predictions == y_test)),
+            'predictions': predictions.tolist()}
+
+
+def measure_in_subprocess(**params) -> dict:
+    output = subprocess.run([sys.executable, __file__, '--measure', json.dumps(params)],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def run_benchmark(samples, n_features, n_estimators, max_depth, max_features, max_jobs) -> list:
+    """
+    Measure both implementations for each dataset size and n_jobs in 1..max_jobs
+
+    Returns list of results, predictions are replaced by agreement with sklearn
+    """
+
+    results = []
+    for n_samples in samples:
+        for n_jobs in range(1, max_jobs + 1):
+            measurements = {implementation: measure_in_subprocess(implementation=implementation,
+                                                                  n_samples=n_samples,
+                                                                  n_features=n_features,
+                                                                  n_estimators=n_estimators,
+                                                                  max_depth=max_depth,
+                                                                  max_features=max_features,
+                                                                  n_jobs=n_jobs)
+                            for implementation in IMPLEMENTATIONS}
+            sklearn_predictions = np.array(measurements['sklearn']['predictions'])
+            for implementation, measurement in measurements.items():
+                predictions = np.array(measurement.pop('predictions'))
+                measurement['agreement_with_sklearn'] = float(np.mean(predictions == sklearn_predictions))
+                results.append({'implementation': implementation,
+                                'samples': n_samples,
+                                'n_jobs': n_jobs,
+                                **measurement})
+    return results
+
+
+def print_results(results):
+    print(f'{"impl":>8} {"samples":>9} {"jobs":>5} {"fit smpl/s":>12} {"pred smpl/s":>12} '
+          f'{"peak MB":>9} {"IPC MB":>8} {"accuracy":>9} {"agreement":>10}')
+    for result in results:
+        rss = result['peak_rss_mb']
+        peak = f'{rss["self"] + rss["children"]:.1f}' if rss else '-'
+        ipc = f'{result["ipc_bytes"] / 1024 ** 2:.2f}' if result['ipc_bytes'] is not None else '-'
+        print(f'{result["implementation"]:>8} {result["samples"]:>9} {result["n_jobs"]:>5} '
+              f'{result["fit_samples_per_s"]:>12.0f} {result["predict_samples_per_s"]:>12.0f} '
+              f'{peak:>9} {ipc:>8} {result["accuracy"]:>9.4f} {result["agreement_with_sklearn"]:>10.4f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--features', type=int, default=20)
+    parser.add_argument('--trees', type=int, default=50)
+    parser.add_argument('--max-depth', type=int, default=None)
+    parser.add_argument('--max-features', type=int, default=None,
+                        help='Default of each implementation if not specified')
+    parser.add_argument('--max-jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--output', help='Path to JSON-file with results')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(**json.loads(args.measure))))
+        return
+
+    results = run_benchmark(args.samples, args.features, args.trees, args.max_depth, args.max_features,
+                            args.max_jobs)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, mode='w') as output_file:
+            json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'sklearn': sklearn.__version__,
+                       'cpu_count': os.cpu_count(),
+                       'features': args.features,
+                       'trees': args.trees,
+                       'max_depth': args.max_depth,
+                       'max_features': args.max_features,
+                       'results': results},
+                      output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
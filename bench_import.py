@@ -0,0 +1,88 @@
+"""
+Benchmark of import time of the toolkit modules
+
+Each import runs in a fresh interpreter, time of empty
+interpreter start is subtracted. Heavy dependencies
+loaded by the import are listed.
+Exits with code 1 if import of any module takes more than --max-ms.
+
+Usage:
+    python bench_import.py --modules general pipeline --repeats 20 --max-ms 50
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ('numpy', 'pandas', 'Bio', 'requests', 'dotenv', 'sklearn')
+
+MEASURE_CODE = '''
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(module for module in {heavy!r} if module in sys.modules))
+'''
+
+
+def measure_import(module: str, repeats: int) -> dict:
+    """
+    Median import time of module in fresh interpreters
+
+    Returns dict with time in ms and loaded heavy modules
+    """
+
+    statement = f'import {module}' if module else 'pass'
+    code = MEASURE_CODE.format(statement=statement, heavy=HEAVY_MODULES)
+    times = []
+    total_times = []
+    loaded = ''
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        total_times.append(time.perf_counter() - start)
+        elapsed, loaded = output.split(' ', 1) if ' ' in output else (output, '')
+        times.append(float(elapsed))
+
+    return {'module': module,
+            'import_ms': statistics.median(times) * 1000,
+            'process_ms': statistics.median(total_times) * 1000,
+            'heavy_modules': [name for name in loaded.strip().split(',') if name]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=['general', 'bio_files_processor', 'pipeline'])
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, help='Maximal allowed import time of module, ms')
+    parser.add_argument('--output', help='Path to JSON-file with results')
+    args = parser.parse_args()
+
+    interpreter = measure_import('', args.repeats)
+    results = [measure_import(module, args.repeats) for module in args.modules]
+
+    print(f'Empty interpreter start: {interpreter["process_ms"]:.1f} ms')
+    print(f'{"module":>22} {"import ms":>10} {"process ms":>11}  heavy modules')
+    for result in results:
+        print(f'{result["module"]:>22} {result["import_ms"]:>10.1f} {result["process_ms"]:>11.1f}  '
+              f'{", ".join(result["heavy_modules"]) or "-"}')
+
+    if args.output:
+        with open(args.output, mode='w') as output_file:
+            json.dump({'python': sys.version, 'interpreter_ms': interpreter['process_ms'], 'results': results},
+                      output_file, indent=2)
+
+    if args.max_ms is not None:
+        slow = [result['module'] for result in results if result['import_ms'] > args.max_ms]
+        if slow:
+            print(f'Import slower than {args.max_ms} ms: {", ".join(slow)}', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
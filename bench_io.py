@@ -0,0 +1,302 @@
+"""
+Benchmark of file processing entry points:
+`filter_fastq`, `OpenFasta`, `convert_multiline_fasta_to_oneline`
+and `change_fasta_start_pos`
+
+Input files are generated deterministically from the seed
+for short reads, long reads and chromosome-scale records,
+their sizes are multiplied by --scale.
+For each entry point and dataset reports records per second,
+MB of input per second and peak RSS of the measuring subprocess.
+
+OpenFasta joins sequence lines by string concatenation, which is
+quadratic for chromosome-scale records (~1 MB/s), so this pair
+is skipped unless --include-slow is given.
+
+Results are written to JSON-file. With --baseline they are compared
+with stored results, and the script exits with code 1
+if throughput of any run dropped more than --threshold.
+
+Usage:
+    python bench_io.py --scale 0.5 --output io_bench.json
+    python bench_io.py --baseline io_bench.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# name -> (file format, records number, record length)
+DATASETS = {'short_reads': ('fastq', 100000, 150),
+            'long_reads': ('fastq', 1000, 10000),
+            'short_fasta': ('fasta', 100000, 150),
+            'long_fasta': ('fasta', 1000, 10000),
+            'chromosome': ('fasta', 1, 20000000)}
+
+# entry point -> file format it processes
+ENTRY_POINTS = {'filter_fastq': 'fastq',
+                'OpenFasta': 'fasta',
+                'convert_multiline_fasta_to_oneline': 'fasta',
+                'change_fasta_start_pos': 'fasta'}
+
+# (entry point, dataset) taking tens of minutes at default scale
+SLOW_RUNS = {('OpenFasta', 'chromosome')}
+
+NUCLEOTIDES = np.frombuffer(b'ACGT', dtype=np.uint8)
+FASTA_LINE_WIDTH = 60
+GENERATION_BLOCK = 1024 ** 2
+
+
+def random_sequence(rng: np.random.Generator, length: int) -> bytes:
+    return NUCLEOTIDES[rng.integers(0, 4, length)].tobytes()
+
+
+def generate_fastq(path: str, records_number: int, read_length: int, seed: int = 0):
+    """
+    Write fastq-file with random reads and phred scores from 2 to 40
+    """
+
+    rng = np.random.default_rng(seed)
+    with open(path, mode='wb') as fastq_file:
+        for record_idx in range(records_number):
+            fastq_file.write(b'@read_%d length=%d\n' % (record_idx, read_length))
+            fastq_file.write(random_sequence(rng, read_length))
+            fastq_file.write(b'\n+\n')
+            fastq_file.write((rng.integers(2, 41, read_length, dtype=np.uint8) + 33).tobytes())
+            fastq_file.write(b'\n')
+
+
+def generate_fasta(path: str, records_number: int, seq_length: int, seed: int = 0,
+                   line_width: int = FASTA_LINE_WIDTH):
+    """
+    Write fasta-file with random sequences wrapped by `line_width`,
+    if `line_width` is 0 sequences are written to single line.
+    Long sequences are generated by blocks
+    """
+
+    rng = np.random.default_rng(seed)
+    with open(path, mode='wb') as fasta_file:
+        for record_idx in range(records_number):
+            fasta_file.write(b'>seq_%d synthetic record\n' % record_idx)
+            written = 0
+            while written < seq_length:
+                block_length = min(GENERATION_BLOCK, seq_length - written)
+                if line_width:
+                    # Blocks are multiple of line width, so lines are not broken between them
+                    block_length = min(seq_length - written, max(line_width, block_length // line_width * line_width))
+                    block = random_sequence(rng, block_length)
+                    fasta_file.write(b'\n'.join(block[start:start + line_width]
+                                                for start in range(0, block_length, line_width)))
+                    fasta_file.write(b'\n')
+                else:
+                    fasta_file.write(random_sequence(rng, block_length))
+                written += block_length
+            if not line_width:
+                fasta_file.write(b'\n')
+
+
+def prepare_dataset(data_dir: str, name: str, scale: float, seed: int) -> tuple:
+    """
+    Generate dataset file if it does not exist yet
+
+    Returns path and records number
+    """
+
+    file_format, records_number, record_length = DATASETS[name]
+    if file_format == 'fastq' or records_number > 1:
+        records_number = max(1, int(records_number * scale))
+    else:
+        record_length = max(1, int(record_length * scale))
+
+    path = os.path.join(data_dir, f'{name}_{records_number}x{record_length}_seed{seed}.{file_format}')
+    if not os.path.exists(path):
+        if file_format == 'fastq':
+            generate_fastq(path, records_number, record_length, seed)
+        else:
+            generate_fasta(path, records_number, record_length, seed, FASTA_LINE_WIDTH)
+    return path, records_number
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 ** 2 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def measure(entry_point: str, input_path: str, output_dir: str) -> dict:
+    """
+    Single run of entry point, intended to be run in a separate process
+
+    Returns dict with time and peak RSS
+    """
+
+    output_path = os.path.join(output_dir, f'{entry_point}.out')
+    start = time.perf_counter()
+
+    if entry_point == 'filter_fastq':
+        from general import filter_fastq
+        filter_fastq(input_path, gc_thresholds=(30, 70), quality_threshold=20, output_path=output_path)
+    elif entry_point == 'OpenFasta':
+        from bio_files_processor import OpenFasta
+        with OpenFasta(input_path) as fasta:
+            for _ in fasta:
+                pass
+    elif entry_point == 'convert_multiline_fasta_to_oneline':
+        from bio_files_processor import convert_multiline_fasta_to_oneline
+        convert_multiline_fasta_to_oneline(input_path, output_path)
+    elif entry_point == 'change_fasta_start_pos':
+        from bio_files_processor import change_fasta_start_pos
+        change_fasta_start_pos(input_path, 1000, output_path)
+    else:
+        raise ValueError(f'Unknown entry point: {entry_point}')
+
+    elapsed = time.perf_counter() - start
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+    return {'time': elapsed, 'peak_rss_mb': peak_rss_mb()}
+
+
+def measure_in_subprocess(entry_point: str, input_path: str, output_dir: str) -> dict:
+    params = {'entry_point': entry_point, 'input_path': input_path, 'output_dir': output_dir}
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--measure', json.dumps(params)],
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    return json.loads(output)
+
+
+def run_benchmark(data_dir: str, datasets: list, entry_points: list, scale: float, seed: int,
+                  repeats: int, include_slow: bool = False) -> list:
+    """
+    Measure each entry point on datasets of its format,
+    best of `repeats` runs is reported.
+    Pairs from SLOW_RUNS are skipped unless `include_slow`
+
+    Returns list of results
+    """
+
+    results = []
+    for entry_point in entry_points:
+        entry_format = ENTRY_POINTS[entry_point]
+        for name in datasets:
+            file_format = DATASETS[name][0]
+            if (entry_point, name) in SLOW_RUNS and not include_slow:
+                print(f'Skipped slow run {entry_point} on {name}, use --include-slow to measure it',
+                      file=sys.stderr)
+                continue
+            if entry_format != file_format:
+                continue
+            input_path, records_number = prepare_dataset(data_dir, name, scale, seed)
+
+            runs = [measure_in_subprocess(entry_point, input_path, data_dir) for _ in range(repeats)]
+            best_time = min(run['time'] for run in runs)
+            size_mb = os.path.getsize(input_path) / 1024 ** 2
+            results.append({'entry_point': entry_point,
+                            'dataset': name,
+                            'records': records_number,
+                            'size_mb': size_mb,
+                            'time': best_time,
+                            'records_per_s': records_number / best_time,
+                            'mb_per_s': size_mb / best_time,
+                            'peak_rss_mb': max((run['peak_rss_mb'] or 0) for run in runs) or None})
+    return results
+
+
+def compare_with_baseline(results: list, baseline: list, threshold: float) -> list:
+    """
+    Find runs with throughput dropped more than `threshold` fraction
+    compared with baseline runs of the same entry point and dataset
+
+    Returns list of regressions
+    """
+
+    baseline_runs = {(run['entry_point'], run['dataset'], run['records']): run for run in baseline}
+    regressions = []
+    for result in results:
+        baseline_run = baseline_runs.get((result['entry_point'], result['dataset'], result['records']))
+        if baseline_run is None:
+            continue
+        change = result['mb_per_s'] / baseline_run['mb_per_s'] - 1
+        result['change_vs_baseline'] = change
+        if change < -threshold:
+            regressions.append(result)
+    return regressions
+
+
+def print_results(results: list):
+    print(f'{"entry point":>35} {"dataset":>12} {"records":>8} {"MB":>8} {"rec/s":>11} '
+          f'{"MB/s":>8} {"peak MB":>8} {"vs base":>8}')
+    for result in results:
+        change = f'{result["change_vs_baseline"]:+.1%}' if 'change_vs_baseline' in result else '-'
+        peak = f'{result["peak_rss_mb"]:.1f}' if result['peak_rss_mb'] else '-'
+        print(f'{result["entry_point"]:>35} {result["dataset"]:>12} {result["records"]:>8} '
+              f'{result["size_mb"]:>8.1f} {result["records_per_s"]:>11.0f} {result["mb_per_s"]:>8.2f} '
+              f'{peak:>8} {change:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--datasets', nargs='+', choices=list(DATASETS), default=list(DATASETS))
+    parser.add_argument('--entry-points', nargs='+', choices=list(ENTRY_POINTS), default=list(ENTRY_POINTS))
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplier of dataset sizes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--data-dir', help='Directory to keep generated files, temporary if not specified')
+    parser.add_argument('--output', help='Path to JSON-file with results')
+    parser.add_argument('--baseline', help='Path to JSON-file with baseline results')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed fraction of throughput drop, default 0.2')
+    parser.add_argument('--include-slow', action='store_true',
+                        help=f'Measure slow runs: {", ".join(" on ".join(run) for run in sorted(SLOW_RUNS))}')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(**json.loads(args.measure))))
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = args.data_dir or temp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        results = run_benchmark(os.path.abspath(data_dir), args.datasets, args.entry_points,
+                                args.scale, args.seed, args.repeats, args.include_slow)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare_with_baseline(results, json.load(baseline_file)['results'], args.threshold)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, mode='w') as output_file:
+            json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': platform.python_version(),
+                       'scale': args.scale,
+                       'seed': args.seed,
+                       'results': results},
+                      output_file, indent=2)
+
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) more than {args.threshold:.0%}:', file=sys.stderr)
+        for regression in regressions:
+            print(f'  {regression["entry_point"]} on {regression["dataset"]}: '
+                  f'{regression["change_vs_baseline"]:+.1%}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,11 +7,16 @@ Includes:
 - functions:
     `convert_multiline_fasta_to_oneline`
     `parse_blast_output`
-    `change_fasta_start_pos`
+    `change_fasta_start_pos`, `index_fasta`, `find_motif`, `read_shifts`
     `select_genes_from_gbk_to_fasta`
 """
 
+import instrumentation
+import mmap
+import os
+
 from dataclasses import dataclass
+from itertools import chain
 
 
 @dataclass
@@ -108,6 +113,7 @@ class OpenFasta:
                 break
         self.header = current_line
         record = FastaRecord(fasta_id, current_seq, description, self.wish_beauty)
+        instrumentation.count('open_fasta.records')
         return record
 
     def __iter__(self):
@@ -118,9 +124,19 @@ class OpenFasta:
             return FastaRecord('', '', '', False)
         return self.__next__()
 
-    def read_records(self):
+    def read_records(self, deduplicate: str = None):
+        """
+        Read all records, with `deduplicate` 'exact' or 'reverse_complement'
+        only the first record of duplicated sequences is kept
+        """
+
+        records = self.__iter__()
+        if deduplicate:
+            from dedup import deduplicate_records
+
+            records = deduplicate_records(records, deduplicate)
         full_fasta = []
-        for record in self.__iter__():
+        for record in records:
             full_fasta.append(record)
         return full_fasta
 
@@ -142,20 +158,23 @@ def convert_multiline_fasta_to_oneline(input_fasta: str, output_fasta: str = 'on
         Path to output fasta-file
     """
 
-    with open(input_fasta) as fasta_multiline:
-        my_list = [fasta_multiline.readline().strip()]
-        seq = ''
-        for line in fasta_multiline:
-            if not line.startswith('>'):
-                seq += line.strip()
-            else:
-                my_list.append(seq)
-                my_list.append(line.strip())
-                seq = ''
-        my_list.append(seq)
-    with open(output_fasta, mode='w') as fasta_oneline:
-        for line in my_list:
-            fasta_oneline.write(line + '\n')
+    with instrumentation.timer('convert_multiline_fasta_to_oneline.parse'):
+        with open(input_fasta) as fasta_multiline:
+            my_list = [fasta_multiline.readline().strip()]
+            seq = ''
+            for line in fasta_multiline:
+                if not line.startswith('>'):
+                    seq += line.strip()
+                else:
+                    my_list.append(seq)
+                    my_list.append(line.strip())
+                    seq = ''
+            my_list.append(seq)
+    with instrumentation.timer('convert_multiline_fasta_to_oneline.write'):
+        with open(output_fasta, mode='w') as fasta_oneline:
+            for line in my_list:
+                fasta_oneline.write(line + '\n')
+    instrumentation.count('convert_multiline_fasta_to_oneline.records', len(my_list) // 2)
 
 
 def parse_blast_output(input_file: str, output_file: str = 'best_Blast_results.txt'):
@@ -190,42 +209,331 @@ def parse_blast_output(input_file: str, output_file: str = 'best_Blast_results.t
             best_results_file.write(result + '\n')
 
 
-def change_fasta_start_pos(input_fasta: str, shift_idx: int, output_fasta: str = 'shifted.fasta'):
+FASTA_BLOCK_SIZE = 1024 ** 2
+
+
+@dataclass
+class FastaIndexEntry:
+    """
+    Position of fasta-record in file, as in samtools faidx
+
+    Params
+    ------
+    id : str
+        Sequence accession ID
+    header : str
+        Header line without '>'
+    offset : int
+        Byte offset of header line
+    seq_start, seq_end : int
+        Byte offsets of sequence lines
+    length : int
+        Number of nucleotides
+    line_bases, line_bytes : int
+        Nucleotides and bytes in line of uniformly wrapped sequence,
+        0 if lines have different length
+    """
+
+    id: str
+    header: str
+    offset: int
+    seq_start: int
+    seq_end: int
+    length: int
+    line_bases: int
+    line_bytes: int
+
+
+def _count_bases(data, start: int, end: int) -> int:
+    bases = 0
+    for block_start in range(start, end, FASTA_BLOCK_SIZE):
+        block = data[block_start:min(block_start + FASTA_BLOCK_SIZE, end)]
+        bases += len(block) - block.count(b'\n') - block.count(b'\r')
+    return bases
+
+
+def _line_layout(data, seq_start: int, seq_end: int) -> tuple:
+    """
+    Nucleotides and bytes in line if all lines
+    except the last one have the same length, else (0, 0)
+
+    Used in: index_fasta()
+    """
+
+    if seq_start == seq_end:
+        return 0, 0
+    first_end = data.find(b'\n', seq_start, seq_end)
+    if first_end == -1:
+        line_bytes = seq_end - seq_start + 1
+    else:
+        line_bytes = first_end - seq_start + 1
+    line_bases = line_bytes - 1 - (data[line_bytes + seq_start - 2:line_bytes + seq_start - 1] == b'\r')
+    if line_bases <= 0:
+        return 0, 0
+
+    # Full lines are checked by blocks: line breaks must be only at the line ends
+    lines_in_block = max(1, FASTA_BLOCK_SIZE // line_bytes)
+    full_end = seq_start + (seq_end - seq_start) // line_bytes * line_bytes
+    for block_start in range(seq_start, full_end, lines_in_block * line_bytes):
+        block = data[block_start:min(block_start + lines_in_block * line_bytes, full_end)]
+        lines_number = len(block) // line_bytes
+        if block.count(b'\n') != lines_number or block[line_bytes - 1::line_bytes].count(b'\n') != lines_number:
+            return 0, 0
+
+    last_line = data[full_end:seq_end]
+    if last_line.count(b'\n') > last_line.endswith(b'\n'):
+        return 0, 0
+    return line_bases, line_bytes
+
+
+def index_fasta(data) -> list:
+    """
+    Index records of fasta-file content (bytes or mmap)
+    without copying of sequences
+
+    Returns list of FastaIndexEntry
+
+    Used in: change_fasta_start_pos()
+    """
+
+    size = len(data)
+    if not data[:1] == b'>':
+        raise FastaFormatError('Invalid fasta-file format: must begin with ">"')
+
+    entries = []
+    offset = 0
+    while offset < size:
+        header_end = data.find(b'\n', offset)
+        if header_end == -1:
+            header_end = size
+        header = data[offset + 1:header_end].decode().rstrip('\r')
+        seq_start = min(header_end + 1, size)
+        # Search from the header line break to find the next header after empty sequence
+        next_header = data.find(b'\n>', header_end)
+        seq_end = size if next_header == -1 else next_header + 1
+
+        line_bases, line_bytes = _line_layout(data, seq_start, seq_end)
+        entries.append(FastaIndexEntry(header.partition(' ')[0], header, offset, seq_start, seq_end,
+                                       _count_bases(data, seq_start, seq_end), line_bases, line_bytes))
+        offset = seq_end
+    return entries
+
+
+def _base_offset(data, entry: FastaIndexEntry, base_idx: int) -> int:
+    """
+    Byte offset of nucleotide by its index in sequence
+    """
+
+    if base_idx >= entry.length:
+        return entry.seq_end
+    if entry.line_bases:
+        return entry.seq_start + base_idx // entry.line_bases * entry.line_bytes + base_idx % entry.line_bases
+
+    # Lines of different length are counted by blocks
+    remaining = base_idx
+    for block_start in range(entry.seq_start, entry.seq_end, FASTA_BLOCK_SIZE):
+        block = data[block_start:min(block_start + FASTA_BLOCK_SIZE, entry.seq_end)]
+        block_bases = len(block) - block.count(b'\n') - block.count(b'\r')
+        if block_bases <= remaining:
+            remaining -= block_bases
+            continue
+        line_start = 0
+        while True:
+            line_end = block.find(b'\n', line_start)
+            if line_end == -1:
+                line_end = len(block)
+            line_bases = line_end - line_start - block.count(b'\r', line_start, line_end)
+            if remaining < line_bases:
+                return block_start + line_start + remaining
+            remaining -= line_bases
+            line_start = line_end + 1
+
+
+def _iter_bases(data, start: int, end: int):
+    """
+    Nucleotides between byte offsets by blocks without line breaks
+    """
+
+    for block_start in range(start, end, FASTA_BLOCK_SIZE):
+        yield data[block_start:min(block_start + FASTA_BLOCK_SIZE, end)].translate(None, b'\r\n')
+
+
+class _SequenceWriter:
+    """
+    Write nucleotides by blocks wrapping them by `line_width`, 0 - single line
+    """
+
+    def __init__(self, output_file, line_width: int):
+        self.output_file = output_file
+        self.line_width = line_width
+        self.column = 0
+
+    def write(self, bases: bytes):
+        width = self.line_width
+        if not width:
+            self.output_file.write(bases)
+            self.column += len(bases)
+            return
+
+        start = 0
+        if self.column:
+            start = min(width - self.column, len(bases))
+            self.output_file.write(bases[:start])
+            self.column += start
+            if self.column < width:
+                return
+            self.output_file.write(b'\n')
+            self.column = 0
+
+        full_end = start + (len(bases) - start) // width * width
+        if full_end > start:
+            self.output_file.write(b'\n'.join(bases[line_start:line_start + width]
+                                              for line_start in range(start, full_end, width)))
+            self.output_file.write(b'\n')
+        self.output_file.write(bases[full_end:])
+        self.column = len(bases) - full_end
+
+    def finish(self):
+        if self.column:
+            self.output_file.write(b'\n')
+        self.column = 0
+
+
+def find_motif(data, entry: FastaIndexEntry, motif: str) -> int:
+    """
+    Case-insensitive search of motif in circular sequence,
+    motif may span line breaks and the sequence end
+
+    Returns 0-based index of the first occurrence or -1
+    """
+
+    motif = motif.upper().encode()
+    if not motif or len(motif) > entry.length:
+        return -1
+
+    # First nucleotides are appended to find motif spanning the sequence end
+    head_end = _base_offset(data, entry, len(motif) - 1)
+    blocks = list(_iter_bases(data, entry.seq_start, head_end))
+    carry = b''
+    carry_start = 0
+    for block in chain(_iter_bases(data, entry.seq_start, entry.seq_end), blocks):
+        window = carry + block.upper()
+        found = window.find(motif)
+        if found != -1:
+            return carry_start + found
+        keep = min(len(window), len(motif) - 1)
+        carry_start += len(window) - keep
+        carry = window[len(window) - keep:]
+    return -1
+
+
+def _copy_record(data, entry: FastaIndexEntry, output_file):
+    for block_start in range(entry.offset, entry.seq_end, FASTA_BLOCK_SIZE):
+        output_file.write(data[block_start:min(block_start + FASTA_BLOCK_SIZE, entry.seq_end)])
+    if not data[entry.seq_end - 1:entry.seq_end] == b'\n':
+        output_file.write(b'\n')
+
+
+def read_shifts(shifts_path: str) -> dict:
+    """
+    Read tab-separated file with sequence ID and shift index in lines
+
+    Returns dict ID: shift_idx for `change_fasta_start_pos`
     """
-    Takes single entry fasta and rewrite
-    the sequence as circular
+
+    shifts = {}
+    with open(shifts_path) as shifts_file:
+        for line in shifts_file:
+            if line.strip() and not line.startswith('#'):
+                fasta_id, shift_idx = line.split()[:2]
+                shifts[fasta_id] = int(shift_idx)
+    return shifts
+
+
+@instrumentation.timed('change_fasta_start_pos')
+def change_fasta_start_pos(input_fasta: str,
+                           shift_idx: int = 0,
+                           output_fasta: str = 'shifted.fasta',
+                           shifts: dict = None,
+                           motif: str = None,
+                           line_width: int = None) -> dict:
+    """
+    Rewrite sequences of fasta-file as circular
     starting from the specified index character.
 
     Nucleotide position indexing starts from 1,
-    means shift = 0 and shift = 1 change nothing
+    means shift = 0 and shift = 1 change nothing,
+    negative index counts from the sequence end.
+    Index out of sequence length wraps around as in circular sequence,
+    e.g. shift = length + 3 is the same as shift = 3
+
+    Multi-record and wrapped files are supported.
+    The file is memory-mapped and both parts of rotated sequence
+    are written by blocks directly from it without building whole sequences.
 
     Params
     ------
     input_fasta : str
         Path to input fasta-file
-    shift_idx : int
-        Index of nucleotide from which new sequence will start
+    shift_idx : int, default 0
+        Index of nucleotide from which new sequences will start
     output_fasta : str, default 'shifted.fasta'
          Path to output fasta-file
+    shifts : dict, default None
+        Shifts of records by IDs, see also `read_shifts`.
+        Records not in dict are written unchanged, `shift_idx` is ignored
+    motif : str, default None
+        Sequences start from the first occurrence of the motif
+        (case-insensitive, may span the sequence end),
+        records without motif are written unchanged. Overrides shifts
+    line_width : int, default None
+        Width of sequence lines, line width of input record
+        if not specified, 0 - single line
+
+    Returns dict of records IDs with applied shift indexes, None for unchanged
     """
-    
-    with open(input_fasta) as fasta_file:
-        new_name = fasta_file.readline().strip() + '_shifted_to_' + str(shift_idx)
-        input_seq = fasta_file.readline().strip()
-
-    if shift_idx < 0:
-        shift_idx += len(input_seq)
-    elif shift_idx > 1:
-        shift_idx -= 1
-    else:
-        shift_idx = 0
 
-    shifted_seq = input_seq[shift_idx:len(input_seq) + 1]
-    shifted_seq += input_seq[:shift_idx]
+    applied_shifts = {}
+    with open(input_fasta, mode='rb') as fasta_file, open(output_fasta, mode='wb') as shifted_fasta:
+        if os.fstat(fasta_file.fileno()).st_size == 0:
+            raise FastaFormatError('Invalid fasta-file format: must begin with ">"')
 
-    with open(output_fasta, mode='w') as shifted_fasta:
-        shifted_fasta.write(new_name + '\n')
-        shifted_fasta.write(shifted_seq)
+        with mmap.mmap(fasta_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            with instrumentation.timer('change_fasta_start_pos.index'):
+                entries = index_fasta(data)
+            instrumentation.count('change_fasta_start_pos.records', len(entries))
+            instrumentation.count('change_fasta_start_pos.bytes_in', len(data))
+
+            for entry in entries:
+                if motif is not None:
+                    motif_idx = find_motif(data, entry, motif)
+                    record_shift = None if motif_idx == -1 else motif_idx + 1
+                elif shifts is not None:
+                    record_shift = shifts.get(entry.id)
+                else:
+                    record_shift = shift_idx
+                applied_shifts[entry.id] = record_shift
+
+                if record_shift is None:
+                    _copy_record(data, entry, shifted_fasta)
+                    continue
+
+                shifted_fasta.write(f'>{entry.header}_shifted_to_{record_shift}\n'.encode())
+                if record_shift < 0:
+                    start_idx = record_shift
+                elif record_shift > 1:
+                    start_idx = record_shift - 1
+                else:
+                    start_idx = 0
+                split_offset = _base_offset(data, entry, start_idx % entry.length if entry.length else 0)
+
+                writer = _SequenceWriter(shifted_fasta, entry.line_bases if line_width is None else line_width)
+                for bases in chain(_iter_bases(data, split_offset, entry.seq_end),
+                                   _iter_bases(data, entry.seq_start, split_offset)):
+                    writer.write(bases)
+                writer.finish()
+
+    return applied_shifts
 
 
 def parse_gbk_to_list(path_to_file: str) -> list:
@@ -1,14 +1,581 @@
+import instrumentation
+import json
 import numpy as np
-import random
+import os
+import pickle
+import uuid
+import weakref
 
 from sklearn.base import BaseEstimator
 from sklearn.tree import DecisionTreeClassifier
-from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+from multiprocessing import shared_memory
 
 
-SEED = 111
-random.seed(SEED)
-np.random.seed(SEED)
+# Shared arrays attached in worker process: name -> (SharedMemory, array)
+_attached_arrays = {}
+
+# Unpickled trees chunks in worker process: key -> (models, features_idxs)
+_loaded_models = OrderedDict()
+_LOADED_MODELS_LIMIT = 16
+
+BACKENDS = ('process', 'thread', 'serial')
+
+
+def share_array(array: np.ndarray) -> tuple:
+    """
+    Copy array to new shared memory block
+
+    Returns SharedMemory object and array specification
+    (name, shape, dtype) to attach it in worker processes
+    by `attach_arrays`.
+    The caller must close and unlink the block.
+    """
+
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    shared[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def attach_arrays(*specs) -> list:
+    """
+    Attach arrays shared by `share_array` without copying
+
+    Attachments are cached in worker process,
+    blocks not requested anymore are closed.
+    """
+
+    for name in set(_attached_arrays) - {spec[0] for spec in specs}:
+        shm, _ = _attached_arrays.pop(name)
+        shm.close()
+
+    arrays = []
+    for name, shape, dtype in specs:
+        if name not in _attached_arrays:
+            shm = shared_memory.SharedMemory(name=name)
+            _attached_arrays[name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+        arrays.append(_attached_arrays[name][1])
+    return arrays
+
+
+def split_chunks(items_number: int, chunks_number: int) -> list:
+    """
+    Split range of items into balanced chunks of consecutive indices
+    """
+
+    chunks_number = max(1, min(chunks_number, items_number))
+    return [chunk.tolist() for chunk in np.array_split(np.arange(items_number), chunks_number)]
+
+
+def new_pool(backend: str, workers_number: int) -> Executor:
+    """
+    Create executor for 'process' or 'thread' backend
+    """
+
+    if backend == 'thread':
+        return ThreadPoolExecutor(workers_number)
+    return ProcessPoolExecutor(workers_number)
+
+
+def tree_rng(entropy: int, tree_idx: int) -> np.random.Generator:
+    """
+    Independent random generator of the tree
+
+    Streams are children of SeedSequence(entropy) indexed by tree,
+    so they do not depend on the order or the process of trees fitting.
+    """
+
+    return np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(tree_idx,)))
+
+
+def bin_features(X, max_bins=256, sample_size=200000, rng: np.random.Generator = None):
+    """
+    Quantize features into uint8 bins by quantiles
+
+    Bin of value x is the number of edges less than x,
+    so `bin <= b` is the same split as `x <= edges[b]`.
+    Edges are estimated on random sample of `sample_size` rows
+    drawn by `rng`.
+
+    Returns binned matrix and list of float32 bin edges by features
+    """
+
+    if not 2 <= max_bins <= 256:
+        raise ValueError(f'Incorrect input of "max_bins": {max_bins}! Should be from 2 to 256')
+
+    X = np.asarray(X, dtype=np.float32)
+    sample = X
+    if X.shape[0] > sample_size:
+        sample_rows = np.random.default_rng(rng).choice(X.shape[0], sample_size, replace=False)
+        sample = X[sample_rows]
+
+    X_binned = np.empty(X.shape, dtype=np.uint8)
+    bin_edges = []
+    for feature_idx in range(X.shape[1]):
+        column_values = np.unique(sample[:, feature_idx])
+        if column_values.size > max_bins:
+            quantiles = np.linspace(0, 1, max_bins + 1)[1:-1]
+            column_values = np.unique(np.quantile(sample[:, feature_idx], quantiles, method='lower'))
+        # The maximal value needs no edge
+        edges = column_values[:max_bins - 1].astype(np.float32)
+        bin_edges.append(edges)
+        X_binned[:, feature_idx] = np.searchsorted(edges, X[:, feature_idx], side='left')
+
+    return X_binned, bin_edges
+
+
+class HistogramTree:
+    """
+    Nodes arrays of HistogramTreeClassifier
+    in the layout of sklearn `tree_` used by CompiledForest
+    """
+
+    def __init__(self, feature, threshold, split_bin, children_left, children_right, value, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.split_bin = split_bin
+        self.children_left = children_left
+        self.children_right = children_right
+        self.value = value
+        self.max_depth = max_depth
+        self.node_count = len(feature)
+
+
+class HistogramTreeClassifier:
+    """
+    Decision tree grown from class histograms of binned features
+
+    Works on the shared binned matrix with index arrays of samples,
+    no copies of the data are made except uint8 bins of node samples.
+    Split criterion is Gini impurity.
+
+    Params
+    ------
+    max_depth : int, default None
+    """
+
+    def __init__(self, max_depth=None):
+        self.max_depth = max_depth
+        self.classes_ = None
+        self.tree_ = None
+
+    def fit(self, X_binned, y_codes, sample_idxs, features_idxs, bin_edges, classes):
+        """
+        Grow tree on rows `sample_idxs` (repeats allowed)
+        and columns `features_idxs` of binned matrix
+
+        y_codes : indices of samples classes in `classes`
+        """
+
+        self.classes_ = classes
+        classes_number = len(classes)
+        max_depth = np.inf if self.max_depth is None else self.max_depth
+
+        features, split_bins, lefts, rights, values = [], [], [], [], []
+        tree_depth = 0
+
+        def add_node():
+            for node_list in (features, split_bins, lefts, rights, values):
+                node_list.append(None)
+            return len(features) - 1
+
+        stack = [(add_node(), np.asarray(sample_idxs), 0)]
+        while stack:
+            node_id, node_samples, depth = stack.pop()
+            tree_depth = max(tree_depth, depth)
+            node_y = y_codes[node_samples]
+            class_counts = np.bincount(node_y, minlength=classes_number)
+            values[node_id] = class_counts / node_samples.size
+            features[node_id], split_bins[node_id], lefts[node_id], rights[node_id] = -2, -2, -1, -1
+
+            if depth >= max_depth or node_samples.size < 2 or np.count_nonzero(class_counts) < 2:
+                continue
+
+            # Histograms of all features in one bincount: (features, bins, classes)
+            node_bins = X_binned[node_samples[:, None], features_idxs]
+            hist_codes = ((np.arange(len(features_idxs)) * 256 + node_bins) * classes_number
+                          + node_y[:, None])
+            hist = np.bincount(hist_codes.ravel(), minlength=len(features_idxs) * 256 * classes_number)
+            left_counts = np.cumsum(hist.reshape(len(features_idxs), 256, classes_number), axis=1,
+                                    dtype=np.float64)
+            right_counts = class_counts - left_counts
+
+            # Sums over short classes axis are faster as matrix products
+            classes_ones = np.ones(classes_number)
+            left_size = left_counts @ classes_ones
+            right_size = node_samples.size - left_size
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # Sum of children impurities weighted by their sizes
+                weighted_gini = (left_size - (left_counts * left_counts) @ classes_ones / left_size
+                                 + right_size - (right_counts * right_counts) @ classes_ones / right_size)
+            weighted_gini[(left_size == 0) | (right_size == 0)] = np.inf
+
+            best_feature, best_bin = np.unravel_index(np.argmin(weighted_gini), weighted_gini.shape)
+            node_gini = node_samples.size - (class_counts ** 2).sum() / node_samples.size
+            if not weighted_gini[best_feature, best_bin] < node_gini - 1e-12:
+                continue
+
+            goes_left = node_bins[:, best_feature] <= best_bin
+            features[node_id], split_bins[node_id] = best_feature, best_bin
+            lefts[node_id] = add_node()
+            rights[node_id] = add_node()
+            stack.append((rights[node_id], node_samples[~goes_left], depth + 1))
+            stack.append((lefts[node_id], node_samples[goes_left], depth + 1))
+
+        features = np.array(features, dtype=np.int64)
+        split_bins = np.array(split_bins, dtype=np.int64)
+        is_leaf = features < 0
+        thresholds = np.full(features.size, -2.0)
+        thresholds[~is_leaf] = [bin_edges[features_idxs[feature]][split_bin]
+                                for feature, split_bin in zip(features[~is_leaf], split_bins[~is_leaf])]
+
+        self.tree_ = HistogramTree(feature=features,
+                                   threshold=thresholds,
+                                   split_bin=split_bins,
+                                   children_left=np.array(lefts, dtype=np.int64),
+                                   children_right=np.array(rights, dtype=np.int64),
+                                   value=np.array(values)[:, None, :],
+                                   max_depth=tree_depth)
+        return self
+
+    def predict_proba(self, X, binned=False):
+        """
+        Class probabilities for columns of the tree features
+        of raw data or, if `binned`, of binned matrix
+        """
+
+        tree = self.tree_
+        if binned:
+            X, thresholds = np.asarray(X), tree.split_bin
+        else:
+            # Edges are float32 values, as in sklearn trees
+            X, thresholds = np.asarray(X, dtype=np.float32), tree.threshold
+
+        nodes = np.zeros(X.shape[0], dtype=np.int64)
+        active = np.arange(X.shape[0])
+        while active.size:
+            active_nodes = nodes[active]
+            is_inner = tree.children_left[active_nodes] >= 0
+            active, active_nodes = active[is_inner], active_nodes[is_inner]
+            go_left = X[active, tree.feature[active_nodes]] <= thresholds[active_nodes]
+            nodes[active] = np.where(go_left, tree.children_left[active_nodes], tree.children_right[active_nodes])
+
+        return tree.value[nodes, 0, :]
+
+
+def _single_dtree_estimator(X, y, tree_params, seed_modifier):
+    classes = tree_params['classes']
+
+    rng = tree_rng(tree_params['entropy'], seed_modifier)
+
+    current_features_idxs = rng.choice(X.shape[1],
+                                       tree_params['max_features'],
+                                       replace=False
+                                       )
+    bootstrap_idxs = rng.integers(0, X.shape[0], X.shape[0] // 2)
+
+    if tree_params['tree_method'] == 'hist':
+        # X is binned matrix, tree is grown by index arrays
+        dt_classifier = HistogramTreeClassifier(max_depth=tree_params['max_depth'])
+        dt_classifier.fit(X, np.searchsorted(classes, y), bootstrap_idxs, current_features_idxs,
+                          tree_params['bin_edges'], classes)
+    else:
+        X_bootstrap = np.take(X, bootstrap_idxs, axis=0)
+        y_bootstrap = np.take(y, bootstrap_idxs, axis=0)
+        X_bootstrap = np.take(X_bootstrap, current_features_idxs, axis=1)
+
+        dt_classifier = DecisionTreeClassifier(max_depth=tree_params['max_depth'],
+                                               random_state=int(rng.integers(2 ** 31)))
+        dt_classifier.fit(X_bootstrap, y_bootstrap)
+
+    inbag_mask = np.zeros(X.shape[0], dtype=bool)
+    inbag_mask[bootstrap_idxs] = True
+
+    oob_results = None
+    if tree_params['oob_score']:
+        oob_results = _oob_estimate(X, y, dt_classifier, current_features_idxs, inbag_mask, classes, rng,
+                                    binned=tree_params['tree_method'] == 'hist')
+
+    return dt_classifier, current_features_idxs, np.packbits(inbag_mask), oob_results
+
+
+def _oob_estimate(X, y, model, features_idxs, inbag_mask, classes, rng, binned=False):
+    """
+    Out-of-bag probabilities of single tree
+    and accuracy drops after permutation of each tree feature
+
+    Returns tuple of out-of-bag rows, probabilities aligned to forest classes
+    and accuracy drops by features of the tree
+    """
+
+    def predict_proba(X_features):
+        if binned:
+            return model.predict_proba(X_features, binned=True)
+        return model.predict_proba(X_features)
+
+    oob_rows = np.flatnonzero(~inbag_mask)
+    X_oob = np.take(np.take(X, oob_rows, axis=0), features_idxs, axis=1)
+    y_oob = np.take(y, oob_rows)
+
+    oob_proba = np.zeros((oob_rows.size, len(classes)))
+    if oob_rows.size == 0:
+        return oob_rows, oob_proba, np.zeros(len(features_idxs))
+
+    tree_classes_idxs = np.searchsorted(classes, model.classes_)
+    oob_proba[:, tree_classes_idxs] = predict_proba(X_oob)
+    base_accuracy = np.mean(classes[np.argmax(oob_proba, axis=1)] == y_oob)
+
+    accuracy_drops = np.zeros(len(features_idxs))
+    for feature_idx in range(len(features_idxs)):
+        saved_column = X_oob[:, feature_idx].copy()
+        X_oob[:, feature_idx] = rng.permutation(saved_column)
+        permuted_pred = model.classes_[np.argmax(predict_proba(X_oob), axis=1)]
+        accuracy_drops[feature_idx] = base_accuracy - np.mean(permuted_pred == y_oob)
+        X_oob[:, feature_idx] = saved_column
+
+    return oob_rows, oob_proba, accuracy_drops
+
+
+def _reduce_oob(results, samples_number, classes_number, features_number):
+    """
+    Sum out-of-bag results of trees to dense arrays
+    and remove them from trees results
+
+    Returns tuple of probabilities sum, counts of trees by samples,
+    accuracy drops sum and counts of trees by features
+    """
+
+    proba_sum = np.zeros((samples_number, classes_number))
+    proba_counts = np.zeros(samples_number, dtype=np.int64)
+    drops_sum = np.zeros(features_number)
+    drops_counts = np.zeros(features_number, dtype=np.int64)
+
+    for result_idx, (model, features_idxs, inbag_bits, oob_results) in enumerate(results):
+        oob_rows, oob_proba, accuracy_drops = oob_results
+        proba_sum[oob_rows] += oob_proba
+        proba_counts[oob_rows] += 1
+        drops_sum[features_idxs] += accuracy_drops
+        drops_counts[features_idxs] += 1
+        results[result_idx] = (model, features_idxs, inbag_bits, None)
+
+    return proba_sum, proba_counts, drops_sum, drops_counts
+
+
+def _dtree_estimators_chunk_local(X, y, tree_params, seed_modifiers):
+    results = [_single_dtree_estimator(X, y, tree_params, seed_modifier)
+               for seed_modifier in seed_modifiers]
+
+    # Out-of-bag results are summed to send dense arrays once per chunk
+    oob_partial = None
+    if tree_params['oob_score']:
+        oob_partial = _reduce_oob(results, X.shape[0], len(tree_params['classes']), X.shape[1])
+
+    return results, oob_partial
+
+
+def _dtree_estimators_chunk(params):
+    X_spec, y_spec, tree_params, seed_modifiers = params
+    X, y = attach_arrays(X_spec, y_spec)
+
+    return _dtree_estimators_chunk_local(X, y, tree_params, seed_modifiers)
+
+
+def _sum_pred_proba(X, models, features_idxs, classes):
+    """
+    Sum probabilities of trees with columns aligned to forest classes,
+    a tree misses classes absent in its bootstrap sample
+    """
+
+    sum_pred_proba = np.zeros((X.shape[0], len(classes)))
+    for model, idxs in zip(models, features_idxs):
+        X_feature_sample = np.take(X, idxs, axis=1)
+        sum_pred_proba[:, np.searchsorted(classes, model.classes_)] += model.predict_proba(X_feature_sample)
+
+    return sum_pred_proba
+
+
+def _release_shared(shm: shared_memory.SharedMemory):
+    shm.close()
+    shm.unlink()
+
+
+def load_models(key, payload) -> tuple:
+    """
+    Unpickle trees chunk once per worker process and cache it by key,
+    payload is bytes-like object, e.g. view of shared memory block
+    """
+
+    if key not in _loaded_models:
+        _loaded_models[key] = pickle.loads(payload)
+        if len(_loaded_models) > _LOADED_MODELS_LIMIT:
+            _loaded_models.popitem(last=False)
+    return _loaded_models[key]
+
+
+def _pred_proba_chunk(params):
+    X_spec, models_key, models_spec, start, end = params
+    X, models_buffer = attach_arrays(X_spec, models_spec)
+    models, features_idxs, classes = load_models(models_key, models_buffer[start:end])
+
+    return _sum_pred_proba(X, models, features_idxs, classes)
+
+
+def iter_row_blocks(source, block_size: int = 65536):
+    """
+    Iterate over blocks of rows of
+    array, memory-mapped array, path to npy-file
+    or any iterable of row blocks
+    """
+
+    if isinstance(source, (str, os.PathLike)):
+        source = np.load(source, mmap_mode='r')
+
+    if isinstance(source, np.ndarray):
+        for block_start in range(0, source.shape[0], block_size):
+            yield np.asarray(source[block_start:block_start + block_size])
+    else:
+        for block in source:
+            yield np.asarray(block)
+
+
+@dataclass
+class CompiledForest:
+    """
+    All trees of the forest exported to flat node arrays
+    for vectorized inference
+
+    Node indices are global for the whole forest.
+    Feature indices are remapped to columns of the original data.
+    All trees are traversed level by level for the whole batch of samples,
+    (sample, tree) pairs that reached leaves are dropped at each level.
+
+    Attributes
+    ------
+    feature : np.ndarray[int32]
+        Column of X used for split, -1 for leaves
+    threshold : np.ndarray[float64]
+        Samples with value <= threshold go to the left child
+    left, right : np.ndarray[int32]
+        Children nodes indices
+    value : np.ndarray[float64]
+        Class probabilities of nodes, shape (n_nodes, n_classes)
+    roots : np.ndarray[int32]
+        Root node of each tree
+    """
+
+    feature: np.ndarray
+    threshold: np.ndarray
+    left: np.ndarray
+    right: np.ndarray
+    value: np.ndarray
+    roots: np.ndarray
+
+    @classmethod
+    def from_trees(cls, trees, features_idxs_by_tree, classes):
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+
+        for model, features_idxs in zip(trees, features_idxs_by_tree):
+            tree = model.tree_
+            is_leaf = tree.children_left < 0
+
+            features.append(np.where(is_leaf, -1, np.asarray(features_idxs)[np.maximum(tree.feature, 0)]))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, -1, tree.children_left + offset))
+            rights.append(np.where(is_leaf, -1, tree.children_right + offset))
+
+            # Probabilities of tree classes placed to columns of forest classes
+            tree_value = np.zeros((tree.node_count, len(classes)))
+            tree_value[:, np.searchsorted(classes, model.classes_)] = tree.value[:, 0, :]
+            tree_value /= tree_value.sum(axis=1, keepdims=True)
+            values.append(tree_value)
+
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(feature=np.concatenate(features).astype(np.int32),
+                   threshold=np.concatenate(thresholds).astype(np.float64),
+                   left=np.concatenate(lefts).astype(np.int32),
+                   right=np.concatenate(rights).astype(np.int32),
+                   value=np.concatenate(values),
+                   roots=np.array(roots, dtype=np.int32))
+
+    _arrays = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+
+    def save(self, path):
+        """
+        Save node arrays as npy-files into directory
+        """
+
+        os.makedirs(path, exist_ok=True)
+        for array_name in self._arrays:
+            np.save(os.path.join(path, f'{array_name}.npy'), getattr(self, array_name))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load node arrays saved by `save`
+
+        With default mmap_mode arrays are memory-mapped:
+        loading is almost instant and processes
+        using the same files share memory pages.
+        """
+
+        return cls(**{array_name: np.load(os.path.join(path, f'{array_name}.npy'), mmap_mode=mmap_mode)
+                      for array_name in cls._arrays})
+
+    def apply(self, X):
+        """
+        Leaf node of each tree for each sample, shape (n_samples, n_trees)
+        """
+
+        # Trees compare float32 values, as sklearn does
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        X_flat = X.ravel()
+        trees_number = len(self.roots)
+
+        leaves = np.empty(X.shape[0] * trees_number, dtype=np.int32)
+        active = np.arange(leaves.size)
+        nodes = np.tile(self.roots, X.shape[0])
+        row_offsets = np.repeat(np.arange(X.shape[0]) * X.shape[1], trees_number)
+
+        while active.size:
+            features = self.feature[nodes]
+            is_leaf = features < 0
+            if is_leaf.any():
+                leaves[active[is_leaf]] = nodes[is_leaf]
+                is_inner = ~is_leaf
+                active, nodes, row_offsets, features = (active[is_inner], nodes[is_inner],
+                                                        row_offsets[is_inner], features[is_inner])
+
+            go_left = X_flat[row_offsets + features] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return leaves.reshape(X.shape[0], trees_number)
+
+    def predict_proba(self, X, batch_size=4096):
+        """
+        Mean class probabilities of all trees
+
+        Samples are processed in batches of `batch_size`,
+        probabilities are accumulated in place.
+        """
+
+        mean_pred = np.zeros((len(X), self.value.shape[1]))
+
+        for batch_start in range(0, len(X), batch_size):
+            batch_pred = mean_pred[batch_start:batch_start + batch_size]
+            for tree_leaves in self.apply(X[batch_start:batch_start + batch_size]).T:
+                batch_pred += self.value[tree_leaves]
+
+        mean_pred /= len(self.roots)
+
+        return mean_pred
 
 
 class RandomForestClassifierCustom(BaseEstimator):
@@ -19,9 +586,35 @@ class RandomForestClassifierCustom(BaseEstimator):
     To use multiprocessing
     specify parameter
     n_jobs : int, default 1
-    for methods
+    for the estimator or for methods
     `fit`, `predict_proba` and `predict`
 
+    With n_jobs=1 everything runs in the current process.
+    Otherwise trees are grouped into balanced chunks, one per worker.
+    The data are placed to shared memory once
+    and attached by worker processes without copying.
+
+    The pool can be reused between calls:
+    use estimator as context manager, call `start_pool`
+    or pass own executor to methods.
+
+    With backend='thread' trees are fitted and scored by a thread pool
+    directly on the input arrays: sklearn trees release the GIL,
+    so there are no process spawn, shared memory and pickling costs.
+    Workers do not modify the estimator, and fitted estimator
+    can be used for prediction from several threads at once.
+
+    After `compile_forest` the trees are exported to `CompiledForest`
+    and `predict_proba` uses its vectorized in-process traversal.
+    It removes per-tree call overhead, so it is the fastest choice
+    for small batches and online prediction.
+
+    Data larger than memory can be scored block by block
+    by `predict_proba_iter` and `predict_chunks`.
+
+    `save` and `load` store the forest as memory-mappable
+    node arrays of `CompiledForest`.
+
     Params
     ------
     n_estimators: int, default 10
@@ -33,25 +626,185 @@ class RandomForestClassifierCustom(BaseEstimator):
         for 3<=, <6 : 2
         >6 : 1/3 of number of features
     random_state: int, default None
+        Entropy of SeedSequence, each tree gets its own generator
+        spawned from it, so results do not depend on n_jobs
+    n_jobs: int, default 1
+        Used if `n_jobs` is not specified for method
+    backend: {'process', 'thread', 'serial'}, default 'process'
+        Used if `backend` is not specified for method.
+        'serial' runs in the current thread as n_jobs=1.
+        Injected executor or owned pool defines backend by its type
+    oob_score: bool, default False
+        Estimate during `fit` by out-of-bag samples of each tree:
+        `oob_decision_function_`, accuracy `oob_score_`
+        and permutation importance `oob_feature_importances_`
+        as mean accuracy drop by features of the original data.
+        In-bag samples of trees are kept as bitsets in `inbag_masks`
+    warm_start: bool, default False
+        Keep already fitted trees and add new ones up to `n_estimators`,
+        new trees get seeds different from the existing ones
+    tree_method: {'exact', 'hist'}, default 'exact'
+        'exact' - sklearn DecisionTreeClassifier on copies of bootstrap data,
+        'hist' - HistogramTreeClassifier: X is quantized once into uint8 bins
+        by `bin_features` and trees are grown from histograms
+        on the shared binned matrix by index arrays
+    max_bins: int, default 256
+        Maximal number of bins for 'hist' method, from 2 to 256
     """
-    
+
     def __init__(self,
                  n_estimators=10,
                  max_depth=None,
                  max_features=None,
-                 random_state=None
+                 random_state=None,
+                 n_jobs=1,
+                 backend='process',
+                 oob_score=False,
+                 warm_start=False,
+                 tree_method='exact',
+                 max_bins=256
                  ):
         self.n_estimators = n_estimators
         self.max_depth = max_depth
         self.max_features = max_features
         self.random_state = random_state
+        self.n_jobs = n_jobs
+        self.backend = backend
+        self.oob_score = oob_score
+        self.warm_start = warm_start
+        self.tree_method = tree_method
+        self.max_bins = max_bins
         self.trees = []
         self.features_idxs_by_tree = []
+        self.inbag_masks = []
+        self.classes = None
+        self._samples_number = None
+        self._oob_sums = None
+        self._entropy = None
+        self.compiled_forest = None
+        self._pool = None
+        self._fit_id = None
+        self._models_payloads = {}
 
-    def fit(self, X, y, n_jobs=1):
-        self.trees = []
-        self.features_idxs_by_tree = []
+    def start_pool(self, n_jobs=None, backend=None):
+        """
+        Start pool owned by the estimator
+        and reused by `fit` and `predict_proba`.
+        With one worker no pool is started, calls run in the current thread
+        """
+
+        self.close()
+        backend = self._check_backend(backend)
+        workers_number = n_jobs or self.n_jobs
+        if backend != 'serial' and workers_number != 1:
+            self._pool = new_pool(backend, workers_number)
+        return self
+
+    def close(self):
+        """
+        Shut down process pool owned by the estimator
+        and release shared memory with pickled trees
+        """
+
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self._release_models_payloads()
+
+    def _release_models_payloads(self):
+        for release, _ in self._models_payloads.values():
+            release()
+        self._models_payloads = {}
+
+    def __enter__(self):
+        if self._pool is None:
+            self.start_pool()
+        return self
 
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_pool'] = None
+        state['_models_payloads'] = {}
+        return state
+
+    def _check_backend(self, backend):
+        backend = backend or self.backend
+        if backend not in BACKENDS:
+            raise ValueError(f'Incorrect input of "backend": {backend}! '
+                             f'Should be: {", ".join(BACKENDS)}')
+        return backend
+
+    def _execution_plan(self, n_jobs, executor, backend):
+        """
+        Choose backend, executor and number of workers for the call.
+        Injected executor or owned pool defines backend by its type,
+        executor is None if temporary pool is needed.
+        Without executor and owned pool n_jobs=1 of the call
+        or of the estimator runs in the current thread
+
+        Returns (backend, executor, workers_number)
+        """
+
+        backend = self._check_backend(backend)
+        if backend == 'serial' or n_jobs == 1:
+            return 'serial', None, 1
+
+        executor = executor or self._pool
+        if executor is None:
+            n_jobs = n_jobs or self.n_jobs
+            if n_jobs == 1:
+                return 'serial', None, 1
+            return backend, None, n_jobs
+
+        backend = 'thread' if isinstance(executor, ThreadPoolExecutor) else 'process'
+        return backend, executor, getattr(executor, '_max_workers', n_jobs or self.n_jobs)
+
+    @contextmanager
+    def _executor(self, backend, executor, workers_number):
+        """
+        Use given executor or temporary pool of the backend
+        """
+
+        if executor is not None:
+            yield executor
+            return
+        with new_pool(backend, workers_number) as pool:
+            yield pool
+
+    @instrumentation.timed('forest.fit')
+    def fit(self, X, y, n_jobs=None, executor: Executor = None, backend=None):
+        if self.tree_method == 'hist' and not 2 <= self.max_bins <= 256:
+            # Bins are stored as uint8 and histograms have 256 slots per feature
+            raise ValueError(f'Incorrect input of "max_bins": {self.max_bins}! Should be from 2 to 256')
+
+        X = np.ascontiguousarray(X)
+        y = np.ascontiguousarray(y)
+
+        if self.warm_start and self.trees:
+            if len(self.trees) > self.n_estimators:
+                raise ValueError(
+                    f'Parameter n_estimators ({self.n_estimators}) is less than '
+                    f'number of already fitted trees ({len(self.trees)})!')
+            if X.shape[0] != self._samples_number or not np.array_equal(np.unique(y), self.classes):
+                raise ValueError('Warm start requires the same training data as previous fit!')
+        else:
+            if self.warm_start and self.compiled_forest is not None:
+                raise ValueError('Warm start is not possible for loaded compact model without trees!')
+            self.trees = []
+            self.features_idxs_by_tree = []
+            self.inbag_masks = []
+            self._oob_sums = None
+            # Fresh entropy if random_state is None, kept for warm start
+            self._entropy = np.random.SeedSequence(self.random_state).entropy
+            self.classes = np.unique(y)
+            self._samples_number = X.shape[0]
+
+        self.compiled_forest = None
+        self._fit_id = uuid.uuid4().hex
+        self._release_models_payloads()
         features_number = X.shape[1]
 
         # default max_features
@@ -69,73 +822,317 @@ class RandomForestClassifierCustom(BaseEstimator):
                     f'is greater than dataset features number ({features_number})!')
             max_features = self.max_features
 
-        pooled_data = [_ for _ in zip([(X,
-                                        y,
-                                        max_features,
-                                        self.max_depth,
-                                        self.random_state
-                                        )] * self.n_estimators,
-                                      range(self.n_estimators)
-                                      )
-                       ]
-
-        with ProcessPoolExecutor(n_jobs) as pool:
-            results = list(pool.map(self._single_dtree_estimator,
-                                    pooled_data)
-                           )
-
-        for result in results:
-            self.trees.append(result[0])
-            self.features_idxs_by_tree.append(result[1])
+        # Seeds of new trees continue seeds of already fitted ones
+        first_tree_idx = len(self.trees)
+        new_trees_number = self.n_estimators - first_tree_idx
+        if new_trees_number == 0:
+            return self
+
+        backend, executor, workers_number = self._execution_plan(n_jobs, executor, backend)
+        tree_params = {'max_features': max_features,
+                       'max_depth': self.max_depth,
+                       'entropy': self._entropy,
+                       'classes': self.classes,
+                       'oob_score': self.oob_score,
+                       'tree_method': self.tree_method}
+
+        if self.tree_method == 'hist':
+            # Trees are grown on binned matrix, it replaces X in workers
+            with instrumentation.timer('forest.bin_features'):
+                X, tree_params['bin_edges'] = bin_features(X, self.max_bins,
+                                                           rng=np.random.SeedSequence(self._entropy))
+        elif self.tree_method != 'exact':
+            raise ValueError(f'Incorrect input of "tree_method": {self.tree_method}! '
+                             f'Should be: exact or hist')
+
+        trees_chunks = [[first_tree_idx + tree_idx for tree_idx in trees_idxs]
+                        for trees_idxs in split_chunks(new_trees_number, workers_number)]
+
+        if backend == 'serial':
+            chunks_results = [_dtree_estimators_chunk_local(X, y, tree_params, trees_chunks[0])]
+        elif backend == 'thread':
+            # Threads share X and y, each tree has own generator
+            with self._executor(backend, executor, workers_number) as pool:
+                chunks_results = list(pool.map(partial(_dtree_estimators_chunk_local, X, y, tree_params),
+                                               trees_chunks))
+        else:
+            shm_X, X_spec = share_array(X)
+            shm_y, y_spec = share_array(y)
+
+            try:
+                pooled_data = [(X_spec, y_spec, tree_params, trees_idxs) for trees_idxs in trees_chunks]
+                with self._executor(backend, executor, workers_number) as pool:
+                    chunks_results = list(pool.map(_dtree_estimators_chunk, pooled_data))
+            finally:
+                for shm in (shm_X, shm_y):
+                    shm.close()
+                    shm.unlink()
+
+        instrumentation.count('forest.trees_fitted', new_trees_number)
+        for results, _ in chunks_results:
+            for result in results:
+                self.trees.append(result[0])
+                self.features_idxs_by_tree.append(result[1])
+                self.inbag_masks.append(result[2])
+
+        if self.oob_score:
+            oob_partials = [oob_partial for _, oob_partial in chunks_results]
+            if self._oob_sums is not None:
+                oob_partials.append(self._oob_sums)
+            self._set_oob_results(y, oob_partials)
 
         return self
 
-    def _single_dtree_estimator(self, dtree_params):
-        X, y, features_number, depth, random_state = dtree_params[0]
-        seed_modifier = dtree_params[1]
+    def _set_oob_results(self, y, oob_partials):
+        """
+        Combine out-of-bag results of trees chunks
+        """
 
-        seed = self.random_state + seed_modifier
-        random.seed(seed)
-        np.random.seed(seed)
+        self._oob_sums = tuple(np.sum(arrays, axis=0) for arrays in zip(*oob_partials))
+        proba_sum, proba_counts, drops_sum, drops_counts = self._oob_sums
+        has_oob = proba_counts > 0
 
-        current_features_idxs = np.random.choice(X.shape[1],
-                                                 features_number,
-                                                 replace=False
-                                                 )
-        bootstrap_idxs = np.random.choice(X.shape[0], X.shape[0] // 2, replace=True)
+        with np.errstate(invalid='ignore'):
+            self.oob_decision_function_ = proba_sum / proba_counts[:, None]
+        oob_pred = self.classes[np.argmax(proba_sum[has_oob], axis=1)]
+        self.oob_score_ = np.mean(oob_pred == y[has_oob])
+        self.oob_feature_importances_ = drops_sum / np.maximum(drops_counts, 1)
 
-        X_bootstrap = np.take(X, bootstrap_idxs, axis=0)
-        y_bootstrap = np.take(y, bootstrap_idxs, axis=0)
-        X_bootstrap = np.take(X_bootstrap, current_features_idxs, axis=1)
+    def inbag_mask(self, tree_idx):
+        """
+        Boolean mask of samples used to train the tree
+        """
 
-        dt_classifier = DecisionTreeClassifier(max_depth=depth, random_state=seed)
-        dt_classifier.fit(X_bootstrap, y_bootstrap)
+        return np.unpackbits(self.inbag_masks[tree_idx], count=self._samples_number).astype(bool)
 
-        return dt_classifier, current_features_idxs
+    def compile_forest(self):
+        """
+        Export fitted trees to `CompiledForest` for fast inference
+        """
 
-    def predict_proba(self, X, n_jobs=1):
-        pooled_params = [(X, _[0], _[1]) for _ in zip(self.trees,
-                                                      self.features_idxs_by_tree
-                                                      )
-                         ]
+        self.compiled_forest = CompiledForest.from_trees(self.trees, self.features_idxs_by_tree, self.classes)
+        return self
 
-        with ProcessPoolExecutor(n_jobs) as pool:
-            pred_prob = list(pool.map(self._single_pred_proba, pooled_params))
+    def _models_chunks(self, workers_number):
+        """
+        Trees split into chunks and pickled once for the fitted forest
+        to one shared memory block, so tasks carry only its specification.
+        Workers unpickle each chunk once and cache it by key.
+        The block is released on refit, `close` or garbage collection
 
-        mean_pred = np.sum(np.array(pred_prob), axis=0) / self.n_estimators
+        Returns list of (key, block specification, start, end)
+        """
 
-        return mean_pred
+        cached = self._models_payloads.get(workers_number)
+        if cached is None:
+            payloads = [pickle.dumps(([self.trees[tree_idx] for tree_idx in trees_idxs],
+                                      [self.features_idxs_by_tree[tree_idx] for tree_idx in trees_idxs],
+                                      self.classes))
+                        for trees_idxs in split_chunks(len(self.trees), workers_number)]
+            shm, models_spec = share_array(np.frombuffer(b''.join(payloads), dtype=np.uint8))
+            instrumentation.count('forest.models_shared_bytes', shm.size)
+            bounds = np.cumsum([0] + [len(payload) for payload in payloads]).tolist()
+            chunks = [((self._fit_id, workers_number, chunk_idx), models_spec,
+                       bounds[chunk_idx], bounds[chunk_idx + 1])
+                      for chunk_idx in range(len(payloads))]
+            candidate = (weakref.finalize(self, _release_shared, shm), chunks)
+            # setdefault keeps one cached block if threads predict concurrently
+            cached = self._models_payloads.setdefault(workers_number, candidate)
+            if cached is not candidate:
+                candidate[0]()
+        return cached[1]
 
-    def _single_pred_proba(self, params):
-        X, model, idxs = params
-        X_feature_sample = np.take(X, idxs, axis=1)
-        current_pred_proba = model.predict_proba(X_feature_sample)
+    def _submit_pred_proba(self, X, pool, workers_number, backend='process'):
+        """
+        Submit trees chunks for block of rows to the pool.
+        For process backend rows are put to shared memory,
+        trees are read by workers from shared block of `_models_chunks`
+
+        Returns shared memory block (None for threads) and futures
+        """
 
-        return current_pred_proba
+        if backend == 'thread':
+            futures = [pool.submit(_sum_pred_proba, X,
+                                   [self.trees[tree_idx] for tree_idx in trees_idxs],
+                                   [self.features_idxs_by_tree[tree_idx] for tree_idx in trees_idxs],
+                                   self.classes)
+                       for trees_idxs in split_chunks(len(self.trees), workers_number)]
+            return None, futures
 
-    def predict(self, X, n_jobs=1):
-        probas = self.predict_proba(X, n_jobs)
+        shm_X, X_spec = share_array(np.ascontiguousarray(X))
+        try:
+            futures = [pool.submit(_pred_proba_chunk, (X_spec, *models_chunk))
+                       for models_chunk in self._models_chunks(workers_number)]
+        except BaseException:
+            shm_X.close()
+            shm_X.unlink()
+            raise
+        return shm_X, futures
+
+    def _collect_pred_proba(self, shm_X, futures):
+        """
+        Sum results of trees chunks and release shared memory block
+        """
+
+        try:
+            sum_pred = None
+            for future in futures:
+                if sum_pred is None:
+                    sum_pred = future.result()
+                else:
+                    sum_pred += future.result()
+        finally:
+            if shm_X is not None:
+                shm_X.close()
+                shm_X.unlink()
+
+        return sum_pred / len(self.trees)
+
+    def save(self, path):
+        """
+        Save forest in compact format:
+        directory with estimator parameters, classes
+        and node arrays of `CompiledForest`
+
+        sklearn trees are not saved, so the loaded model
+        can be used for prediction only
+        """
+
+        compiled_forest = self.compiled_forest
+        if compiled_forest is None:
+            compiled_forest = CompiledForest.from_trees(self.trees, self.features_idxs_by_tree, self.classes)
+
+        compiled_forest.save(path)
+        np.save(os.path.join(path, 'classes.npy'), self.classes)
+        with open(os.path.join(path, 'params.json'), mode='w') as params_file:
+            json.dump(self.get_params(), params_file)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load forest saved by `save`,
+        node arrays are memory-mapped by default
+        """
+
+        with open(os.path.join(path, 'params.json')) as params_file:
+            forest = cls(**json.load(params_file))
+        forest.classes = np.load(os.path.join(path, 'classes.npy'))
+        forest.compiled_forest = CompiledForest.load(path, mmap_mode)
+
+        return forest
+
+    @instrumentation.timed('forest.predict_proba')
+    def predict_proba(self, X, n_jobs=None, executor: Executor = None, backend=None):
+        instrumentation.count('forest.rows_predicted', len(X))
+        if self.compiled_forest is not None:
+            return self.compiled_forest.predict_proba(X)
+
+        X = np.ascontiguousarray(X)
+        backend, executor, workers_number = self._execution_plan(n_jobs, executor, backend)
+
+        if backend == 'serial':
+            return _sum_pred_proba(X, self.trees, self.features_idxs_by_tree, self.classes) / len(self.trees)
+
+        with self._executor(backend, executor, workers_number) as pool:
+            return self._collect_pred_proba(*self._submit_pred_proba(X, pool, workers_number, backend))
+
+    def predict_proba_iter(self, source, block_size=65536, n_jobs=None, executor: Executor = None,
+                           max_in_flight=2, backend=None):
+        """
+        Predict probabilities block by block for data larger than memory
+
+        Params
+        ------
+        source : np.ndarray, np.memmap, str or iterable
+            Array, path to npy-file (opened as memory map)
+            or iterable of row blocks
+        block_size : int, default 65536
+            Rows in block for array and npy-file sources
+        max_in_flight : int, default 2
+            Maximal number of blocks scored by the pool at the same time
+
+        Yields probabilities of blocks in input order,
+        peak memory is limited by block size.
+        """
+
+        blocks = iter_row_blocks(source, block_size)
+        backend, pool, workers_number = self._execution_plan(n_jobs, executor, backend)
+
+        if self.compiled_forest is not None or backend == 'serial':
+            for block in blocks:
+                yield self.predict_proba(block, backend='serial')
+            return
+
+        own_pool = pool is None
+        if own_pool:
+            pool = new_pool(backend, workers_number)
+
+        in_flight = deque()
+        try:
+            for block in blocks:
+                if len(in_flight) >= max_in_flight:
+                    yield self._collect_pred_proba(*in_flight.popleft())
+                in_flight.append(self._submit_pred_proba(np.ascontiguousarray(block), pool,
+                                                         workers_number, backend))
+                instrumentation.count('forest.rows_predicted', len(block))
+
+            while in_flight:
+                yield self._collect_pred_proba(*in_flight.popleft())
+        finally:
+            for shm_X, futures in in_flight:
+                for future in futures:
+                    future.cancel()
+                for future in futures:
+                    if not future.cancelled():
+                        future.exception()
+                if shm_X is not None:
+                    shm_X.close()
+                    shm_X.unlink()
+            if own_pool:
+                pool.shutdown()
+
+    def predict_chunks(self, source, output_path, n_rows=None, block_size=65536, n_jobs=None,
+                       executor: Executor = None, max_in_flight=2, backend=None):
+        """
+        Predict probabilities by `predict_proba_iter`
+        and write them block by block to npy-file
+
+        Params
+        ------
+        source : np.ndarray, np.memmap, str or iterable
+            See `predict_proba_iter`
+        output_path : str
+            Path to output npy-file with shape (n_rows, n_classes)
+        n_rows : int, default None
+            Total rows number, must be specified for iterable source
+
+        Returns output_path
+        """
+
+        if isinstance(source, (str, os.PathLike)):
+            source = np.load(source, mmap_mode='r')
+        if isinstance(source, np.ndarray):
+            n_rows = source.shape[0]
+        elif n_rows is None:
+            raise ValueError('Parameter n_rows must be specified for iterable source!')
+
+        output = np.lib.format.open_memmap(output_path, mode='w+', dtype=np.float64,
+                                           shape=(n_rows, len(self.classes)))
+        row_start = 0
+        for block_pred in self.predict_proba_iter(source, block_size, n_jobs, executor,
+                                                  max_in_flight, backend):
+            output[row_start:row_start + block_pred.shape[0]] = block_pred
+            row_start += block_pred.shape[0]
+        output.flush()
+        del output
+
+        if row_start != n_rows:
+            raise ValueError(f'Source has {row_start} rows, but n_rows is {n_rows}!')
+
+        return output_path
+
+    def predict(self, X, n_jobs=None, executor: Executor = None, backend=None):
+        probas = self.predict_proba(X, n_jobs, executor, backend)
         predictions = np.argmax(probas, axis=1)
 
         return predictions
-
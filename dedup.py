@@ -0,0 +1,389 @@
+"""
+Removal of duplicate fasta and fastq records
+
+Sequences are kept as 64-bit hashes in NumPy open-addressing table,
+which takes 8 bytes per slot and grows at 75% load, so memory is
+about 11-16 bytes per unique sequence instead of Python strings.
+The first record of duplicates is kept, order of records is preserved.
+Chance of false duplicate by hash collision is about n^2 / 2^65
+for n unique sequences, i.e. ~1e-5 for 10^7 reads.
+
+Modes:
+    'exact' : sequences equal ignoring letters case
+    'reverse_complement' : sequence and its reverse complement
+        are duplicates too, for reads of both strands
+
+Inputs bigger than memory are deduplicated in partitioned mode:
+hashes with record numbers are spilled to `partitions` files on disk
+by hash value, each partition is deduplicated in memory separately,
+then records to keep are written in the second pass over input.
+
+Includes:
+- class `HashSet`
+- functions:
+    `sequence_hash`, `hash_sequences`
+    `deduplicate_batch`, `deduplicate_records`, `deduplicate_file`
+
+Usage:
+    python dedup.py reads.fastq.gz -o unique.fastq.gz --mode reverse_complement
+    python dedup.py huge.fastq -o unique.fastq --spill-dir /scratch --partitions 256
+"""
+
+import argparse
+import gzip
+import hashlib
+import instrumentation
+import numpy as np
+import os
+import sys
+import tempfile
+
+from contextlib import contextmanager
+from pipeline import format_batch, iter_lines, parse_records, read_blocks
+
+MODES = ('exact', 'reverse_complement')
+
+_COMPLEMENT = bytes.maketrans(b'ACGTURYKMBDHVNSW', b'TGCAAYRMKVHDBNSW')
+
+_SPILL_DTYPE = np.dtype([('hash', '<u8'), ('index', '<u8')])
+
+
+def _check_mode(mode: str):
+    if mode not in MODES:
+        raise ValueError(f'Incorrect input of "mode": {mode}! Should be: {" or ".join(MODES)}')
+
+
+def sequence_hash(seq, mode: str = 'exact') -> int:
+    """
+    64-bit hash of sequence, never 0.
+    In 'reverse_complement' mode hash of the lexicographically
+    smaller of sequence and its reverse complement is taken
+
+    Params
+    ------
+    seq : str, bytes or Bio.Seq.Seq
+    mode : {'exact', 'reverse_complement'}, default 'exact'
+    """
+
+    if not isinstance(seq, bytes):
+        seq = str(seq).encode()
+    seq = seq.upper()
+    if mode == 'reverse_complement':
+        seq = min(seq, seq.translate(_COMPLEMENT)[::-1])
+    # 0 marks empty slots of HashSet
+    return int.from_bytes(hashlib.blake2b(seq, digest_size=8).digest(), 'little') or 1
+
+
+def hash_sequences(seqs, mode: str = 'exact') -> np.ndarray:
+    """
+    Hashes of sequences as uint64 array
+    """
+
+    _check_mode(mode)
+    return np.fromiter((sequence_hash(seq, mode) for seq in seqs), dtype=np.uint64)
+
+
+class HashSet:
+    """
+    Set of 64-bit hashes in open-addressing table with linear probing.
+    Batches of hashes are inserted by vectorized probing rounds
+
+    Params
+    ------
+    expected_size : int, default 1024
+        Number of unique hashes the table is allocated for
+    max_load : float, default 0.75
+        Table grows 1.5 times when this fraction of slots is filled
+    """
+
+    def __init__(self, expected_size: int = 1024, max_load: float = 0.75):
+        if not 0 < max_load < 1:
+            raise ValueError(f'Incorrect input of "max_load": {max_load}! Should be between 0 and 1')
+        self.max_load = max_load
+        self.size = 0
+        self.table = np.zeros(self._capacity_for(expected_size), dtype=np.uint64)
+
+    def _capacity_for(self, size: int) -> int:
+        return max(16, int(size / self.max_load) + 1)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes
+
+    def __contains__(self, hash_value: int) -> bool:
+        return bool(self.contains(np.array([hash_value], dtype=np.uint64))[0])
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Boolean mask of hashes present in the set
+        """
+
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        found = np.zeros(len(hashes), dtype=bool)
+        pending = np.flatnonzero(hashes)
+        slots = hashes[pending] % np.uint64(len(self.table))
+        while len(pending):
+            current = self.table[slots]
+            found[pending[current == hashes[pending]]] = True
+            # Probing stops at the key or at the empty slot
+            probing = (current != hashes[pending]) & (current != 0)
+            pending = pending[probing]
+            slots = (slots[probing] + np.uint64(1)) % np.uint64(len(self.table))
+        return found
+
+    def _insert(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Insert unique non-zero keys, table must have free slots for all of them.
+        Returns boolean mask of keys absent before
+        """
+
+        capacity = np.uint64(len(self.table))
+        inserted = np.zeros(len(keys), dtype=bool)
+        pending = np.arange(len(keys))
+        slots = keys % capacity
+        while len(pending):
+            current = self.table[slots]
+            present = current == keys[pending]
+            empty = np.flatnonzero(current == 0)
+            # Keys racing for the same empty slot: the first one takes it,
+            # the others see it occupied in the next round and move on
+            _, winners = np.unique(slots[empty], return_index=True)
+            winners = empty[winners]
+            self.table[slots[winners]] = keys[pending[winners]]
+            inserted[pending[winners]] = True
+
+            done = present
+            done[winners] = True
+            moving = ~done & (current != 0)
+            slots[moving] = (slots[moving] + np.uint64(1)) % capacity
+            pending = pending[~done]
+            slots = slots[~done]
+        self.size += int(inserted.sum())
+        return inserted
+
+    def _grow(self, size: int):
+        keys = self.table[self.table != 0]
+        self.table = np.zeros(max(self._capacity_for(size), int(len(self.table) * 1.5)), dtype=np.uint64)
+        self.size = 0
+        self._insert(keys)
+
+    def add(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Add hashes to the set
+
+        Returns boolean mask of new hashes, for repeated
+        hashes inside the batch only the first one is new
+        """
+
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        keys, first_idxs = np.unique(hashes, return_index=True)
+        if keys.size and keys[0] == 0:
+            raise ValueError('Hash 0 can not be stored, it marks empty slots')
+        if self.size + len(keys) > self.max_load * len(self.table):
+            # Keys already present in the set do not need space
+            new_number = len(keys) - int(self.contains(keys).sum())
+            if self.size + new_number > self.max_load * len(self.table):
+                self._grow(self.size + new_number)
+
+        is_new = np.zeros(len(hashes), dtype=bool)
+        is_new[first_idxs[self._insert(keys)]] = True
+        return is_new
+
+
+def deduplicate_batch(batch: list, hash_set: HashSet, mode: str = 'exact') -> list:
+    """
+    Keep records with sequences not seen in `hash_set` before, set is updated.
+    Records are objects with `seq` attribute: FastaRecord,
+    Bio.SeqRecord.SeqRecord or pipeline.Record
+
+    Used in: deduplicate_records(), pipeline.run_pipeline()
+    """
+
+    if not batch:
+        return []
+    with instrumentation.timer('dedup.hash'):
+        hashes = hash_sequences((record.seq for record in batch), mode)
+    is_new = hash_set.add(hashes)
+    instrumentation.count('dedup.records_in', len(batch))
+    instrumentation.count('dedup.duplicates', len(batch) - int(is_new.sum()))
+    return [record for record, keep in zip(batch, is_new) if keep]
+
+
+def deduplicate_records(records, mode: str = 'exact', hash_set: HashSet = None, batch_size: int = 65536):
+    """
+    Iterate over records skipping duplicated sequences
+
+    Params
+    ------
+    records : iterable
+        Objects with `seq` attribute, e.g. OpenFasta or Bio.SeqIO.parse
+    mode : {'exact', 'reverse_complement'}, default 'exact'
+    hash_set : HashSet, default None
+        Set of seen hashes, can be shared between several inputs
+    batch_size : int, default 65536
+        Records hashed at once
+    """
+
+    _check_mode(mode)
+    hash_set = HashSet() if hash_set is None else hash_set
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield from deduplicate_batch(batch, hash_set, mode)
+            batch = []
+    yield from deduplicate_batch(batch, hash_set, mode)
+
+
+@contextmanager
+def _open_output(output_path: str):
+    if output_path == '-':
+        yield sys.stdout
+        return
+    opener = gzip.open if str(output_path).endswith('.gz') else open
+    with opener(output_path, mode='wt') as output_file:
+        yield output_file
+
+
+def _output_format(batch: list) -> str:
+    return 'fastq' if batch and batch[0].quality is not None else 'fasta'
+
+
+def _spill_partitions(input_path: str, temp_dir: str, mode: str, partitions: int, batch_size: int) -> int:
+    """
+    Write hashes with record numbers to partition files by hash value
+
+    Returns number of records
+
+    Used in: deduplicate_file()
+    """
+
+    partition_files = [open(os.path.join(temp_dir, f'part_{idx}.bin'), mode='wb') for idx in range(partitions)]
+    records_number = 0
+    try:
+        for batch in parse_records(iter_lines(read_blocks(input_path)), batch_size):
+            spilled = np.empty(len(batch), dtype=_SPILL_DTYPE)
+            with instrumentation.timer('dedup.hash'):
+                spilled['hash'] = hash_sequences((record.seq for record in batch), mode)
+            spilled['index'] = np.arange(records_number, records_number + len(batch))
+            records_number += len(batch)
+
+            # Stable sort keeps record numbers ascending inside partition
+            partition_idxs = spilled['hash'] % np.uint64(partitions)
+            order = np.argsort(partition_idxs, kind='stable')
+            bounds = np.searchsorted(partition_idxs[order], np.arange(partitions + 1))
+            for idx in range(partitions):
+                if bounds[idx] < bounds[idx + 1]:
+                    spilled[order[bounds[idx]:bounds[idx + 1]]].tofile(partition_files[idx])
+    finally:
+        for partition_file in partition_files:
+            partition_file.close()
+    return records_number
+
+
+def deduplicate_file(input_path: str,
+                     output_path: str,
+                     mode: str = 'exact',
+                     spill_dir: str = None,
+                     partitions: int = 64,
+                     expected_size: int = 1024,
+                     line_width: int = 0,
+                     batch_size: int = 65536) -> dict:
+    """
+    Remove records with duplicated sequences from fasta or fastq file
+
+    Params
+    ------
+    input_path : str
+        Path to fasta or fastq file, may be gzip or bz2 compressed,
+        '-' for stdin (not in partitioned mode)
+    output_path : str
+        Path to output file of the same format, '.gz' to compress, '-' for stdout
+    mode : {'exact', 'reverse_complement'}, default 'exact'
+    spill_dir : str, default None
+        Directory for temporary partition files, enables partitioned mode.
+        It takes 16 bytes per record on disk and about 16 bytes per record
+        of the largest partition in memory, input is read twice
+    partitions : int, default 64
+        Number of partitions in partitioned mode
+    expected_size : int, default 1024
+        Expected number of unique sequences to allocate hash table at once
+    line_width : int, default 0
+        Width of fasta sequence lines, 0 - single line
+    batch_size : int, default 65536
+
+    Returns dict with numbers of read and written records
+    """
+
+    _check_mode(mode)
+    counts = {'read': 0, 'written': 0}
+
+    if spill_dir is None:
+        hash_set = HashSet(expected_size)
+        with _open_output(output_path) as output_file:
+            for batch in parse_records(iter_lines(read_blocks(input_path)), batch_size):
+                counts['read'] += len(batch)
+                unique = deduplicate_batch(batch, hash_set, mode)
+                counts['written'] += len(unique)
+                output_file.write(format_batch(unique, _output_format(batch), line_width))
+        return counts
+
+    if input_path == '-':
+        raise ValueError('Partitioned mode reads input twice, stdin can not be used')
+    if partitions < 1:
+        raise ValueError(f'Incorrect input of "partitions": {partitions}! Should be positive')
+
+    os.makedirs(spill_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=spill_dir, prefix='dedup_') as temp_dir:
+        with instrumentation.timer('dedup.spill'):
+            records_number = _spill_partitions(input_path, temp_dir, mode, partitions, batch_size)
+
+        # Flags of records to keep are on disk too: 1 byte per record
+        keep = np.memmap(os.path.join(temp_dir, 'keep.bin'), dtype=bool, mode='w+', shape=max(1, records_number))
+        with instrumentation.timer('dedup.partitions'):
+            for idx in range(partitions):
+                partition_path = os.path.join(temp_dir, f'part_{idx}.bin')
+                spilled = np.fromfile(partition_path, dtype=_SPILL_DTYPE)
+                os.remove(partition_path)
+                _, first_idxs = np.unique(spilled['hash'], return_index=True)
+                keep[spilled['index'][first_idxs]] = True
+                del spilled
+
+        offset = 0
+        with _open_output(output_path) as output_file:
+            for batch in parse_records(iter_lines(read_blocks(input_path)), batch_size):
+                batch_keep = keep[offset:offset + len(batch)]
+                offset += len(batch)
+                unique = [record for record, is_kept in zip(batch, batch_keep) if is_kept]
+                counts['written'] += len(unique)
+                output_file.write(format_batch(unique, _output_format(batch), line_width))
+        counts['read'] = records_number
+        del keep
+
+    instrumentation.count('dedup.records_in', counts['read'])
+    instrumentation.count('dedup.duplicates', counts['read'] - counts['written'])
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help="Fasta or fastq file, may be gzip or bz2 compressed, '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="Output file, '.gz' to compress, '-' for stdout")
+    parser.add_argument('--mode', choices=MODES, default='exact')
+    parser.add_argument('--spill-dir', help='Directory for temporary files, enables partitioned mode')
+    parser.add_argument('--partitions', type=int, default=64)
+    parser.add_argument('--expected-size', type=int, default=1024, help='Expected number of unique sequences')
+    parser.add_argument('--line-width', type=int, default=0, help='Width of fasta lines, 0 - single line')
+    args = parser.parse_args()
+
+    counts = deduplicate_file(args.input, args.output, mode=args.mode, spill_dir=args.spill_dir,
+                              partitions=args.partitions, expected_size=args.expected_size,
+                              line_width=args.line_width)
+    print(f'Records read: {counts["read"]}, written: {counts["written"]}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,29 +6,82 @@ The module includes:
 - filter_fastq : function to filter fastq-files
         by GC-content, length and phred-scores
 
+- sample_fastq : fast sampling of fastq-files, FastqSample predicts
+        fraction of records kept by filter_fastq for candidate thresholds
+
 - telegram_logger : the decorator
         allows you to use a telegram bot to track
-        the execution of the decorated function
+        the execution of the decorated function,
+        messages are delivered in background by TelegramSender
 
 - run_genscan : API function
         for Genscan Web Server for exons prediction
+
+- GenscanFeatures : columnar representation of run_genscan results
+        with bulk concatenation and npz/parquet export
+
+Heavy dependencies (numpy, pandas, Biopython, requests, dotenv)
+are imported on first use, so importing the module is fast.
 """
 
+from __future__ import annotations
+
+import atexit
+import cProfile
 import datetime
-import pandas as pd
+import gzip
+import importlib
+import inspect
+import instrumentation
+import math
+import os
+import pstats
+import queue
+import random
 import re
-import requests
 import sys
+import tempfile
+import threading
+import time
+import tracemalloc
 
 from abc import ABC, abstractmethod
-from Bio import SeqIO
-from Bio.SeqUtils import GC
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
-from dotenv import load_dotenv
-from io import BytesIO, StringIO
-from os import getenv
+from functools import lru_cache
+from io import BytesIO, StringIO, TextIOBase
 from typing import List, TextIO
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+class _LazyModule:
+    """
+    Proxy of module imported on first attribute access
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr: str):
+        module = importlib.import_module(self._name)
+        # Later accesses of proxy attributes bypass __getattr__
+        self.__dict__.update(vars(module))
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f'<lazy module {self._name!r}>'
+
+
+np = _LazyModule('numpy')
+pd = _LazyModule('pandas')
+requests = _LazyModule('requests')
+SeqIO = _LazyModule('Bio.SeqIO')
+
 
 class InvalidSequenceSymbolError(ValueError):
     """Custom error for BiologicalSequence descendant classes"""
@@ -221,7 +274,7 @@ def make_thresholds(threshold: int | float | tuple) -> tuple:
     """
     Check threshold inputs and convert single value to tuple
 
-    Used in: filter_fastq
+    Used in: filter_fastq, FastqSample
     """
 
     if isinstance(threshold, int) or isinstance(threshold, float):
@@ -233,16 +286,19 @@ def make_thresholds(threshold: int | float | tuple) -> tuple:
     return lower, upper
 
 
+@instrumentation.timed('filter_fastq')
 def filter_fastq(input_path: str,
                  gc_thresholds: int | float | tuple = (20, 80),
                  len_thresholds: int | float | tuple = (0, 2 ** 32),
                  quality_threshold: int | float = 0,
-                 output_path: str = 'filtered.fastq'):
+                 output_path: str = 'filtered.fastq',
+                 deduplicate: str = None):
     """
     Filters out sequences from fastq file by the specified conditions:
         - GC-content, inside interval include borders, or, if single value, not bigger than specified
         - length, inside interval include borders, or, if single value, not bigger than specified
         - average phred scores, not less than specified
+        - optionally, duplicated sequence, the first passed record is kept
         Default output file name 'filtered.fastq'
 
     Params
@@ -254,8 +310,12 @@ def filter_fastq(input_path: str,
     quality_threshold : int or float, default 0
     output_path : str, default 'filtered.fastq'
         Path to output filtered fastq-file
+    deduplicate : {'exact', 'reverse_complement'}, default None
+        Remove duplicated sequences, see `dedup` module
     """
 
+    from Bio.SeqUtils import GC
+
     records_handle = SeqIO.parse(input_path, 'fastq')
 
     filtered_results = []
@@ -263,19 +323,317 @@ def filter_fastq(input_path: str,
     min_gc, max_gc = make_thresholds(gc_thresholds)
     min_len, max_len = make_thresholds(len_thresholds)
 
-    for record in records_handle:
-        gc_percent = GC(record.seq)
-        phred_values = record.letter_annotations['phred_quality']
+    records_number = 0
+    with instrumentation.timer('filter_fastq.parse_filter'):
+        for record in records_handle:
+            records_number += 1
+            gc_percent = GC(record.seq)
+            phred_values = record.letter_annotations['phred_quality']
+
+            check_gc = min_gc <= gc_percent <= max_gc
+            check_len = min_len <= len(record.seq) <= max_len
+            check_qual = sum(phred_values) / len(phred_values) >= quality_threshold
+
+            if all((check_gc, check_len, check_qual)):
+                filtered_results.append(record)
+
+    if deduplicate:
+        from dedup import deduplicate_records
+
+        with instrumentation.timer('filter_fastq.deduplicate'):
+            filtered_results = list(deduplicate_records(filtered_results, deduplicate))
+
+    with instrumentation.timer('filter_fastq.write'):
+        with open(output_path, 'w') as file:
+            SeqIO.write(filtered_results, file, 'fastq')
+
+    if instrumentation.enabled():
+        instrumentation.count('filter_fastq.records_in', records_number)
+        instrumentation.count('filter_fastq.records_out', len(filtered_results))
+        instrumentation.count('filter_fastq.bytes_in', os.path.getsize(input_path))
+
+
+FASTQ_PROBE_SIZE = 8 * 1024
+
+
+def _fastq_record_metrics(seq: bytes, quality: bytes) -> tuple:
+    """
+    GC-content in percents as Bio.SeqUtils.GC, length and mean phred score
+
+    Used in: sample_fastq()
+    """
+
+    if not seq:
+        return 0.0, 0, 0.0
+    gc_count = sum(seq.count(symbol) for symbol in b'GCSgcs')
+    return gc_count * 100 / len(seq), len(seq), sum(quality) / len(quality) - 33
+
+
+def _parse_fastq_probe(data: bytes, offset: int, at_line_start: bool, is_last: bool, max_records: int) -> list:
+    """
+    Parse complete records from block of fastq-file read at byte offset.
+    Block is synchronized to the first line set looking as a record:
+    '@' header, sequence, '+' line and quality of the same length
+
+    Returns list of (record byte offset, record bytes length, seq, quality)
+
+    Used in: sample_fastq()
+    """
+
+    lines = data.split(b'\n')
+    if not is_last:
+        # The last line may be cut
+        lines.pop()
+    line_starts = [offset]
+    for line in lines:
+        line_starts.append(line_starts[-1] + len(line) + 1)
+    lines = [line.rstrip(b'\r') for line in lines]
+
+    def is_record(idx):
+        return (idx + 3 < len(lines)
+                and lines[idx].startswith(b'@')
+                and lines[idx + 2].startswith(b'+')
+                and len(lines[idx + 1]) == len(lines[idx + 3]))
+
+    # The first line is incomplete if block does not start at line start
+    line_idx = 0 if at_line_start else 1
+    while line_idx < len(lines) and not is_record(line_idx):
+        line_idx += 1
+
+    records = []
+    while len(records) < max_records and is_record(line_idx):
+        records.append((line_starts[line_idx], line_starts[line_idx + 4] - line_starts[line_idx],
+                        lines[line_idx + 1], lines[line_idx + 3]))
+        line_idx += 4
+    return records
+
+
+def _iter_fastq_records(fastq_file):
+    """
+    Iterate over (seq, quality, record bytes length) of binary fastq stream
+    """
+
+    for header in fastq_file:
+        if not header.strip():
+            continue
+        seq = fastq_file.readline()
+        plus = fastq_file.readline()
+        quality = fastq_file.readline()
+        yield seq.rstrip(b'\r\n'), quality.rstrip(b'\r\n'), len(header) + len(seq) + len(plus) + len(quality)
+
+
+@dataclass
+class FastqSample:
+    """
+    Sample of fastq-records for fast estimation of `filter_fastq` results
+
+    Params
+    ------
+    gc : np.ndarray[float64]
+        GC-content in percents
+    length : np.ndarray[int64]
+    mean_quality : np.ndarray[float64]
+        Average phred scores
+    records_number : int
+        Estimated number of records in file,
+        exact for reservoir sampling
+    file_size : int
+    sampled_bytes : int
+        Bytes read by sampling
+    method : str
+        'stride' or 'reservoir'
+    """
+
+    gc: np.ndarray
+    length: np.ndarray
+    mean_quality: np.ndarray
+    records_number: int
+    file_size: int
+    sampled_bytes: int
+    method: str
+
+    def __len__(self) -> int:
+        return len(self.gc)
+
+    def retained_mask(self,
+                      gc_thresholds: int | float | tuple = (20, 80),
+                      len_thresholds: int | float | tuple = (0, 2 ** 32),
+                      quality_threshold: int | float = 0) -> np.ndarray:
+        min_gc, max_gc = make_thresholds(gc_thresholds)
+        min_len, max_len = make_thresholds(len_thresholds)
+        return ((min_gc <= self.gc) & (self.gc <= max_gc)
+                & (min_len <= self.length) & (self.length <= max_len)
+                & (self.mean_quality >= quality_threshold))
+
+    def retained_fraction(self,
+                          gc_thresholds: int | float | tuple = (20, 80),
+                          len_thresholds: int | float | tuple = (0, 2 ** 32),
+                          quality_threshold: int | float = 0,
+                          confidence: float = 0.95) -> tuple:
+        """
+        Predict fraction of records kept by `filter_fastq` with these thresholds
+
+        Returns fraction and bounds of Wilson confidence interval
+        """
+
+        return _wilson_interval(int(self.retained_mask(gc_thresholds, len_thresholds, quality_threshold).sum()),
+                                len(self), confidence)
+
+    def retained_table(self,
+                       gc_thresholds_list: list = ((20, 80),),
+                       len_thresholds_list: list = ((0, 2 ** 32),),
+                       quality_thresholds: list = (0,),
+                       confidence: float = 0.95) -> pd.DataFrame:
+        """
+        Predict retained fraction and records number
+        for all combinations of candidate thresholds
+        """
+
+        rows = []
+        for gc_thresholds in gc_thresholds_list:
+            for len_thresholds in len_thresholds_list:
+                for quality_threshold in quality_thresholds:
+                    fraction, low, high = self.retained_fraction(gc_thresholds, len_thresholds,
+                                                                 quality_threshold, confidence)
+                    rows.append({'gc_thresholds': gc_thresholds,
+                                 'len_thresholds': len_thresholds,
+                                 'quality_threshold': quality_threshold,
+                                 'retained_fraction': fraction,
+                                 'ci_low': low,
+                                 'ci_high': high,
+                                 'retained_records': round(fraction * self.records_number)})
+        return pd.DataFrame(rows)
+
+    def describe(self, quantiles: tuple = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)) -> pd.DataFrame:
+        """
+        Quantiles of GC-content, length and mean quality distributions
+        """
+
+        return pd.DataFrame({'gc': self.gc, 'length': self.length,
+                             'mean_quality': self.mean_quality}).quantile(list(quantiles))
+
+
+def _wilson_interval(successes: int, trials: int, confidence: float = 0.95) -> tuple:
+    """
+    Proportion with Wilson score interval
+
+    Used in: FastqSample.retained_fraction()
+    """
+
+    if trials == 0:
+        return float('nan'), 0.0, 1.0
+    from statistics import NormalDist
 
-        check_gc = min_gc <= gc_percent <= max_gc
-        check_len = min_len <= len(record.seq) <= max_len
-        check_qual = sum(phred_values) / len(phred_values) >= quality_threshold
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    proportion = successes / trials
+    denominator = 1 + z ** 2 / trials
+    center = (proportion + z ** 2 / (2 * trials)) / denominator
+    margin = z * (proportion * (1 - proportion) / trials + z ** 2 / (4 * trials ** 2)) ** 0.5 / denominator
+    return proportion, max(0.0, center - margin), min(1.0, center + margin)
 
-        if all((check_gc, check_len, check_qual)):
-            filtered_results.append(record)
 
-    with open(output_path, 'w') as file:
-        SeqIO.write(filtered_results, file, 'fastq')
+def sample_fastq(input_path: str,
+                 sample_size: int = 10000,
+                 method: str = None,
+                 records_per_probe: int = 10,
+                 seed: int = None) -> FastqSample:
+    """
+    Sample records of fastq-file to estimate GC-content, length
+    and quality distributions without reading the whole file.
+
+    'stride' method reads small blocks at evenly spaced byte offsets
+    with random jitter and takes `records_per_probe` records
+    following each offset, so time does not depend on file size.
+    The first record after random offset is taken,
+    so sampling is not biased to long reads.
+    'reservoir' method reads the whole file and keeps uniform sample,
+    it is used for gzip-compressed files which can not be sought.
+
+    Params
+    ------
+    input_path : str
+        Path to fastq-file, may be gzip-compressed
+    sample_size : int, default 10000
+        Records number, stride sample may be a bit smaller
+        as records of overlapping probes are taken once
+    method : {'stride', 'reservoir'}, default None
+        'stride' for plain files and 'reservoir' for compressed if not specified
+    records_per_probe : int, default 10
+    seed : int, default None
+
+    Returns FastqSample
+    """
+
+    with open(input_path, mode='rb') as fastq_file:
+        is_gzip = fastq_file.read(2) == b'\x1f\x8b'
+    method = method or ('reservoir' if is_gzip else 'stride')
+    if method not in ('stride', 'reservoir'):
+        raise ValueError(f'Incorrect input of "method": {method}! Should be: stride or reservoir')
+    if method == 'stride' and is_gzip:
+        raise ValueError('Stride sampling is not possible for compressed file, use reservoir')
+
+    rng = random.Random(seed)
+    file_size = os.path.getsize(input_path)
+    metrics = []
+    sampled_bytes = 0
+
+    if method == 'stride':
+        probes_number = max(1, -(-sample_size // records_per_probe))
+        probe_offsets = sorted({int((probe_idx + rng.random()) * file_size / probes_number)
+                                for probe_idx in range(probes_number)})
+        seen_offsets = set()
+        records_bytes = 0
+        with open(input_path, mode='rb') as fastq_file:
+            for offset in probe_offsets:
+                fastq_file.seek(max(0, offset - 1))
+                # Byte before offset shows if the block starts at line start
+                at_line_start = offset == 0 or fastq_file.read(1) == b'\n'
+                data = b''
+                read_size = FASTQ_PROBE_SIZE
+                while True:
+                    # Long reads do not fit into probe, it is doubled
+                    chunk = fastq_file.read(read_size)
+                    data += chunk
+                    is_last = len(chunk) < read_size
+                    read_size *= 2
+                    records = _parse_fastq_probe(data, offset, at_line_start, is_last, records_per_probe)
+                    if len(records) == records_per_probe or is_last:
+                        break
+                sampled_bytes += len(data)
+                for record_offset, record_bytes, seq, quality in records:
+                    if record_offset not in seen_offsets:
+                        seen_offsets.add(record_offset)
+                        records_bytes += record_bytes
+                        metrics.append(_fastq_record_metrics(seq, quality))
+        records_number = round(file_size * len(metrics) / records_bytes) if records_bytes else 0
+
+    else:
+        # Algorithm L: number of skipped records is drawn instead of random number per record
+        opener = gzip.open if is_gzip else open
+        reservoir = []
+        records_number = 0
+        weight = math.exp(math.log(rng.random()) / sample_size)
+        next_idx = sample_size + int(math.log(rng.random()) / math.log(1 - weight)) if sample_size else -1
+        with opener(input_path, mode='rb') as fastq_file:
+            for seq, quality, record_bytes in _iter_fastq_records(fastq_file):
+                sampled_bytes += record_bytes
+                if records_number < sample_size:
+                    reservoir.append((seq, quality))
+                elif records_number == next_idx:
+                    reservoir[rng.randrange(sample_size)] = (seq, quality)
+                    weight *= math.exp(math.log(rng.random()) / sample_size)
+                    next_idx += 1 + int(math.log(rng.random()) / math.log(1 - weight))
+                records_number += 1
+        metrics = [_fastq_record_metrics(seq, quality) for seq, quality in reservoir]
+
+    instrumentation.count('sample_fastq.records', len(metrics))
+    instrumentation.count('sample_fastq.bytes_read', sampled_bytes)
+
+    gc, length, mean_quality = (zip(*metrics) if metrics else ((), (), ()))
+    return FastqSample(np.array(gc, dtype=np.float64),
+                       np.array(length, dtype=np.int64),
+                       np.array(mean_quality, dtype=np.float64),
+                       records_number, file_size, sampled_bytes, method)
 
 
 def format_time_delta(time_delta: datetime.timedelta) -> str:
@@ -292,77 +650,666 @@ def format_time_delta(time_delta: datetime.timedelta) -> str:
     return str(time_delta)
 
 
-def telegram_logger(chat_id: int):
+TG_API_URL = 'https://api.telegram.org'
+TG_CAPTION_LIMIT = 1024
+TG_UPLOAD_LIMIT = 50 * 1024 ** 2
+
+
+class StreamCapture(TextIOBase):
+    """
+    Text stream to capture output of function decorated by telegram_logger
+    in bounded memory.
+
+    Output is written to temporary file, which is kept in memory
+    until `spool_size` bytes and then rolled over to disk.
+    The last `tail_size` bytes are kept in a ring buffer.
+
+    Params
+    ------
+    tee_stream : TextIO, default None
+        If specified, output is also written to this stream
+    spool_size : int, default 1 MB
+    tail_size : int, default 64 KB
+    """
+
+    def __init__(self, tee_stream: TextIO = None, spool_size: int = 1024 ** 2, tail_size: int = 64 * 1024):
+        self.tee_stream = tee_stream
+        self.tail_size = tail_size
+        self.size = 0
+        self._spool = tempfile.SpooledTemporaryFile(max_size=spool_size)
+        self._tail = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        data = text.encode(errors='replace')
+        self._spool.write(data)
+        self.size += len(data)
+
+        self._tail += data
+        if len(self._tail) > 2 * self.tail_size:
+            del self._tail[:-self.tail_size]
+
+        if self.tee_stream is not None:
+            self.tee_stream.write(text)
+        return len(text)
+
+    def flush(self):
+        if self.tee_stream is not None:
+            self.tee_stream.flush()
+
+    def tail(self) -> bytes:
+        """
+        Return last `tail_size` bytes of output
+        """
+
+        return bytes(self._tail[-self.tail_size:])
+
+    def iter_chunks(self, chunk_size: int = 1024 ** 2):
+        """
+        Iterate over whole captured output by chunks of bytes
+        """
+
+        self._spool.seek(0)
+        while chunk := self._spool.read(chunk_size):
+            yield chunk
+        self._spool.seek(0, 2)
+
+    def getvalue(self) -> str:
+        return b''.join(self.iter_chunks()).decode(errors='replace')
+
+    def close(self):
+        self._spool.close()
+        super().close()
+
+
+def build_log_attachment(stdout_capture: StreamCapture,
+                         stderr_capture: StreamCapture,
+                         compress: bool = False,
+                         max_size: int = TG_UPLOAD_LIMIT,
+                         report: str = '') -> tuple:
+    """
+    Build telegram_logger attachment from captured streams
+
+    Writes the whole output, gzip-compressed if `compress`.
+    If the result exceeds `max_size`, only the tails
+    of both streams are attached.
+    Non-empty `report` is added to the end as profiling section.
+
+    Returns tuple of file name and content bytes
+
+    Used in: telegram_logger()
+    """
+
+    def write_log(log_file, content, parts):
+        for title, chunks in parts:
+            log_file.write(title.encode())
+            for chunk in chunks:
+                log_file.write(chunk)
+                if content.tell() > max_size:
+                    return False
+        return True
+
+    full_parts = [('Stdout:\n', stdout_capture.iter_chunks()),
+                  ('\nStderr:\n', stderr_capture.iter_chunks())]
+    tail_parts = [(f'Stdout (last {len(stdout_capture.tail())} of {stdout_capture.size} bytes):\n',
+                   [stdout_capture.tail()]),
+                  (f'\nStderr (last {len(stderr_capture.tail())} of {stderr_capture.size} bytes):\n',
+                   [stderr_capture.tail()])]
+
+    if report:
+        full_parts.append(('\nProfile:\n', [report.encode()]))
+        tail_parts.append(('\nProfile:\n', [report.encode()]))
+
+    for parts in (full_parts, tail_parts):
+        content = BytesIO()
+        if compress:
+            with gzip.GzipFile(fileobj=content, mode='wb') as gzip_file:
+                fits = write_log(gzip_file, content, parts)
+        else:
+            fits = write_log(content, content, parts)
+        if fits and content.tell() <= max_size:
+            break
+
+    if compress:
+        return 'logs.txt.gz', content.getvalue()
+    return 'logs.txt', content.getvalue()[:max_size]
+
+
+@lru_cache(maxsize=None)
+def get_tg_api_token() -> str | None:
+    """
+    Load `TG_API_TOKEN` from `.env` file once and cache it
+
+    Used in: TelegramSender
+    """
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return os.getenv('TG_API_TOKEN')
+
+
+def join_captions(captions: list, limit: int = TG_CAPTION_LIMIT) -> str:
+    """
+    Join captions of coalesced messages,
+    dropping the ones that do not fit into telegram caption limit
+
+    Used in: TelegramSender
+    """
+
+    joined = captions[0][:limit]
+    for caption_idx, caption in enumerate(captions[1:], start=1):
+        rest_note = f'\n\n... and {len(captions) - caption_idx} more'
+        if len(joined) + len(caption) + 2 + len(rest_note) > limit:
+            return joined + rest_note
+        joined += '\n\n' + caption
+    return joined
+
+
+class ResourceProfiler:
+    """
+    Lightweight profiler for telegram_logger reports
+
+    Records wall time, CPU time of the calling thread and of the process,
+    peak RSS of the process, optionally top memory allocations
+    made during the call by tracemalloc and top functions by cProfile.
+
+    tracemalloc is global for the process: it is started by the first
+    of nested or concurrent profiled calls and stopped by the last one,
+    allocations of concurrent calls are mixed.
+
+    Params
+    ------
+    tracemalloc_top : int, default 10
+        Number of top allocations to report, 0 to disable tracemalloc
+    cprofile_top : int, default 0
+        Number of top functions by cumulative time to report,
+        0 to disable cProfile
+    cprofile_sample_rate : float, default 1.0
+        Fraction of runs profiled by cProfile
+    """
+
+    # Only one cProfile profiler per thread is possible
+    _cprofile_local = threading.local()
+
+    # Number of running profilers using tracemalloc started by them
+    _tracemalloc_users = 0
+    _tracemalloc_lock = threading.Lock()
+
+    def __init__(self, tracemalloc_top: int = 10, cprofile_top: int = 0, cprofile_sample_rate: float = 1.0):
+        self.tracemalloc_top = tracemalloc_top
+        self.cprofile_top = cprofile_top
+        self.cprofile_sample_rate = cprofile_sample_rate
+        self.wall_time = None
+        self.cpu_time = None
+        self.process_cpu_time = None
+        self.peak_rss = None
+        self.traced_peak = None
+        self.top_allocations = []
+        self.cprofile_stats = ''
+        self._cprofile = None
+        self._uses_tracemalloc = False
+        self._started_tracemalloc = False
+        self._start_snapshot = None
+
+    def _acquire_tracemalloc(self):
+        cls = ResourceProfiler
+        with cls._tracemalloc_lock:
+            if cls._tracemalloc_users == 0:
+                if tracemalloc.is_tracing():
+                    # Tracing is managed by somebody else
+                    self._start_snapshot = self._take_snapshot()
+                    return
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            cls._tracemalloc_users += 1
+            self._uses_tracemalloc = True
+            self._start_snapshot = self._take_snapshot()
+
+    def _release_tracemalloc(self):
+        cls = ResourceProfiler
+        with cls._tracemalloc_lock:
+            if self._uses_tracemalloc:
+                cls._tracemalloc_users -= 1
+                if cls._tracemalloc_users == 0:
+                    tracemalloc.stop()
+            self._uses_tracemalloc = False
+            self._started_tracemalloc = False
+
+    @staticmethod
+    def _take_snapshot():
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, module.__file__) for module in (tracemalloc, cProfile, pstats)])
+
+    def start(self):
+        if self.tracemalloc_top:
+            self._acquire_tracemalloc()
+
+        profile_run = random.random() < self.cprofile_sample_rate
+        if self.cprofile_top and profile_run and not getattr(self._cprofile_local, 'active', False):
+            self._cprofile = cProfile.Profile()
+            try:
+                self._cprofile.enable()
+                self._cprofile_local.active = True
+            except ValueError:  # Another profiler is active
+                self._cprofile = None
+
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.thread_time()
+        self._start_process_cpu = time.process_time()
+
+    def stop(self):
+        self.cpu_time = time.thread_time() - self._start_cpu
+        self.process_cpu_time = time.process_time() - self._start_process_cpu
+        self.wall_time = time.perf_counter() - self._start_wall
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile_local.active = False
+
+        if self._start_snapshot is not None and tracemalloc.is_tracing():
+            # Live memory allocated since the call start
+            stats = self._take_snapshot().compare_to(self._start_snapshot, 'lineno')
+            self.top_allocations = [str(stat) for stat in stats if stat.size_diff > 0][:self.tracemalloc_top]
+            if self._started_tracemalloc:
+                self.traced_peak = tracemalloc.get_traced_memory()[1]
+        self._start_snapshot = None
+        self._release_tracemalloc()
+
+        if self._cprofile is not None:
+            stats_stream = StringIO()
+            stats = pstats.Stats(self._cprofile, stream=stats_stream)
+            stats.sort_stats('cumulative').print_stats(self.cprofile_top)
+            self.cprofile_stats = stats_stream.getvalue()
+            self._cprofile = None
+
+        if resource is not None:
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            self.peak_rss = max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def summary(self) -> str:
+        """
+        Short text for telegram message
+        """
+
+        summary = f'CPU time of thread: `{self.cpu_time:.2f} s`'
+        if self.peak_rss is not None:
+            summary += f', peak RSS: `{self.peak_rss / 1024 ** 2:.1f} MB`'
+        if self.traced_peak is not None:
+            summary += f', traced peak: `{self.traced_peak / 1024 ** 2:.1f} MB`'
+        return summary
+
+    def report(self) -> str:
+        """
+        Full text for log attachment
+        """
+
+        report = (f'Wall time: {self.wall_time:.3f} s\n'
+                  f'CPU time of thread: {self.cpu_time:.3f} s\n'
+                  f'CPU time of process: {self.process_cpu_time:.3f} s\n')
+        if self.peak_rss is not None:
+            report += f'Peak RSS of process: {self.peak_rss / 1024 ** 2:.1f} MB\n'
+        if self.traced_peak is not None:
+            report += f'Traced memory peak of process: {self.traced_peak / 1024 ** 2:.1f} MB\n'
+        if self.top_allocations:
+            report += '\nTop live allocations made during the call:\n' + '\n'.join(self.top_allocations) + '\n'
+        if self.cprofile_stats:
+            report += '\ncProfile:\n' + self.cprofile_stats
+        return report
+
+
+class TelegramSender:
+    """
+    Delivers telegram_logger messages from a background worker thread,
+    so decorated functions do not wait for telegram responses.
+
+    Messages are kept in a queue bounded by number of messages
+    and by their total size. Messages to the same chat
+    pending at the same time are coalesced into a single document.
+    Pending messages are flushed at interpreter exit.
+
+    Params
+    ------
+    api_url : str, default TG_API_URL
+        Telegram Bot API server, can be replaced with local mock server
+    token : str, default None
+        Bot token, if None it is loaded from `.env` once
+    max_queue_size : int, default 1000
+        Messages beyond this number are dropped with warning
+    max_queue_bytes : int, default 4 * TG_UPLOAD_LIMIT
+        Messages beyond this total size of attachments are dropped with warning
+    timeout : float, default 30
+        Timeout of a single request in seconds
+    """
+
+    def __init__(self,
+                 api_url: str = TG_API_URL,
+                 token: str = None,
+                 max_queue_size: int = 1000,
+                 max_queue_bytes: int = 4 * TG_UPLOAD_LIMIT,
+                 timeout: float = 30):
+        self.api_url = api_url
+        self.token = token
+        self.timeout = timeout
+        self.max_queue_bytes = max_queue_bytes
+        self.dropped = 0
+        self._queued_bytes = 0
+        self._queue = queue.Queue(max_queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def send(self, chat_id: int, caption: str, log_content: bytes, filename: str = 'logs.txt'):
+        """
+        Put message to the delivery queue without waiting
+        """
+
+        self._start()
+        with self._lock:
+            fits = self._queued_bytes + len(log_content) <= self.max_queue_bytes
+            if fits:
+                self._queued_bytes += len(log_content)
+        if fits:
+            try:
+                self._queue.put_nowait((chat_id, caption, log_content, filename))
+                return
+            except queue.Full:
+                with self._lock:
+                    self._queued_bytes -= len(log_content)
+        self.dropped += 1
+        print(f'Warning: telegram queue is full, message for chat {chat_id} is dropped',
+              file=sys.__stderr__)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until all queued messages are delivered
+        Returns False if timeout expired first
+        """
+
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks,
+                                                       timeout)
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker,
+                                                name='telegram-sender',
+                                                daemon=True)
+                self._thread.start()
+                atexit.register(self.flush, self.timeout)
+
+    def _worker(self):
+        while True:
+            messages = [self._queue.get()]
+            while True:
+                try:
+                    messages.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Coalesce messages to the same chat with the same attachment type
+            # while the joined attachment fits into telegram upload limit
+            batches = {}
+            for chat_id, caption, log_content, filename in messages:
+                chat_batches = batches.setdefault((chat_id, filename), [[]])
+                batch_size = sum(len(log) for _, log in chat_batches[-1])
+                if chat_batches[-1] and batch_size + len(log_content) > TG_UPLOAD_LIMIT:
+                    chat_batches.append([])
+                chat_batches[-1].append((caption, log_content))
+
+            for (chat_id, filename), chat_batches in batches.items():
+                for chat_messages in chat_batches:
+                    try:
+                        self._post(chat_id, filename, chat_messages)
+                    except Exception as error:
+                        print(f'Warning: telegram message for chat {chat_id} is not delivered: {error}',
+                              file=sys.__stderr__)
+
+            with self._lock:
+                self._queued_bytes -= sum(len(message[2]) for message in messages)
+            for _ in messages:
+                self._queue.task_done()
+
+    def _post(self, chat_id: int, filename: str, chat_messages: list):
+        token = self.token if self.token is not None else get_tg_api_token()
+        captions = [caption for caption, _ in chat_messages]
+
+        if len(chat_messages) == 1:
+            log_content = chat_messages[0][1]
+        else:
+            # Gzip members can be concatenated into valid gzip-file
+            encode_separator = gzip.compress if filename.endswith('.gz') else bytes
+            log_content = b''.join(encode_separator(f'\n===== Message {msg_idx + 1} =====\n'.encode()) + log
+                                   for msg_idx, (_, log) in enumerate(chat_messages))
+
+        url = f'{self.api_url}/bot{token}/sendDocument'
+        params = {'chat_id': chat_id,
+                  'caption': join_captions(captions),
+                  'parse_mode': 'markdown'}
+        files = {'document': (filename, log_content)}
+
+        with instrumentation.timer('telegram.http'):
+            requests.post(url, params=params, files=files, timeout=self.timeout)
+        instrumentation.count('telegram.messages', len(chat_messages))
+        instrumentation.count('telegram.bytes_sent', len(log_content))
+
+
+_default_sender = TelegramSender()
+
+# Stack of (stdout_capture, stderr_capture, tee) of the current thread or asyncio task
+_active_captures = ContextVar('telegram_logger_captures', default=())
+_routers_lock = threading.Lock()
+_routers_users = 0
+
+
+class StreamRouter(TextIOBase):
+    """
+    Replacement of `sys.stdout` or `sys.stderr` used by telegram_logger
+
+    Writes go to all captures active in the current thread or asyncio task,
+    so nested and concurrent decorated calls get their own output.
+    Without active captures writes go to the original stream.
+
+    Params
+    ------
+    stream_idx : int
+        0 for stdout, 1 for stderr
+    original : TextIO
+        Stream replaced by this router
+    """
+
+    def __init__(self, stream_idx: int, original: TextIO):
+        self.stream_idx = stream_idx
+        self.original = original
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        captures = _active_captures.get()
+        tee = not captures
+        for capture in captures:
+            capture[self.stream_idx].write(text)
+            tee = tee or capture[2]
+        if tee:
+            self.original.write(text)
+        return len(text)
+
+    def flush(self):
+        self.original.flush()
+
+
+def install_stream_routers():
+    """
+    Replace `sys.stdout` and `sys.stderr` with StreamRouter
+    for the first active telegram_logger capture
+
+    Used in: telegram_logger()
+    """
+
+    global _routers_users
+
+    with _routers_lock:
+        if _routers_users == 0:
+            sys.stdout = StreamRouter(0, sys.stdout)
+            sys.stderr = StreamRouter(1, sys.stderr)
+        _routers_users += 1
+
+
+def uninstall_stream_routers():
+    """
+    Restore previous `sys.stdout` and `sys.stderr`
+    after the last active telegram_logger capture
+
+    Used in: telegram_logger()
+    """
+
+    global _routers_users
+
+    with _routers_lock:
+        _routers_users -= 1
+        if _routers_users == 0:
+            if isinstance(sys.stdout, StreamRouter):
+                sys.stdout = sys.stdout.original
+            if isinstance(sys.stderr, StreamRouter):
+                sys.stderr = sys.stderr.original
+
+
+def telegram_logger(chat_id: int,
+                    sender: TelegramSender = None,
+                    tee: bool = True,
+                    compress: bool = False,
+                    spool_size: int = 1024 ** 2,
+                    tail_size: int = 64 * 1024,
+                    profile: bool = False,
+                    tracemalloc_top: int = 10,
+                    cprofile_top: int = 0,
+                    cprofile_sample_rate: float = 1.0):
     """
     The decorator allows you to monitor the execution of a function
     and send a message to the telegram bot about completion or an error.
     The message indicates the name of the function, the time spent,
     the error (if any) and attaches a log file.
 
+    Messages are sent in background by `TelegramSender`,
+    so the decorated function does not wait for telegram.
+    Output is captured in bounded memory by `StreamCapture`.
+    If the log exceeds telegram upload limit, only its tail is attached.
+
+    Capture is bound to the current thread or asyncio task,
+    so decorated functions can be nested, run in thread pools
+    or be coroutine functions.
+
     A global system variable `TG_API_TOKEN` must be specified
     in `.env` file
 
     chat_id : int
         user id to whom the message will be sent
+    sender : TelegramSender, default None
+        If None, shared module sender is used
+    tee : bool, default True
+        Also write output to the original stdout and stderr,
+        False - output is only captured to the log
+    compress : bool, default False
+        Attach gzip-compressed log
+    spool_size : int, default 1 MB
+        Size of output kept in memory before spooling to temporary file
+    tail_size : int, default 64 KB
+        Size of the output tail attached instead of too large log
+    profile : bool, default False
+        Report CPU time of the thread and process, peak RSS and top allocations
+        collected by `ResourceProfiler`
+    tracemalloc_top : int, default 10
+        Number of top allocations in report, 0 to skip tracemalloc
+    cprofile_top : int, default 0
+        Number of top functions by cProfile in report, 0 to skip cProfile
+    cprofile_sample_rate : float, default 1.0
+        Fraction of calls profiled by cProfile
     """
 
-    def decorator(func):
-        def inner_function(*args, **kwargs):
+    @contextmanager
+    def monitor_execution(function_name):
+        message_sender = _default_sender if sender is None else sender
 
-            load_dotenv()
-            tg_api_token = getenv('TG_API_TOKEN')
+        # Streams redirections
+        temp_stdout = StreamCapture(None, spool_size, tail_size)
+        temp_stderr = StreamCapture(None, spool_size, tail_size)
+        captures_token = _active_captures.set(_active_captures.get() + ((temp_stdout, temp_stderr, tee),))
+        install_stream_routers()
 
-            try:
-                # Streams redirections
-                temp_stdout = StringIO()
-                temp_stderr = StringIO()
-                sys.stdout = temp_stdout
-                sys.stderr = temp_stderr
-
-                function_name = func.__name__
-
-                start_time = datetime.datetime.now()
-                result = func(*args, **kwargs)
-
-            finally:
-                # Save execution time
-                end_time = datetime.datetime.now()
-                duration = end_time - start_time
-                time_text = format_time_delta(duration)
-
-                # Save outputs from stdout and stderr
-                log_content = f'Stdout:\n{temp_stdout.getvalue()}\nStderr:\n{temp_stderr.getvalue()}'
-                log_content_stream = BytesIO(log_content.encode())
-
-                # Restore system IO-streams
-                sys.stdout = sys.__stdout__
-                sys.stderr = sys.__stderr__
-
-                # Save exceptions information
-                exc_tuple = sys.exc_info()
-
-                if exc_tuple[0]:  # Error case
-                    error_smile = '\U0000274C'
-                    message = (f'{error_smile}\n'
-                               f'Unfortunately, an error occurred while executing the `{function_name}` after\n'
-                               f'`{time_text}` of execution:\n\n'
-                               f'`{str(exc_tuple[0])}`\n`{str(exc_tuple[1])}`')
-
-                else:  # Regular case
-                    success_smile = '\U00002705'
-                    message = (f'{success_smile}\n'
-                               f'The `{function_name}` finished successfully in \n`{time_text}`')
-
-                # Set parameters for request
-                url = f'https://api.telegram.org/bot{tg_api_token}/sendDocument'
-                params = {'chat_id': chat_id,
-                          'caption': message,
-                          'parse_mode': 'markdown'}
-                files = {'document': ('logs.txt', log_content_stream)}
-
-                _ = requests.post(url, params=params, files=files)
-
-            return result
+        profiler = None
+        if profile:
+            profiler = ResourceProfiler(tracemalloc_top, cprofile_top, cprofile_sample_rate)
+            profiler.start()
+
+        start_time = datetime.datetime.now()
+
+        try:
+            yield
+
+        finally:
+            # Save execution time
+            end_time = datetime.datetime.now()
+            duration = end_time - start_time
+            time_text = format_time_delta(duration)
+
+            profile_report = ''
+            if profiler is not None:
+                profiler.stop()
+                profile_report = profiler.report()
+
+            # Restore system IO-streams
+            _active_captures.reset(captures_token)
+            uninstall_stream_routers()
+
+            # Save outputs from stdout and stderr
+            log_name, log_content = build_log_attachment(temp_stdout, temp_stderr, compress,
+                                                         report=profile_report)
+            temp_stdout.close()
+            temp_stderr.close()
+
+            # Save exceptions information
+            exc_tuple = sys.exc_info()
+
+            if exc_tuple[0]:  # Error case
+                error_smile = '\U0000274C'
+                message = (f'{error_smile}\n'
+                           f'Unfortunately, an error occurred while executing the `{function_name}` after\n'
+                           f'`{time_text}` of execution:\n\n'
+                           f'`{str(exc_tuple[0])}`\n`{str(exc_tuple[1])}`')
+
+            else:  # Regular case
+                success_smile = '\U00002705'
+                message = (f'{success_smile}\n'
+                           f'The `{function_name}` finished successfully in \n`{time_text}`')
+
+            if profiler is not None:
+                message += '\n' + profiler.summary()
+
+            message_sender.send(chat_id, message, log_content, log_name)
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            async def inner_coroutine(*args, **kwargs):
+                with monitor_execution(func.__name__):
+                    return await func(*args, **kwargs)
+            return inner_coroutine
+
+        def inner_function(*args, **kwargs):
+            with monitor_execution(func.__name__):
+                return func(*args, **kwargs)
         return inner_function
     return decorator
 
@@ -383,6 +1330,248 @@ class GenscanOutput:
     cds_list: list = None
     intron_list: list = None
 
+    def to_features(self):
+        """
+        Convert to columnar `GenscanFeatures` representation
+        """
+
+        return GenscanFeatures.from_outputs([self])
+
+
+GENSCAN_FEATURE_TYPES = ('exon', 'intron')
+
+
+def _encode_strings(strings: list) -> tuple:
+    """
+    Pack strings into single utf-8 buffer and offsets array
+
+    Used in: GenscanFeatures.save_npz()
+    """
+
+    encoded = [string.encode() for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def _decode_strings(blob: np.ndarray, offsets: np.ndarray) -> list:
+    """
+    Unpack strings packed by `_encode_strings`
+
+    Used in: GenscanFeatures.load_npz()
+    """
+
+    raw = blob.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode() for i in range(len(offsets) - 1)]
+
+
+@dataclass
+class GenscanFeatures:
+    """
+    Columnar representation of one or many GenscanOutput objects
+
+    Exons and introns are stored in parallel NumPy arrays.
+    Labels, cds headers and cds sequences are stored once
+    in the shared string table `strings` and referenced by index.
+
+    Attributes
+    ------
+    status : np.ndarray[int16]
+        Status code of each source GenscanOutput
+    record : np.ndarray[int32]
+        Index of source GenscanOutput for each feature
+    feature_type : np.ndarray[uint8]
+        Feature code, index in GENSCAN_FEATURE_TYPES: 0 - exon, 1 - intron
+    label : np.ndarray[int32]
+        Index of exon label in `strings`
+    start, end : np.ndarray[int64]
+        Feature coordinates as reported by Genscan
+    strand : np.ndarray[int8]
+        1 for plus strand (start <= end), -1 for minus strand
+    cds_record : np.ndarray[int32]
+        Index of source GenscanOutput for each cds
+    cds_header, cds_seq : np.ndarray[int32]
+        Indices of cds fasta-header and sequence in `strings`
+    strings : list
+        Shared string table
+    """
+
+    status: np.ndarray
+    record: np.ndarray
+    feature_type: np.ndarray
+    label: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+    strand: np.ndarray
+    cds_record: np.ndarray
+    cds_header: np.ndarray
+    cds_seq: np.ndarray
+    strings: list
+
+    _columns = ('status', 'record', 'feature_type', 'label', 'start', 'end',
+                'strand', 'cds_record', 'cds_header', 'cds_seq')
+
+    @classmethod
+    def from_outputs(cls, outputs: List[GenscanOutput]):
+        """
+        Build columnar representation from GenscanOutput objects in one pass
+        """
+
+        string_idxs = {}
+        records, types, labels, starts, ends = [], [], [], [], []
+        cds_records, cds_headers, cds_seqs = [], [], []
+
+        def string_idx(string):
+            return string_idxs.setdefault(string, len(string_idxs))
+
+        for record_idx, output in enumerate(outputs):
+            for type_code, features in enumerate((output.exon_list, output.intron_list)):
+                for feature_label, start, end in features or ():
+                    records.append(record_idx)
+                    types.append(type_code)
+                    labels.append(string_idx(str(feature_label)))
+                    starts.append(start)
+                    ends.append(end)
+            for header, seq in output.cds_list or ():
+                cds_records.append(record_idx)
+                cds_headers.append(string_idx(header))
+                cds_seqs.append(string_idx(seq))
+
+        start = np.array(starts, dtype=np.int64)
+        end = np.array(ends, dtype=np.int64)
+
+        return cls(status=np.array([output.status for output in outputs], dtype=np.int16),
+                   record=np.array(records, dtype=np.int32),
+                   feature_type=np.array(types, dtype=np.uint8),
+                   label=np.array(labels, dtype=np.int32),
+                   start=start,
+                   end=end,
+                   strand=np.where(start <= end, 1, -1).astype(np.int8),
+                   cds_record=np.array(cds_records, dtype=np.int32),
+                   cds_header=np.array(cds_headers, dtype=np.int32),
+                   cds_seq=np.array(cds_seqs, dtype=np.int32),
+                   strings=list(string_idxs))
+
+    @classmethod
+    def concat(cls, features_list: list):
+        """
+        Concatenate many GenscanFeatures into one,
+        merging their string tables
+        """
+
+        string_idxs = {}
+        columns = {column: [] for column in cls._columns}
+        record_offset = 0
+
+        for features in features_list:
+            remap = np.array([string_idxs.setdefault(string, len(string_idxs))
+                              for string in features.strings], dtype=np.int32)
+            columns['status'].append(features.status)
+            columns['record'].append(features.record + record_offset)
+            columns['cds_record'].append(features.cds_record + record_offset)
+            for column in ('label', 'cds_header', 'cds_seq'):
+                columns[column].append(remap[getattr(features, column)])
+            for column in ('feature_type', 'start', 'end', 'strand'):
+                columns[column].append(getattr(features, column))
+            record_offset += len(features.status)
+
+        empty = cls.from_outputs([])
+        arrays = {column: np.concatenate(chunks).astype(getattr(empty, column).dtype, copy=False)
+                  if chunks else getattr(empty, column)
+                  for column, chunks in columns.items()}
+
+        return cls(strings=list(string_idxs), **arrays)
+
+    def to_outputs(self) -> List[GenscanOutput]:
+        """
+        Restore list of GenscanOutput objects
+        """
+
+        outputs = [GenscanOutput(int(status)) for status in self.status]
+
+        for record_idx, type_code, label_idx, start, end in zip(self.record.tolist(),
+                                                                self.feature_type.tolist(),
+                                                                self.label.tolist(),
+                                                                self.start.tolist(),
+                                                                self.end.tolist()):
+            attr_name = 'exon_list' if type_code == 0 else 'intron_list'
+            if getattr(outputs[record_idx], attr_name) is None:
+                setattr(outputs[record_idx], attr_name, [])
+            getattr(outputs[record_idx], attr_name).append((self.strings[label_idx], start, end))
+
+        for record_idx, header_idx, seq_idx in zip(self.cds_record.tolist(),
+                                                   self.cds_header.tolist(),
+                                                   self.cds_seq.tolist()):
+            if outputs[record_idx].cds_list is None:
+                outputs[record_idx].cds_list = []
+            outputs[record_idx].cds_list.append((self.strings[header_idx], self.strings[seq_idx]))
+
+        return outputs
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Return long table with exons, introns and cds,
+        one row per feature.
+        Cds rows have label as fasta-header, sequence
+        and coordinates -1
+        """
+
+        strings = np.array(self.strings, dtype=object)
+        n_cds = len(self.cds_record)
+
+        features_df = pd.DataFrame({'record': self.record,
+                                    'status': self.status[self.record],
+                                    'feature_type': np.array(GENSCAN_FEATURE_TYPES)[self.feature_type],
+                                    'label': strings[self.label],
+                                    'start': self.start,
+                                    'end': self.end,
+                                    'strand': self.strand,
+                                    'sequence': None})
+        cds_df = pd.DataFrame({'record': self.cds_record,
+                               'status': self.status[self.cds_record],
+                               'feature_type': 'cds',
+                               'label': strings[self.cds_header],
+                               'start': np.full(n_cds, -1, dtype=np.int64),
+                               'end': np.full(n_cds, -1, dtype=np.int64),
+                               'strand': np.zeros(n_cds, dtype=np.int8),
+                               'sequence': strings[self.cds_seq]})
+
+        return pd.concat([features_df, cds_df], ignore_index=True)
+
+    def to_parquet(self, path: str):
+        """
+        Write `to_dataframe` table to parquet-file
+        Requires pyarrow or fastparquet to be installed
+        """
+
+        self.to_dataframe().to_parquet(path, index=False)
+
+    def save_npz(self, path: str, compressed: bool = False):
+        """
+        Save arrays and packed string table to npz-file
+        """
+
+        blob, offsets = _encode_strings(self.strings)
+        arrays = {column: getattr(self, column) for column in self._columns}
+        save_func = np.savez_compressed if compressed else np.savez
+        save_func(path, strings_blob=blob, strings_offsets=offsets, **arrays)
+
+    @classmethod
+    def load_npz(cls, path: str):
+        """
+        Load GenscanFeatures saved by `save_npz`
+        """
+
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {column: data[column] for column in cls._columns}
+            strings = _decode_strings(data['strings_blob'], data['strings_offsets'])
+
+        return cls(strings=strings, **arrays)
+
+    def __len__(self) -> int:
+        return len(self.record)
+
 
 def check_input_args(organism: str, exon_cutoff: float, seq_str: str, seq_file: str) -> None:
     """
@@ -614,10 +1803,12 @@ def run_genscan(sequence: str = None,
                   file=sys.stderr
                   )
 
-    response = requests.post(url,
-                             headers=hd,
-                             data=request_data
-                             )
+    with instrumentation.timer('genscan.http'):
+        response = requests.post(url,
+                                 headers=hd,
+                                 data=request_data
+                                 )
+    instrumentation.count('genscan.bytes_received', len(response.content))
 
     if response.status_code != 200:
         print(f'Warning: response status code is {response.status_code}! Something went wrong.',
@@ -0,0 +1,277 @@
+"""
+Opt-in instrumentation of the toolkit: stage timers and counters
+
+Disabled by default, then `timer` returns a shared no-op
+context manager and `count` returns at once, so hooks in
+entry points cost one function call.
+
+Enable by environment variable with comma-separated sinks,
+metrics are written at the process exit:
+    DAYWWYD_INSTRUMENT=stderr
+    DAYWWYD_INSTRUMENT=jsonl:metrics.jsonl,prometheus:/var/lib/node_exporter/daywwyd.prom
+
+or by context manager, metrics are written at its exit:
+    with instrument('stderr') as metrics:
+        filter_fastq('reads.fastq')
+
+Includes:
+- class `Metrics` : thread-safe registry of timers and counters
+- sinks `StderrSink`, `JsonLinesSink`, `PrometheusSink`
+- functions:
+    `timer`, `timed`, `add_time`, `count`, `enabled`
+    `instrument`, `configure`, `make_sink`
+"""
+
+import atexit
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+ENV_VARIABLE = 'DAYWWYD_INSTRUMENT'
+
+_NULL_TIMER = nullcontext()
+
+_active_metrics = None
+
+
+class Metrics:
+    """
+    Registry of stage timers and counters
+
+    Timers keep number of calls, total and maximal time in seconds
+    """
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def add_time(self, name: str, seconds: float):
+        with self._lock:
+            calls, total, maximum = self.timers.get(name, (0, 0.0, 0.0))
+            self.timers[name] = (calls + 1, total + seconds, max(maximum, seconds))
+
+    def add_count(self, name: str, value: int | float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'started': self.started,
+                    'time': time.time(),
+                    'pid': os.getpid(),
+                    'timers': {name: {'calls': calls, 'seconds': total, 'max_seconds': maximum}
+                               for name, (calls, total, maximum) in self.timers.items()},
+                    'counters': dict(self.counters)}
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: Metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+
+
+def timer(name: str):
+    """
+    Context manager measuring time of the stage
+    """
+
+    if _active_metrics is None:
+        return _NULL_TIMER
+    return _Timer(_active_metrics, name)
+
+
+def timed(name: str):
+    """
+    Decorator measuring time of function calls
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active_metrics is None:
+                return func(*args, **kwargs)
+            with _Timer(_active_metrics, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_time(name: str, seconds: float):
+    """
+    Add time measured elsewhere, e.g. in worker process
+    """
+
+    if _active_metrics is not None:
+        _active_metrics.add_time(name, seconds)
+
+
+def count(name: str, value: int | float = 1):
+    """
+    Add value to the counter
+    """
+
+    if _active_metrics is not None:
+        _active_metrics.add_count(name, value)
+
+
+def enabled() -> bool:
+    return _active_metrics is not None
+
+
+class StderrSink:
+    """
+    Print metrics table to stderr
+    """
+
+    def emit(self, snapshot: dict):
+        lines = [f'Instrumentation (pid {snapshot["pid"]}):']
+        for name, timer_stats in sorted(snapshot['timers'].items()):
+            lines.append(f'  {name:<40} {timer_stats["calls"]:>8} calls {timer_stats["seconds"]:>10.4f} s '
+                         f'(max {timer_stats["max_seconds"]:.4f} s)')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'  {name:<40} {value:>8}')
+        print('\n'.join(lines), file=sys.stderr)
+
+
+class JsonLinesSink:
+    """
+    Append metrics snapshot as JSON line to file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def emit(self, snapshot: dict):
+        with open(self.path, mode='a') as jsonl_file:
+            jsonl_file.write(json.dumps(snapshot) + '\n')
+
+
+class PrometheusSink:
+    """
+    Write metrics to file in Prometheus text format
+    for node_exporter textfile collector.
+    The file is replaced atomically
+    """
+
+    def __init__(self, path: str, prefix: str = 'daywwyd'):
+        self.path = path
+        self.prefix = prefix
+
+    @staticmethod
+    def _label(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def emit(self, snapshot: dict):
+        prefix = re.sub(r'[^a-zA-Z0-9_]', '_', self.prefix)
+        pid = snapshot['pid']
+        lines = [f'# TYPE {prefix}_stage_seconds_total counter',
+                 f'# TYPE {prefix}_stage_calls_total counter',
+                 f'# TYPE {prefix}_stage_max_seconds gauge',
+                 f'# TYPE {prefix}_events_total counter']
+        for name, timer_stats in sorted(snapshot['timers'].items()):
+            labels = f'{{stage="{self._label(name)}",pid="{pid}"}}'
+            lines.append(f'{prefix}_stage_seconds_total{labels} {timer_stats["seconds"]}')
+            lines.append(f'{prefix}_stage_calls_total{labels} {timer_stats["calls"]}')
+            lines.append(f'{prefix}_stage_max_seconds{labels} {timer_stats["max_seconds"]}')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'{prefix}_events_total{{name="{self._label(name)}",pid="{pid}"}} {value}')
+
+        temp_path = f'{self.path}.{pid}.tmp'
+        with open(temp_path, mode='w') as prom_file:
+            prom_file.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, self.path)
+
+
+def make_sink(spec):
+    """
+    Create sink from specification: 'stderr', 'jsonl:<path>' or 'prometheus:<path>'.
+    Object with `emit(snapshot)` method is returned as is
+    """
+
+    if hasattr(spec, 'emit'):
+        return spec
+    kind, _, path = spec.strip().partition(':')
+    if kind == 'stderr':
+        return StderrSink()
+    if kind == 'jsonl' and path:
+        return JsonLinesSink(path)
+    if kind == 'prometheus' and path:
+        return PrometheusSink(path)
+    raise ValueError(f'Incorrect instrumentation sink: {spec}! '
+                     f'Should be: stderr, jsonl:<path> or prometheus:<path>')
+
+
+def _emit(metrics: Metrics, sinks: list):
+    snapshot = metrics.snapshot()
+    for sink in sinks:
+        sink.emit(snapshot)
+
+
+@contextmanager
+def instrument(*sinks):
+    """
+    Enable instrumentation inside the block, metrics are
+    written to sinks at exit. Yields Metrics
+
+    Params
+    ------
+    sinks : str or objects with `emit(snapshot)` method
+        See `make_sink`. Without sinks metrics are only collected
+    """
+
+    global _active_metrics
+
+    sinks = [make_sink(sink) for sink in sinks]
+    previous_metrics = _active_metrics
+    metrics = Metrics()
+    _active_metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _active_metrics = previous_metrics
+        _emit(metrics, sinks)
+
+
+def configure(spec: str = None) -> Metrics | None:
+    """
+    Enable instrumentation for the whole process by
+    comma-separated sinks specification, metrics are written at exit.
+    Specification is read from DAYWWYD_INSTRUMENT if not given
+
+    Returns Metrics or None if specification is empty
+    """
+
+    global _active_metrics
+
+    spec = os.environ.get(ENV_VARIABLE, '') if spec is None else spec
+    sinks = [make_sink(sink_spec) for sink_spec in spec.split(',') if sink_spec.strip()]
+    if not sinks:
+        return None
+
+    metrics = Metrics()
+    _active_metrics = metrics
+    atexit.register(_emit, metrics, sinks)
+    return metrics
+
+
+try:
+    configure()
+except ValueError as error:
+    print(f'Instrumentation is disabled: {error}', file=sys.stderr)
@@ -0,0 +1,486 @@
+"""
+Streaming pipeline over fasta and fastq files
+
+Chains stages in one pass over the data without intermediate files:
+    decompress -> parse -> filter -> deduplicate -> shift -> convert/write
+
+Each stage is a generator running in its own thread,
+stages are connected by bounded queues, so memory is limited
+by `queue_size` batches of `batch_size` records per stage.
+CPU-heavy stages (filter and shift) can run in a process pool,
+deduplication keeps seen hashes and always runs in its thread.
+
+Includes:
+- data-class `Record`
+- functions:
+    `read_blocks`, `iter_lines`, `parse_records`, `buffered`, `map_batches`
+    `filter_batch`, `shift_batch`, `format_batch`
+    `run_pipeline`
+
+Usage:
+    python pipeline.py reads.fastq.gz -o reads.fasta --gc 30 70 --quality 20 --jobs 4
+    python pipeline.py reads.fastq.gz -o unique.fastq.gz --dedup reverse_complement
+    python pipeline.py genome.fasta -o shifted.fasta --shift 1000
+"""
+
+import argparse
+import bz2
+import gzip
+import instrumentation
+import queue
+import sys
+import threading
+
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+
+from general import make_thresholds
+
+FORMATS = ('fasta', 'fastq')
+
+_END = object()
+
+
+@dataclass
+class Record:
+    """
+    Sequence record passed between pipeline stages
+
+    Params
+    ------
+    header : str
+        Header line without '>' or '@'
+    seq : str
+    quality : str, default None
+        Phred+33 scores of fastq record, None for fasta
+    """
+
+    header: str
+    seq: str
+    quality: str = None
+
+
+def read_blocks(input_path: str, block_size: int = 1024 ** 2):
+    """
+    Read text file by blocks, gzip and bz2 files are
+    decompressed on the fly. Path '-' means stdin
+
+    Used in: run_pipeline()
+    """
+
+    if input_path == '-':
+        while block := sys.stdin.read(block_size):
+            yield block
+        return
+
+    with open(input_path, mode='rb') as raw_file:
+        magic = raw_file.read(3)
+    if magic[:2] == b'\x1f\x8b':
+        opener = gzip.open
+    elif magic == b'BZh':
+        opener = bz2.open
+    else:
+        opener = open
+
+    with opener(input_path, mode='rt') as input_file:
+        while block := input_file.read(block_size):
+            yield block
+
+
+def iter_lines(blocks):
+    """
+    Split text blocks into lines without line breaks
+    """
+
+    carry = ''
+    for block in blocks:
+        lines = (carry + block).split('\n')
+        carry = lines.pop()
+        for line in lines:
+            yield line.rstrip('\r')
+    if carry:
+        yield carry.rstrip('\r')
+
+
+def parse_records(lines, batch_size: int = 1000):
+    """
+    Parse fasta or fastq lines to batches of Records,
+    format is defined by the first symbol.
+    Multi-line fasta sequences are joined
+
+    Used in: run_pipeline()
+    """
+
+    lines = iter(lines)
+    batch = []
+    first_line = next(lines, '')
+
+    if first_line.startswith('@'):
+        header = first_line
+        while header is not None:
+            seq = next(lines, None)
+            plus = next(lines, None)
+            quality = next(lines, None)
+            if quality is None or not plus.startswith('+') or len(seq) != len(quality):
+                raise ValueError(f'Invalid fastq-record: {header}')
+            batch.append(Record(header[1:], seq, quality))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+            header = next(lines, None)
+            while header == '':
+                header = next(lines, None)
+            if header is not None and not header.startswith('@'):
+                raise ValueError(f'Invalid fastq-file format: record starts with "{header[:20]}"')
+
+    elif first_line.startswith('>'):
+        header = first_line[1:]
+        seq_lines = []
+        for line in lines:
+            if line.startswith('>'):
+                batch.append(Record(header, ''.join(seq_lines)))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+                header = line[1:]
+                seq_lines = []
+            else:
+                seq_lines.append(line.strip())
+        batch.append(Record(header, ''.join(seq_lines)))
+
+    elif first_line:
+        raise ValueError('Invalid file format: must begin with ">" or "@"')
+
+    if batch:
+        yield batch
+
+
+def gc_percent(seq: str) -> float:
+    """
+    GC-content in percents, as Bio.SeqUtils.GC
+    """
+
+    if not seq:
+        return 0
+    gc_count = sum(seq.count(symbol) for symbol in 'GCSgcs')
+    return gc_count * 100 / len(seq)
+
+
+def filter_batch(batch: list,
+                 gc_thresholds: tuple = (0, 100),
+                 len_thresholds: tuple = (0, 2 ** 32),
+                 quality_threshold: int | float = 0) -> list:
+    """
+    Keep records passing `filter_fastq` conditions,
+    quality is not checked for fasta records
+    """
+
+    min_gc, max_gc = make_thresholds(gc_thresholds)
+    min_len, max_len = make_thresholds(len_thresholds)
+
+    filtered = []
+    for record in batch:
+        if not min_gc <= gc_percent(record.seq) <= max_gc:
+            continue
+        if not min_len <= len(record.seq) <= max_len:
+            continue
+        if record.quality is not None and quality_threshold:
+            if not record.quality:
+                continue
+            mean_quality = sum(record.quality.encode()) / len(record.quality) - 33
+            if mean_quality < quality_threshold:
+                continue
+        filtered.append(record)
+    return filtered
+
+
+def shift_batch(batch: list, shift_idx: int) -> list:
+    """
+    Rewrite sequences as circular starting from `shift_idx`,
+    indexing as in `change_fasta_start_pos`,
+    index out of sequence length wraps around
+    """
+
+    shifted = []
+    for record in batch:
+        if shift_idx > 1:
+            seq_shift = shift_idx - 1
+        else:
+            seq_shift = min(shift_idx, 0)
+        seq_shift = seq_shift % len(record.seq) if record.seq else 0
+
+        quality = record.quality
+        if quality is not None:
+            quality = quality[seq_shift:] + quality[:seq_shift]
+        shifted.append(Record(f'{record.header}_shifted_to_{shift_idx}',
+                              record.seq[seq_shift:] + record.seq[:seq_shift],
+                              quality))
+    return shifted
+
+
+def format_batch(batch: list, output_format: str, line_width: int = 0) -> str:
+    """
+    Convert batch of Records to fasta or fastq text,
+    fasta sequences are wrapped by `line_width` if it is not 0
+    """
+
+    if not batch:
+        return ''
+
+    lines = []
+    for record in batch:
+        if output_format == 'fastq':
+            if record.quality is None:
+                raise ValueError(f'Fasta record can not be written as fastq: {record.header}')
+            lines.extend(('@' + record.header, record.seq, '+', record.quality))
+        else:
+            lines.append('>' + record.header)
+            if line_width:
+                lines.extend(record.seq[start:start + line_width]
+                             for start in range(0, len(record.seq), line_width))
+            else:
+                lines.append(record.seq)
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def buffered(iterable, queue_size: int = 8):
+    """
+    Run iterable in a background thread and yield
+    its items through bounded queue.
+    Exceptions of the stage are raised in consumer
+
+    Used in: run_pipeline()
+    """
+
+    items = queue.Queue(queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_END)
+        except BaseException as error:
+            put(error)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while (item := items.get()) is not _END:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def map_batches(func, batches, executor: Executor = None, max_in_flight: int = 4, stage_name: str = 'stage'):
+    """
+    Apply function to batches in order, in current thread
+    or in executor with limited number of batches in flight.
+    Time of stage is instrumented for the current thread only
+
+    Used in: run_pipeline()
+    """
+
+    if executor is None:
+        timer_name = f'pipeline.{stage_name}'
+        for batch in batches:
+            with instrumentation.timer(timer_name):
+                processed = func(batch)
+            yield processed
+        return
+
+    in_flight = deque()
+    try:
+        for batch in batches:
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+            in_flight.append(executor.submit(func, batch))
+        while in_flight:
+            yield in_flight.popleft().result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def _chain_first(first_batch, batches):
+    if first_batch:
+        yield first_batch
+    yield from batches
+
+
+@instrumentation.timed('pipeline.run')
+def run_pipeline(input_path: str,
+                 output_path: str,
+                 gc_thresholds: int | float | tuple = None,
+                 len_thresholds: int | float | tuple = None,
+                 quality_threshold: int | float = None,
+                 shift_idx: int = None,
+                 deduplicate: str = None,
+                 output_format: str = None,
+                 line_width: int = 0,
+                 n_jobs: int = 1,
+                 executor: Executor = None,
+                 batch_size: int = 1000,
+                 queue_size: int = 8) -> dict:
+    """
+    Process fasta or fastq file in one streaming pass
+
+    Filter is applied if any of its thresholds is specified,
+    not specified thresholds do not restrict records.
+    Output is gzip-compressed if its path ends with '.gz'
+
+    Params
+    ------
+    input_path : str
+        Path to fasta or fastq file, may be gzip or bz2 compressed, '-' for stdin
+    output_path : str
+        Path to output file, '-' for stdout
+    gc_thresholds, len_thresholds, quality_threshold :
+        As in `filter_fastq`, default None
+    shift_idx : int, default None
+        Start position of circular sequences as in `change_fasta_start_pos`
+    deduplicate : {'exact', 'reverse_complement'}, default None
+        Remove records with duplicated sequences after filter, see `dedup` module
+    output_format : {'fasta', 'fastq'}, default None
+        Format of input if not specified
+    line_width : int, default 0
+        Width of fasta sequence lines, 0 - single line
+    n_jobs : int, default 1
+        Number of processes for filter and shift stages,
+        1 - stages run in threads of the pipeline
+    executor : Executor, default None
+        Own executor for filter and shift stages, overrides n_jobs
+    batch_size : int, default 1000
+        Records in batch passed between stages
+    queue_size : int, default 8
+        Maximal number of batches in queue between stages
+
+    Returns dict with numbers of read and written records
+    """
+
+    counts = {'read': 0, 'written': 0}
+    batches = buffered(parse_records(iter_lines(buffered(read_blocks(input_path), queue_size)), batch_size),
+                       queue_size)
+
+    first_batch = next(batches, [])
+    input_format = 'fastq' if first_batch and first_batch[0].quality is not None else 'fasta'
+    output_format = output_format or input_format
+    if output_format not in FORMATS:
+        raise ValueError(f'Incorrect input of "output_format": {output_format}! Should be: fasta or fastq')
+
+    def counted(batches, key):
+        for batch in batches:
+            counts[key] += len(batch)
+            yield batch
+
+    # (name, function, can run in executor)
+    stages = []
+    if gc_thresholds is not None or len_thresholds is not None or quality_threshold is not None:
+        stages.append(('filter', partial(filter_batch,
+                                         gc_thresholds=(0, 100) if gc_thresholds is None else gc_thresholds,
+                                         len_thresholds=(0, 2 ** 32) if len_thresholds is None else len_thresholds,
+                                         quality_threshold=quality_threshold or 0), True))
+    if deduplicate:
+        from dedup import MODES, HashSet, deduplicate_batch
+
+        if deduplicate not in MODES:
+            raise ValueError(f'Incorrect input of "deduplicate": {deduplicate}! Should be: {" or ".join(MODES)}')
+        stages.append(('deduplicate', partial(deduplicate_batch, hash_set=HashSet(), mode=deduplicate), False))
+    if shift_idx is not None:
+        stages.append(('shift', partial(shift_batch, shift_idx=shift_idx), True))
+
+    own_pool = executor is None and n_jobs != 1 and any(parallel for _, _, parallel in stages)
+    if own_pool:
+        executor = ProcessPoolExecutor(n_jobs)
+
+    try:
+        stream = counted(_chain_first(first_batch, batches), 'read')
+        for stage_name, stage, parallel in stages:
+            stream = buffered(map_batches(stage, stream, executor if parallel else None, stage_name=stage_name),
+                              queue_size)
+        text_chunks = buffered(map_batches(partial(format_batch, output_format=output_format,
+                                                   line_width=line_width),
+                                           counted(stream, 'written'), stage_name='format'),
+                               queue_size)
+
+        if output_path == '-':
+            output_file = sys.stdout
+        elif str(output_path).endswith('.gz'):
+            output_file = gzip.open(output_path, mode='wt')
+        else:
+            output_file = open(output_path, mode='w')
+        try:
+            for text in text_chunks:
+                with instrumentation.timer('pipeline.write'):
+                    output_file.write(text)
+        finally:
+            if output_file is not sys.stdout:
+                output_file.close()
+    finally:
+        if own_pool:
+            executor.shutdown(cancel_futures=True)
+
+    instrumentation.count('pipeline.records_read', counts['read'])
+    instrumentation.count('pipeline.records_written', counts['written'])
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help="Fasta or fastq file, may be gzip or bz2 compressed, '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="Output file, '.gz' to compress, '-' for stdout")
+    parser.add_argument('--gc', type=float, nargs='+', help='GC-content thresholds: upper or lower upper')
+    parser.add_argument('--length', type=int, nargs='+', help='Length thresholds: upper or lower upper')
+    parser.add_argument('--quality', type=float, help='Minimal average phred score')
+    parser.add_argument('--shift', type=int, help='Start position of circular sequences')
+    parser.add_argument('--dedup', choices=('exact', 'reverse_complement'),
+                        help='Remove duplicated sequences, optionally with reverse complements')
+    parser.add_argument('--format', choices=FORMATS, help='Output format, format of input by default')
+    parser.add_argument('--line-width', type=int, default=0, help='Width of fasta lines, 0 - single line')
+    parser.add_argument('--jobs', type=int, default=1, help='Processes for filter and shift stages')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--queue-size', type=int, default=8)
+    args = parser.parse_args()
+
+    def thresholds(values):
+        if values is None:
+            return None
+        if len(values) == 1:
+            return values[0]
+        return tuple(values[:2])
+
+    counts = run_pipeline(args.input, args.output,
+                          gc_thresholds=thresholds(args.gc),
+                          len_thresholds=thresholds(args.length),
+                          quality_threshold=args.quality,
+                          shift_idx=args.shift,
+                          deduplicate=args.dedup,
+                          output_format=args.format,
+                          line_width=args.line_width,
+                          n_jobs=args.jobs,
+                          batch_size=args.batch_size,
+                          queue_size=args.queue_size)
+    print(f'Records read: {counts["read"]}, written: {counts["written"]}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
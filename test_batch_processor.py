@@ -0,0 +1,107 @@
+import os
+import pytest
+
+from functools import partial
+
+from batch_processor import load_manifest, plan_tasks, run_batch
+from bio_files_processor import convert_multiline_fasta_to_oneline
+
+
+@pytest.fixture
+def fasta_dir(tmp_path):
+    input_dir = tmp_path / 'input'
+    input_dir.mkdir()
+    for file_idx in range(6):
+        content = ''.join(f'>seq{record_idx}\n' + 'ACGT\nGG\n' * (file_idx + 1) for record_idx in range(file_idx + 1))
+        (input_dir / f'sample_{file_idx}.fasta').write_text(content)
+    return input_dir
+
+
+def test_run_batch_and_resume(fasta_dir, tmp_path):
+    """
+    Test files processed in pool are the same as processed one by one
+    and resumed run skips completed files
+    """
+    output_dir = tmp_path / 'output'
+    results = run_batch(str(fasta_dir / '*.fasta'), 'convert_multiline_fasta_to_oneline', str(output_dir),
+                        n_jobs=2, output_suffix='_oneline', progress=False, max_files_per_task=2)
+
+    assert [result.status for result in results] == ['done'] * 6
+    for result in results:
+        convert_multiline_fasta_to_oneline(result.input_path, str(tmp_path / 'target.fasta'))
+        with open(result.output_path) as output_file, open(tmp_path / 'target.fasta') as target_file:
+            assert output_file.read() == target_file.read()
+    assert len(load_manifest(output_dir / 'manifest.jsonl')) == 6
+
+    (fasta_dir / 'sample_3.fasta').write_text('>changed\nAC\nGT\n')
+    calls = []
+    resumed = run_batch(str(fasta_dir / '*.fasta'), 'convert_multiline_fasta_to_oneline', str(output_dir),
+                        n_jobs=1, output_suffix='_oneline', progress=lambda *args: calls.append(args))
+    assert [result.status for result in resumed] == ['skipped'] * 3 + ['done'] + ['skipped'] * 2
+    assert len(calls) == 1
+    assert (output_dir / 'sample_3_oneline.fasta').read_text() == '>changed\nACGT\n'
+
+
+def test_run_batch_failed_file_and_params(fasta_dir, tmp_path):
+    """
+    Test failed file is reported and not recorded as completed,
+    other params of operation make files to be processed again
+    """
+    (fasta_dir / 'broken.fasta').write_text('ACGT\n')
+    output_dir = tmp_path / 'output'
+
+    results = run_batch([str(fasta_dir / 'broken.fasta'), str(fasta_dir / 'sample_0.fasta')],
+                        'change_fasta_start_pos', str(output_dir), {'shift_idx': 2}, n_jobs=2, progress=False)
+    assert [result.status for result in results] == ['failed', 'done']
+    assert 'FastaFormatError' in results[0].error
+    assert list(load_manifest(output_dir / 'manifest.jsonl')) == [results[1].input_path]
+
+    rerun = run_batch(str(fasta_dir / 'sample_0.fasta'), 'change_fasta_start_pos', str(output_dir),
+                      {'shift_idx': 3}, n_jobs=1, progress=False)
+    assert rerun[0].status == 'done'
+    assert (output_dir / 'sample_0.fasta').read_text().startswith('>seq0_shifted_to_3')
+
+
+def test_run_batch_missing_input(fasta_dir, tmp_path):
+    """
+    Test missing literal path is reported as failed, glob matches only existing files
+    """
+    (fasta_dir / 'subdir.fasta').mkdir()
+    output_dir = tmp_path / 'output'
+
+    results = run_batch([str(fasta_dir / 'missing.fasta'), str(fasta_dir / 'sample_1*')],
+                        'convert_multiline_fasta_to_oneline', str(output_dir), n_jobs=1, progress=False)
+    assert [(os.path.basename(result.input_path), result.status) for result in results] == \
+        [('missing.fasta', 'failed'), ('sample_1.fasta', 'done')]
+    assert 'FileNotFoundError' in results[0].error
+    assert list(load_manifest(output_dir / 'manifest.jsonl')) == [results[1].input_path]
+
+    results = run_batch(str(fasta_dir / '*.fasta'), 'convert_multiline_fasta_to_oneline', str(output_dir),
+                        n_jobs=1, progress=False)
+    assert len(results) == 6 and 'subdir.fasta' not in {os.path.basename(result.input_path) for result in results}
+
+
+def test_run_batch_partial_operation(fasta_dir, tmp_path):
+    """
+    Test operation without __qualname__ and __name__ such as partial
+    """
+    operation = partial(convert_multiline_fasta_to_oneline)
+    results = run_batch(str(fasta_dir / 'sample_1.fasta'), operation, str(tmp_path / 'output'),
+                        n_jobs=1, progress=False)
+    assert results[0].status == 'done'
+    assert (tmp_path / 'output' / 'sample_1.fasta').read_text() == '>seq0\nACGTGGACGTGG\n>seq1\nACGTGGACGTGG\n'
+
+    rerun = run_batch(str(fasta_dir / 'sample_1.fasta'), operation, str(tmp_path / 'output'),
+                      n_jobs=1, progress=False)
+    assert rerun[0].status == 'skipped'
+
+
+def test_plan_tasks_largest_first():
+    """
+    Test large files go alone first and small files are packed
+    """
+    files = [(f'small_{idx}', f'out_{idx}', 1) for idx in range(10)] + [('large', 'out_large', 100)]
+    tasks = plan_tasks(files, workers_number=2, max_files_per_task=4)
+
+    assert tasks[0] == [('large', 'out_large', 100)]
+    assert [len(task) for task in tasks[1:]] == [4, 4, 2]
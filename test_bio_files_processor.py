@@ -0,0 +1,90 @@
+import pytest
+import random
+
+import bio_files_processor
+
+from bio_files_processor import FastaFormatError, change_fasta_start_pos, read_shifts
+
+
+def read_fasta(path):
+    records = {}
+    with open(path) as fasta_file:
+        for line in fasta_file:
+            if line.startswith('>'):
+                header = line[1:].strip()
+                records[header] = ''
+            else:
+                records[header] += line.strip()
+    return records
+
+
+@pytest.fixture
+def multi_fasta(tmp_path):
+    """
+    Records with uniform, irregular and CRLF line breaks
+    """
+    rng = random.Random(1)
+    seqs = {f'seq{idx}': ''.join(rng.choice('ACGT') for _ in range(length))
+            for idx, length in enumerate((95, 60, 7, 130))}
+    path = tmp_path / 'multi.fasta'
+    with open(path, mode='wb') as fasta_file:
+        fasta_file.write(b'>seq0 uniform\n' + b'\n'.join(seqs['seq0'][i:i + 20].encode()
+                                                         for i in range(0, 95, 20)) + b'\n')
+        fasta_file.write(b'>seq1 irregular\n' + seqs['seq1'][:13].encode() + b'\n'
+                         + seqs['seq1'][13:50].encode() + b'\n\n' + seqs['seq1'][50:].encode() + b'\n')
+        fasta_file.write(b'>seq2\n' + seqs['seq2'].encode() + b'\n')
+        fasta_file.write(b'>seq3 crlf\r\n' + b'\r\n'.join(seqs['seq3'][i:i + 30].encode()
+                                                          for i in range(0, 130, 30)))
+    return path, seqs
+
+
+@pytest.mark.parametrize('block_size', [7, 1024 ** 2])
+def test_change_fasta_start_pos_multi_record(multi_fasta, tmp_path, monkeypatch, block_size):
+    """
+    Test rotation of wrapped records is the same as rotation of strings
+    for any block size
+    """
+    monkeypatch.setattr(bio_files_processor, 'FASTA_BLOCK_SIZE', block_size)
+    path, seqs = multi_fasta
+
+    for shift_idx in (0, 1, 5, -3, 61, 200, -140):
+        applied = change_fasta_start_pos(str(path), shift_idx, str(tmp_path / 'out.fasta'), line_width=0)
+        start = shift_idx - 1 if shift_idx > 1 else min(shift_idx, 0)
+        result = read_fasta(tmp_path / 'out.fasta')
+        for (fasta_id, seq), (header, rotated) in zip(seqs.items(), result.items()):
+            assert header.endswith(f'_shifted_to_{shift_idx}')
+            assert rotated == seq[start % len(seq):] + seq[:start % len(seq)]
+        assert applied == {fasta_id: shift_idx for fasta_id in seqs}
+
+
+def test_change_fasta_start_pos_shifts_and_motif(multi_fasta, tmp_path):
+    """
+    Test per-record shifts keep other records unchanged,
+    motif spanning the sequence end is found
+    """
+    path, seqs = multi_fasta
+    shifts_path = tmp_path / 'shifts.tsv'
+    shifts_path.write_text('seq1\t10\n# comment\nseq3\t-1\n')
+
+    change_fasta_start_pos(str(path), output_fasta=str(tmp_path / 'out.fasta'), shifts=read_shifts(shifts_path))
+    result = list(read_fasta(tmp_path / 'out.fasta').values())
+    assert result == [seqs['seq0'], seqs['seq1'][9:] + seqs['seq1'][:9],
+                      seqs['seq2'], seqs['seq3'][-1:] + seqs['seq3'][:-1]]
+    with open(tmp_path / 'out.fasta') as out_file:
+        assert out_file.readline() == '>seq0 uniform\n'
+        assert len(out_file.readline().strip()) == 20
+
+    motif = (seqs['seq0'][-3:] + seqs['seq0'][:4]).lower()
+    applied = change_fasta_start_pos(str(path), output_fasta=str(tmp_path / 'out.fasta'), motif=motif)
+    assert applied['seq0'] == 93
+    assert read_fasta(tmp_path / 'out.fasta')['seq0 uniform_shifted_to_93'].startswith(motif.upper())
+
+
+def test_change_fasta_start_pos_incorrect_input(tmp_path):
+    """
+    Test file not starting with '>' raises FastaFormatError
+    """
+    path = tmp_path / 'bad.fasta'
+    path.write_text('ATGC\n')
+    with pytest.raises(FastaFormatError):
+        change_fasta_start_pos(str(path), 2, str(tmp_path / 'out.fasta'))
@@ -0,0 +1,255 @@
+import numpy as np
+import pickle
+import pytest
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from sklearn.datasets import make_classification
+
+import custom_random_forest
+import instrumentation
+
+from custom_random_forest import RandomForestClassifierCustom, bin_features
+
+
+@pytest.fixture
+def dataset():
+    return make_classification(n_samples=300, n_features=10, n_informative=5, random_state=0)
+
+
+def test_fit_n_jobs_same_trees(dataset):
+    """
+    Test that trees trained in one and several processes give the same predictions
+    """
+    X, y = dataset
+    single = RandomForestClassifierCustom(n_estimators=6, max_depth=4, random_state=42).fit(X, y, n_jobs=1)
+    pooled = RandomForestClassifierCustom(n_estimators=6, max_depth=4, random_state=42).fit(X, y, n_jobs=3)
+
+    assert np.allclose(single.predict_proba(X), pooled.predict_proba(X))
+    assert (single.predict(X) == y).mean() > 0.8
+
+
+def test_reused_and_injected_pool(dataset):
+    """
+    Test estimator owned pool and injected executor give the same results as in-process run
+    """
+    X, y = dataset
+    single = RandomForestClassifierCustom(n_estimators=5, random_state=1).fit(X, y)
+
+    with RandomForestClassifierCustom(n_estimators=5, random_state=1, n_jobs=2) as owned:
+        owned.fit(X, y)
+        first_pool = owned._pool
+        owned_proba = owned.predict_proba(X)
+        assert owned._pool is first_pool
+    assert owned._pool is None
+
+    with ProcessPoolExecutor(2) as pool:
+        injected_proba = single.predict_proba(X, executor=pool)
+
+    assert np.allclose(single.predict_proba(X), owned_proba)
+    assert np.allclose(owned_proba, injected_proba)
+
+
+def test_compiled_forest_predict_proba(dataset):
+    """
+    Test compiled forest gives the same probabilities as sklearn trees
+    """
+    X, y = dataset
+    forest = RandomForestClassifierCustom(n_estimators=8, random_state=3).fit(X, y)
+    trees_proba = forest.predict_proba(X)
+
+    compiled_proba = forest.compile_forest().predict_proba(X)
+    assert np.allclose(trees_proba, compiled_proba)
+    assert np.allclose(forest.compiled_forest.predict_proba(X, batch_size=7), compiled_proba)
+
+
+@pytest.mark.parametrize('backend', ['serial', 'thread', 'process'])
+def test_rare_class_predict_proba(dataset, backend):
+    """
+    Test trees missing a rare class in bootstrap sample agree with compiled forest
+    """
+    X, y = dataset
+    y = y.copy()
+    y[:2] = 2
+    forest = RandomForestClassifierCustom(n_estimators=10, random_state=5, backend=backend).fit(X, y, n_jobs=2)
+    assert any(len(tree.classes_) < 3 for tree in forest.trees)
+
+    trees_proba = forest.predict_proba(X, n_jobs=2)
+    assert trees_proba.shape == (len(X), 3)
+    assert np.allclose(trees_proba, forest.compile_forest().predict_proba(X))
+    forest.close()
+
+
+def test_predict_chunks_out_of_core(dataset, tmp_path):
+    """
+    Test block by block prediction from npy-file and from iterator
+    """
+    X, y = dataset
+    np.save(tmp_path / 'X.npy', X)
+    forest = RandomForestClassifierCustom(n_estimators=4, random_state=5).fit(X, y)
+    target_proba = forest.predict_proba(X)
+
+    output_path = forest.predict_chunks(tmp_path / 'X.npy', tmp_path / 'proba.npy', block_size=64, n_jobs=2)
+    assert np.allclose(np.load(output_path), target_proba)
+
+    blocks = (X[start:start + 100] for start in range(0, len(X), 100))
+    iter_proba = np.concatenate(list(forest.predict_proba_iter(blocks, n_jobs=1)))
+    assert np.allclose(iter_proba, target_proba)
+
+
+def test_oob_score_and_importances():
+    """
+    Test out-of-bag results are the same for in-process and pooled fit
+    and informative features are more important
+    """
+    X, y = make_classification(n_samples=300, n_features=10, n_informative=3, n_redundant=0,
+                               shuffle=False, random_state=0)
+    single = RandomForestClassifierCustom(n_estimators=40, random_state=7, oob_score=True).fit(X, y)
+    pooled = RandomForestClassifierCustom(n_estimators=40, random_state=7, oob_score=True).fit(X, y, n_jobs=3)
+
+    assert 0.5 < single.oob_score_ == pooled.oob_score_
+    assert np.allclose(single.oob_feature_importances_, pooled.oob_feature_importances_)
+    assert single.inbag_mask(0).sum() < len(X) // 2 + 1
+
+    # Informative features are the first without shuffle
+    assert single.oob_feature_importances_[:3].mean() > single.oob_feature_importances_[3:].max()
+
+
+def test_warm_start_adds_trees(dataset):
+    """
+    Test warm start keeps fitted trees and adds the same trees as full fit
+    """
+    X, y = dataset
+    forest = RandomForestClassifierCustom(n_estimators=3, random_state=2, warm_start=True).fit(X, y)
+    first_trees = list(forest.trees)
+    forest.set_params(n_estimators=6).fit(X, y, n_jobs=2)
+    full = RandomForestClassifierCustom(n_estimators=6, random_state=2).fit(X, y)
+
+    assert forest.trees[:3] == first_trees
+    assert np.allclose(forest.predict_proba(X), full.predict_proba(X))
+
+
+def test_save_load_compact(dataset, tmp_path):
+    """
+    Test compact saved forest is loaded memory-mapped and predicts the same
+    """
+    X, y = dataset
+    forest = RandomForestClassifierCustom(n_estimators=5, max_depth=6, random_state=4).fit(X, y)
+    forest.save(tmp_path / 'forest')
+    loaded = RandomForestClassifierCustom.load(tmp_path / 'forest')
+
+    assert isinstance(loaded.compiled_forest.value, np.memmap)
+    assert loaded.get_params() == forest.get_params()
+    assert np.allclose(loaded.predict_proba(X), forest.predict_proba(X))
+
+
+def test_hist_tree_method(dataset):
+    """
+    Test histogram trees are the same for in-process and pooled fit,
+    compiled forest and OOB work for them
+    """
+    X, y = dataset
+    single = RandomForestClassifierCustom(n_estimators=6, random_state=8, tree_method='hist',
+                                          oob_score=True).fit(X, y)
+    pooled = RandomForestClassifierCustom(n_estimators=6, random_state=8, tree_method='hist',
+                                          oob_score=True).fit(X, y, n_jobs=2)
+    hist_proba = single.predict_proba(X)
+
+    assert np.allclose(hist_proba, pooled.predict_proba(X))
+    assert single.oob_score_ == pooled.oob_score_ > 0.6
+    assert np.allclose(single.compile_forest().predict_proba(X), hist_proba)
+    assert (np.argmax(hist_proba, axis=1) == y).mean() > 0.8
+
+    # Bins are uint8 with 256-slot histograms
+    for max_bins in (1, 257):
+        with pytest.raises(ValueError, match='max_bins'):
+            RandomForestClassifierCustom(n_estimators=2, tree_method='hist', max_bins=max_bins).fit(X, y)
+    with pytest.raises(ValueError, match='max_bins'):
+        bin_features(X, max_bins=300)
+
+
+def test_random_state_none_and_reproducibility(dataset):
+    """
+    Test forest with random_state=None is fitted and
+    fixed random_state gives identical trees for any n_jobs
+    """
+    X, y = dataset
+    RandomForestClassifierCustom(n_estimators=3).fit(X, y, n_jobs=2)
+
+    probas = [RandomForestClassifierCustom(n_estimators=7, random_state=9).fit(X, y, n_jobs=n_jobs).predict_proba(X)
+              for n_jobs in (1, 2, 3)]
+    assert all(np.array_equal(probas[0], proba) for proba in probas[1:])
+
+
+def test_backends_same_results(dataset):
+    """
+    Test thread, process and serial backends give identical trees and probabilities,
+    injected thread pool defines backend and wrong backend is rejected
+    """
+    X, y = dataset
+    probas = [RandomForestClassifierCustom(n_estimators=6, random_state=11, oob_score=True, backend=backend)
+              .fit(X, y, n_jobs=3).predict_proba(X, n_jobs=3)
+              for backend in ('serial', 'thread', 'process')]
+    assert all(np.array_equal(probas[0], proba) for proba in probas[1:])
+
+    forest = RandomForestClassifierCustom(n_estimators=6, random_state=11)
+    with ThreadPoolExecutor(2) as pool:
+        forest.fit(X, y, executor=pool)
+        assert np.allclose(forest.predict_proba(X, executor=pool), probas[0])
+    iter_proba = np.concatenate(list(forest.predict_proba_iter(X, block_size=64, n_jobs=2, backend='thread')))
+    assert np.allclose(iter_proba, probas[0])
+
+    with pytest.raises(ValueError):
+        forest.predict_proba(X, backend='gpu')
+
+
+def test_default_n_jobs_runs_in_process(dataset, monkeypatch):
+    """
+    Test estimator with default n_jobs=1 does not start pools,
+    also as context manager owning the pool
+    """
+    X, y = dataset
+    started = []
+    monkeypatch.setattr(custom_random_forest, 'new_pool',
+                        lambda backend, workers_number: started.append(backend))
+
+    forest = RandomForestClassifierCustom(n_estimators=4, random_state=5).fit(X, y)
+    expected = forest.predict_proba(X)
+    list(forest.predict_proba_iter(X, block_size=100))
+
+    with RandomForestClassifierCustom(n_estimators=4, random_state=5) as owned:
+        assert owned._pool is None
+        owned.fit(X, y)
+        assert np.array_equal(owned.predict_proba(X), expected)
+        list(owned.predict_proba_iter(X, block_size=100))
+    assert started == []
+
+
+class RecordingProcessPool(ProcessPoolExecutor):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.task_sizes = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.task_sizes.append(len(pickle.dumps(args)))
+        return super().submit(fn, *args, **kwargs)
+
+
+def test_trees_not_sent_with_prediction_tasks(dataset):
+    """
+    Test prediction tasks carry only specifications of shared blocks,
+    trees are pickled to shared memory once
+    """
+    X, y = dataset
+    forest = RandomForestClassifierCustom(n_estimators=6, random_state=3).fit(X, y)
+    expected = forest.predict_proba(X)
+    trees_size = len(pickle.dumps(forest.trees))
+
+    with RecordingProcessPool(2) as pool, instrumentation.instrument() as metrics:
+        for _ in range(3):
+            assert np.array_equal(forest.predict_proba(X, executor=pool), expected)
+    assert len(pool.task_sizes) == 6
+    assert max(pool.task_sizes) < min(1024, trees_size / 10)
+    assert metrics.counters['forest.models_shared_bytes'] >= trees_size / 2
+
+    forest.close()
+    assert forest._models_payloads == {}
@@ -0,0 +1,109 @@
+import gzip
+import numpy as np
+import pytest
+import random
+
+from bio_files_processor import OpenFasta
+from dedup import HashSet, deduplicate_file, sequence_hash
+from general import filter_fastq
+from pipeline import run_pipeline
+
+
+def reverse_complement(seq):
+    return seq.translate(str.maketrans('ACGT', 'TGCA'))[::-1]
+
+
+@pytest.fixture
+def duplicated_fastq(tmp_path):
+    """
+    Reads with exact and reverse-complement duplicates
+
+    Returns path and expected sequences for both modes
+    """
+    rng = random.Random(3)
+    uniques = [''.join(rng.choice('ACGT') for _ in range(rng.randint(20, 60))) for _ in range(300)]
+    seqs = []
+    for _ in range(1500):
+        seq = rng.choice(uniques)
+        seqs.append(reverse_complement(seq) if rng.random() < 0.3 else seq)
+
+    expected = {'exact': [], 'reverse_complement': []}
+    seen = {'exact': set(), 'reverse_complement': set()}
+    for seq in seqs:
+        for mode, key in (('exact', seq), ('reverse_complement', min(seq, reverse_complement(seq)))):
+            if key not in seen[mode]:
+                seen[mode].add(key)
+                expected[mode].append(seq)
+
+    path = tmp_path / 'reads.fastq.gz'
+    with gzip.open(path, mode='wt') as fastq_file:
+        for idx, seq in enumerate(seqs):
+            fastq_file.write(f'@read{idx}\n{seq.lower() if idx % 7 == 0 else seq}\n+\n{"I" * len(seq)}\n')
+    return path, expected
+
+
+def read_seqs(path):
+    with open(path) as fastq_file:
+        return [line.strip().upper() for idx, line in enumerate(fastq_file) if idx % 4 == 1]
+
+
+def test_hash_set_matches_python_set():
+    """
+    Test batches with repeats and table growth give the same new keys as set
+    """
+    rng = np.random.default_rng(0)
+    hash_set = HashSet(expected_size=16)
+    seen = set()
+    for _ in range(30):
+        hashes = rng.integers(1, 3000, size=500, dtype=np.uint64)
+        expected = []
+        for hash_value in hashes.tolist():
+            expected.append(hash_value not in seen)
+            seen.add(hash_value)
+        assert hash_set.add(hashes).tolist() == expected
+    assert len(hash_set) == len(seen)
+    assert hash_set.nbytes / len(hash_set) <= 16
+    assert all(hash_value in hash_set for hash_value in seen)
+    assert not hash_set.contains(np.array([3001, 5000], dtype=np.uint64)).any()
+
+
+def test_sequence_hash_reverse_complement():
+    assert sequence_hash('AACG', 'reverse_complement') == sequence_hash('cgtt', 'reverse_complement')
+    assert sequence_hash('AACG') != sequence_hash('CGTT')
+
+
+@pytest.mark.parametrize('mode', ['exact', 'reverse_complement'])
+@pytest.mark.parametrize('spill', [False, True])
+def test_deduplicate_file(duplicated_fastq, tmp_path, mode, spill):
+    """
+    Test in-memory and partitioned modes keep the first record of duplicates in order
+    """
+    path, expected = duplicated_fastq
+    counts = deduplicate_file(str(path), str(tmp_path / 'unique.fastq'), mode=mode,
+                              spill_dir=str(tmp_path / 'spill') if spill else None, partitions=5, batch_size=100)
+    assert read_seqs(tmp_path / 'unique.fastq') == expected[mode]
+    assert counts == {'read': 1500, 'written': len(expected[mode])}
+    if spill:
+        assert list((tmp_path / 'spill').iterdir()) == []
+
+
+def test_deduplicate_stages(duplicated_fastq, tmp_path):
+    """
+    Test deduplication in filter_fastq, pipeline and OpenFasta
+    """
+    path, expected = duplicated_fastq
+    plain_path = tmp_path / 'reads.fastq'
+    with gzip.open(path, mode='rb') as gzip_file:
+        plain_path.write_bytes(gzip_file.read())
+
+    filter_fastq(str(plain_path), gc_thresholds=(0, 100), output_path=str(tmp_path / 'filtered.fastq'),
+                 deduplicate='reverse_complement')
+    assert read_seqs(tmp_path / 'filtered.fastq') == expected['reverse_complement']
+
+    counts = run_pipeline(str(path), str(tmp_path / 'unique.fasta'), deduplicate='exact',
+                          output_format='fasta', batch_size=64)
+    assert counts['written'] == len(expected['exact'])
+
+    with OpenFasta(str(tmp_path / 'unique.fasta')) as fasta:
+        records = fasta.read_records(deduplicate='reverse_complement')
+    assert [record.seq.upper() for record in records] == expected['reverse_complement']
@@ -1,11 +1,32 @@
+import asyncio
+import gzip
 import os
 import pytest
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+from concurrent.futures import ThreadPoolExecutor
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 
 from general import (DNASequence,
                      RNASequence,
                      AminoAcidSequence,
                      filter_fastq,
-                     run_genscan)
+                     sample_fastq,
+                     run_genscan,
+                     GenscanOutput,
+                     GenscanFeatures,
+                     TelegramSender,
+                     StreamCapture,
+                     ResourceProfiler,
+                     build_log_attachment,
+                     telegram_logger)
 
 
 @pytest.fixture
@@ -112,6 +133,47 @@ def test_filter_fastq_gc(input_file, output_file):
     assert target_values == values_to_check
 
 
+@pytest.fixture
+def random_fastq(tmp_path):
+    """
+    Reads of various length, GC-content and quality, plain and gzipped
+    """
+    rng = random.Random(7)
+    lines = []
+    for idx in range(3000):
+        length = rng.randint(30, 300)
+        gc = rng.random()
+        seq = ''.join(rng.choice('GC') if rng.random() < gc else rng.choice('AT') for _ in range(length))
+        quality = ''.join(chr(33 + rng.randint(5, 40)) for _ in range(length))
+        lines.append(f'@read{idx}\n{seq}\n+\n{quality}\n')
+    path = tmp_path / 'reads.fastq'
+    path.write_text(''.join(lines))
+    with open(path, mode='rb') as plain_file, gzip.open(tmp_path / 'reads.fastq.gz', mode='wb') as gzip_file:
+        gzip_file.write(plain_file.read())
+    return path
+
+
+@pytest.mark.parametrize('method, suffix', [('stride', ''), ('reservoir', ''), ('reservoir', '.gz')])
+def test_sample_fastq_predicts_filter_fastq(random_fastq, tmp_path, method, suffix):
+    """
+    Test retained fraction predicted by sample is close to filter_fastq result
+    """
+    sample = sample_fastq(str(random_fastq) + suffix, sample_size=600, method=method, seed=1)
+    assert 550 <= len(sample) <= 600 and sample.method == method
+    assert abs(sample.records_number - 3000) < (1 if method == 'reservoir' else 300)
+
+    thresholds = {'gc_thresholds': (30, 70), 'len_thresholds': (50, 250), 'quality_threshold': 22}
+    fraction, low, high = sample.retained_fraction(**thresholds)
+    filter_fastq(str(random_fastq), output_path=str(tmp_path / 'filtered.fastq'), **thresholds)
+    with open(tmp_path / 'filtered.fastq') as filtered_file:
+        actual = sum(1 for _ in filtered_file) / 4 / 3000
+    assert low - 0.02 <= actual <= high + 0.02
+    assert abs(fraction - actual) < 0.07
+
+    table = sample.retained_table(gc_thresholds_list=[(0, 100), (30, 70)], quality_thresholds=[0, 22])
+    assert len(table) == 4 and table['retained_fraction'].iloc[0] == 1
+
+
 def test_run_genscan_incorrect_input():
     """
     Test that a ValueError is raised when the incorrect exon_cutoff are specified
@@ -121,3 +183,256 @@ def test_run_genscan_incorrect_input():
     assert str(excinfo.value) == ('Incorrect input of "exon_cutoff": 5! '
                                   'Should be: 1.00, 0.50, 0.25, 0.05, 0.02 or 0.01')
 
+
+@pytest.fixture
+def genscan_outputs():
+    first = GenscanOutput(200,
+                          exon_list=[('1.01', 10, 50), ('1.02', 80, 120)],
+                          cds_list=[('>seq_predicted_CDS_1', 'ATGAAATGA')],
+                          intron_list=[('1.01', 51, 79)])
+    second = GenscanOutput(200,
+                           exon_list=[('1.01', 500, 400)],
+                           cds_list=[('>seq_predicted_CDS_1', 'ATGCCCTGA')])
+    return [first, second]
+
+
+def test_genscan_features_concat(genscan_outputs):
+    """
+    Test GenscanFeatures.concat merges string tables and records
+    """
+    features = GenscanFeatures.concat([output.to_features() for output in genscan_outputs])
+    assert features.to_outputs() == genscan_outputs
+    assert features.strand.tolist() == [1, 1, 1, -1]
+    assert len(features.strings) == len(set(features.strings))
+
+
+def test_genscan_features_npz_round_trip(genscan_outputs, tmp_path):
+    """
+    Test GenscanFeatures save_npz and load_npz give the same results
+    """
+    file_path = tmp_path / 'genscan.npz'
+    GenscanFeatures.from_outputs(genscan_outputs).save_npz(file_path)
+    assert GenscanFeatures.load_npz(file_path).to_outputs() == genscan_outputs
+
+
+@pytest.fixture
+def telegram_mock_server():
+    received = []
+
+    class TelegramHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            url = urlparse(self.path)
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            received.append((url.path, parse_qs(url.query), body))
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b'{"ok": true}')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TelegramHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', received
+    server.shutdown()
+    server.server_close()
+
+
+def test_telegram_logger_background_delivery(telegram_mock_server):
+    """
+    Test telegram_logger delivers message with captured stdout to the mock server
+    """
+    api_url, received = telegram_mock_server
+    sender = TelegramSender(api_url=api_url, token='TEST')
+
+    @telegram_logger(42, sender=sender)
+    def print_answer():
+        print('the answer is 42')
+        return 42
+
+    assert print_answer() == 42
+    assert sender.flush(timeout=10)
+
+    path, query, body = received[0]
+    assert path == '/botTEST/sendDocument'
+    assert query['chat_id'] == ['42']
+    assert 'print_answer' in query['caption'][0]
+    assert b'the answer is 42' in body
+
+
+def test_build_log_attachment_keeps_tail():
+    """
+    Test that too large compressed log is replaced by the output tail
+    """
+    stdout_capture = StreamCapture(spool_size=1024, tail_size=100)
+    stderr_capture = StreamCapture(spool_size=1024, tail_size=100)
+    for line_idx in range(10000):
+        print(f'line {line_idx} {os.urandom(8).hex()}', file=stdout_capture)
+
+    log_name, log_content = build_log_attachment(stdout_capture, stderr_capture,
+                                                 compress=True, max_size=4096)
+    log_text = gzip.decompress(log_content).decode()
+    assert log_name == 'logs.txt.gz'
+    assert len(log_content) <= 4096
+    assert log_text.startswith('Stdout (last 100 of')
+    assert 'line 9999' in log_text
+
+
+class RecordingSender:
+    def __init__(self):
+        self.logs = []
+
+    def send(self, chat_id, caption, log_content, filename='logs.txt'):
+        self.logs.append(log_content.decode())
+
+
+def test_telegram_logger_nested_and_threads():
+    """
+    Test telegram_logger captures are separated between threads
+    and nested calls, and sys.stdout is restored
+    """
+    sender = RecordingSender()
+    original_stdout = sys.stdout
+
+    @telegram_logger(42, sender=sender)
+    def inner(name):
+        print(f'inner {name}')
+
+    @telegram_logger(42, sender=sender)
+    def outer(name):
+        print(f'outer {name}')
+        inner(name)
+
+    names = [f'job{idx}' for idx in range(8)]
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(outer, names))
+
+    assert sys.stdout is original_stdout
+    for name in names:
+        name_logs = [log for log in sender.logs if f' {name}\n' in log]
+        assert len(name_logs) == 2
+        assert all('job' not in log.replace(name, '') for log in name_logs)
+        assert any(f'outer {name}\ninner {name}' in log for log in name_logs)
+
+
+def test_telegram_logger_tee_and_queue_bytes(capsys, monkeypatch):
+    """
+    Test output is teed to the real stream by default
+    and sender queue drops messages beyond total size limit
+    """
+    sender = RecordingSender()
+
+    @telegram_logger(42, sender=sender)
+    def teed():
+        print('visible')
+
+    @telegram_logger(42, sender=sender, tee=False)
+    def silent():
+        print('hidden')
+
+    teed()
+    silent()
+    assert capsys.readouterr().out == 'visible\n'
+    assert 'visible' in sender.logs[0] and 'hidden' in sender.logs[1]
+
+    queued_sender = TelegramSender(max_queue_bytes=10)
+    monkeypatch.setattr(queued_sender, '_start', lambda: None)
+    queued_sender.send(42, 'first', b'x' * 8)
+    queued_sender.send(42, 'second', b'x' * 8)
+    assert queued_sender.dropped == 1
+    assert queued_sender._queue.qsize() == 1
+
+
+def test_telegram_logger_coroutine():
+    """
+    Test telegram_logger captures output of concurrent asyncio tasks separately
+    """
+    sender = RecordingSender()
+
+    @telegram_logger(42, sender=sender)
+    async def first():
+        print('first start')
+        await asyncio.sleep(0.01)
+        print('first end')
+
+    @telegram_logger(42, sender=sender)
+    async def second():
+        print('second start')
+        await asyncio.sleep(0.01)
+        print('second end')
+
+    async def run_both():
+        await asyncio.gather(first(), second())
+
+    asyncio.run(run_both())
+    first_log = [log for log in sender.logs if 'first' in log][0]
+    assert 'first start\nfirst end' in first_log
+    assert 'second' not in first_log
+
+
+def test_telegram_logger_profile_report():
+    """
+    Test telegram_logger adds resources usage and cProfile report to the log
+    """
+    sender = RecordingSender()
+
+    @telegram_logger(42, sender=sender, profile=True, cprofile_top=5)
+    def allocate():
+        return [str(idx) for idx in range(10000)]
+
+    allocate()
+    assert 'CPU time of thread:' in sender.logs[0]
+    assert 'Top live allocations made during the call:' in sender.logs[0]
+    assert 'cProfile:' in sender.logs[0]
+
+
+def test_resource_profiler_concurrent_calls():
+    """
+    Test tracemalloc is kept for running profiled calls when another one stops
+    and CPU time is measured for the calling thread
+    """
+    first_started = threading.Event()
+    first_stopped = threading.Event()
+    profilers = {}
+
+    def profiled(name, action):
+        with ResourceProfiler(tracemalloc_top=5) as profiler:
+            profilers[name] = profiler
+            action()
+
+    def first():
+        first_started.set()
+
+    def second():
+        first_started.wait()
+        first_stopped.wait()
+        profilers['data'] = [str(idx) for idx in range(20000)]
+        time.sleep(0.3)
+
+    def burn():
+        first_stopped.set()
+        deadline = time.perf_counter() + 0.3
+        while time.perf_counter() < deadline:
+            pass
+
+    with ThreadPoolExecutor(2) as pool:
+        second_future = pool.submit(profiled, 'second', second)
+        pool.submit(profiled, 'first', first).result()
+        burn()
+        second_future.result()
+
+    assert not tracemalloc.is_tracing()
+    assert any(__file__ in allocation for allocation in profilers['second'].top_allocations)
+    assert profilers['second'].cpu_time < 0.1 < profilers['second'].process_cpu_time
+
+
+def test_import_does_not_load_heavy_modules():
+    """
+    Test heavy dependencies are loaded on first use, not on import
+    """
+    code = ('import sys, general\n'
+            'heavy = ("numpy", "pandas", "Bio", "requests", "dotenv")\n'
+            'assert general.DNASequence("ATGC").gc_content == 50\n'
+            'assert not [name for name in heavy if name in sys.modules], sys.modules.keys()\n'
+            'assert general.np.zeros(2).sum() == 0 and "numpy" in sys.modules\n')
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,70 @@
+import json
+import os
+import subprocess
+import sys
+
+import instrumentation
+
+from bio_files_processor import change_fasta_start_pos
+from general import filter_fastq
+from instrumentation import instrument
+
+
+class RecordingSink:
+    def __init__(self):
+        self.snapshots = []
+
+    def emit(self, snapshot):
+        self.snapshots.append(snapshot)
+
+
+def test_instrument_context_manager(tmp_path):
+    """
+    Test toolkit timers and counters are collected inside the block only
+    and written to all sinks
+    """
+    fastq_path = tmp_path / 'reads.fastq'
+    fastq_path.write_text('@r1\nGGCC\n+\nIIII\n@r2\nATAT\n+\nIIII\n')
+    fasta_path = tmp_path / 'seqs.fasta'
+    fasta_path.write_text('>s1\nATGC\nAT\n>s2\nGG\n')
+    sink = RecordingSink()
+
+    assert not instrumentation.enabled()
+    with instrument(sink, f'jsonl:{tmp_path / "metrics.jsonl"}', f'prometheus:{tmp_path / "metrics.prom"}'):
+        assert instrumentation.enabled()
+        filter_fastq(str(fastq_path), gc_thresholds=(40, 100), output_path=str(tmp_path / 'out.fastq'))
+        change_fasta_start_pos(str(fasta_path), 2, str(tmp_path / 'out.fasta'))
+    assert not instrumentation.enabled()
+    assert instrumentation.timer('idle') is instrumentation.timer('other')
+
+    snapshot = sink.snapshots[0]
+    assert snapshot['counters']['filter_fastq.records_in'] == 2
+    assert snapshot['counters']['filter_fastq.records_out'] == 1
+    assert snapshot['counters']['change_fasta_start_pos.records'] == 2
+    assert {'filter_fastq', 'filter_fastq.parse_filter', 'filter_fastq.write',
+            'change_fasta_start_pos'} <= set(snapshot['timers'])
+
+    with open(tmp_path / 'metrics.jsonl') as jsonl_file:
+        assert json.loads(jsonl_file.readline())['counters'] == snapshot['counters']
+    prom_text = (tmp_path / 'metrics.prom').read_text()
+    assert 'daywwyd_events_total{name="filter_fastq.records_in"' in prom_text
+    assert 'daywwyd_stage_seconds_total{stage="filter_fastq"' in prom_text
+
+
+def test_instrument_environment_variable(tmp_path):
+    """
+    Test instrumentation enabled by environment variable writes metrics at exit
+    """
+    fasta_path = tmp_path / 'seqs.fasta'
+    fasta_path.write_text('>s1\nATGC\nAT\n>s2\nGG\n')
+    metrics_path = tmp_path / 'metrics.jsonl'
+    code = ('from bio_files_processor import convert_multiline_fasta_to_oneline\n'
+            f'convert_multiline_fasta_to_oneline({str(fasta_path)!r}, {str(tmp_path / "out.fasta")!r})\n')
+
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                   env={**os.environ, instrumentation.ENV_VARIABLE: f'jsonl:{metrics_path}'})
+
+    with open(metrics_path) as jsonl_file:
+        snapshot = json.loads(jsonl_file.readline())
+    assert snapshot['counters']['convert_multiline_fasta_to_oneline.records'] == 2
+    assert 'convert_multiline_fasta_to_oneline.parse' in snapshot['timers']
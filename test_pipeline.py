@@ -0,0 +1,78 @@
+import gzip
+import pytest
+import random
+
+from bio_files_processor import change_fasta_start_pos, convert_multiline_fasta_to_oneline
+from general import filter_fastq
+from pipeline import run_pipeline
+
+
+@pytest.fixture
+def fastq_path(tmp_path):
+    rng = random.Random(0)
+    records = []
+    for read_idx in range(500):
+        length = rng.randint(20, 80)
+        seq = ''.join(rng.choice('ACGT') for _ in range(length))
+        quality = ''.join(chr(33 + rng.randint(5, 40)) for _ in range(length))
+        records.append(f'@read_{read_idx}\n{seq}\n+\n{quality}\n')
+    path = tmp_path / 'reads.fastq'
+    path.write_text(''.join(records))
+    return path
+
+
+def test_pipeline_filter_same_as_filter_fastq(fastq_path, tmp_path):
+    """
+    Test pipeline filter over gzip input in one and several processes
+    keeps the same records as filter_fastq
+    """
+    filter_fastq(str(fastq_path), (40, 60), (30, 70), 22, str(tmp_path / 'target.fastq'))
+    target = (tmp_path / 'target.fastq').read_text()
+
+    gz_path = tmp_path / 'reads.fastq.gz'
+    with gzip.open(gz_path, mode='wb') as gz_file:
+        gz_file.write(fastq_path.read_bytes())
+
+    for n_jobs in (1, 2):
+        counts = run_pipeline(str(gz_path), str(tmp_path / 'piped.fastq'), gc_thresholds=(40, 60),
+                              len_thresholds=(30, 70), quality_threshold=22, n_jobs=n_jobs, batch_size=64)
+        assert (tmp_path / 'piped.fastq').read_text() == target
+        assert counts['read'] == 500
+        assert 0 < counts['written'] == target.count('\n+\n')
+
+
+def test_pipeline_convert_and_shift(tmp_path):
+    """
+    Test pipeline conversion to one-line fasta and circular shift
+    give the same files as bio_files_processor functions
+    """
+    fasta_path = tmp_path / 'multi.fasta'
+    fasta_path.write_text('>seq1 first\nATGC\nGGCA\nTT\n>seq2\nCCCC\nAA\n')
+
+    convert_multiline_fasta_to_oneline(str(fasta_path), str(tmp_path / 'target.fasta'))
+    run_pipeline(str(fasta_path), str(tmp_path / 'oneline.fasta'))
+    assert (tmp_path / 'oneline.fasta').read_text() == (tmp_path / 'target.fasta').read_text()
+
+    single_path = tmp_path / 'single.fasta'
+    single_path.write_text('>chr\nATGCGGCATT\n')
+    for shift_idx in (4, 14, -13, -25):
+        change_fasta_start_pos(str(single_path), shift_idx, str(tmp_path / 'target_shifted.fasta'))
+        run_pipeline(str(single_path), str(tmp_path / 'shifted.fasta'), shift_idx=shift_idx)
+        assert (tmp_path / 'shifted.fasta').read_text() == (tmp_path / 'target_shifted.fasta').read_text()
+    # Index out of sequence length wraps around
+    assert (tmp_path / 'shifted.fasta').read_text().split('\n')[1] == 'GCATTATGCG'
+
+
+def test_pipeline_stage_error(tmp_path):
+    """
+    Test errors of stages running in threads are raised to caller
+    """
+    broken_path = tmp_path / 'broken.fastq'
+    broken_path.write_text('@read\nATGC\n+\nKK\n')
+    with pytest.raises(ValueError):
+        run_pipeline(str(broken_path), str(tmp_path / 'out.fastq'))
+
+    fasta_path = tmp_path / 'seqs.fasta'
+    fasta_path.write_text('>seq\nATGC\n')
+    with pytest.raises(ValueError):
+        run_pipeline(str(fasta_path), str(tmp_path / 'out.fastq'), output_format='fastq')